@@ -0,0 +1,94 @@
+# benchmarks/bench_camera_shards.py - Escalabilidade do camera_service por número de shards
+#
+# Usa ficheiros de vídeo locais como "câmaras RTSP" falsas (o camera_service lê
+# ficheiros ao ritmo do vídeo) e mede quantas câmaras o host aguenta a manter o
+# FPS alvo com 1, 2, 4... processos worker.
+#
+# Exemplo:
+#   python benchmarks/bench_camera_shards.py --shards 1 2 4 --cameras 8 16 32 --json resultados.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from comum import ROOT_DIR, esperar_health, gerar_video_sintetico
+
+CAMERA_APP = os.path.join(ROOT_DIR, "camera_service", "app.py")
+
+
+def correr_cenario(num_shards, num_cameras, video_path, fps, port, warmup, duracao):
+    env = dict(os.environ,
+               CAMERA_SERVICE_SHARDS=str(num_shards),
+               CAMERA_SHARD_BASE_PORT=str(port + 100),
+               DETECTION_SERVICE_URL="")   # só captura, sem deteção
+    process = subprocess.Popen([sys.executable, CAMERA_APP, '--port', str(port)],
+                               cwd=os.path.dirname(CAMERA_APP), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        if not esperar_health(url):
+            raise RuntimeError("camera_service não arrancou")
+
+        for i in range(num_cameras):
+            requests.post(f"{url}/cameras", json={'id': f"bench{i}", 'url': video_path, 'fps': fps}, timeout=10)
+
+        time.sleep(warmup)
+        inicio = {c['id']: c['frames_publicados'] for c in requests.get(f"{url}/cameras/stats", timeout=10).json()['cameras']}
+        time.sleep(duracao)
+        stats = requests.get(f"{url}/cameras/stats", timeout=10).json()['cameras']
+
+        fps_por_camera = [(c['frames_publicados'] - inicio.get(c['id'], 0)) / duracao for c in stats]
+        sustentadas = sum(1 for f in fps_por_camera if f >= 0.9 * fps)
+        return {
+            'shards': num_shards,
+            'cameras': num_cameras,
+            'fps_alvo': fps,
+            'fps_total': round(sum(fps_por_camera), 1),
+            'fps_medio_por_camera': round(sum(fps_por_camera) / max(len(fps_por_camera), 1), 2),
+            'cameras_no_alvo': sustentadas,
+            'latencia_media_ms': round(sum(c['latencia_ms'] for c in stats) / max(len(stats), 1), 1),
+            'cpu_captura_percent': round(sum(c['cpu_percent'] for c in stats), 1),
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de câmaras por host vs. número de shards")
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--cameras', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5901)
+    parser.add_argument('--warmup', type=float, default=5)
+    parser.add_argument('--duracao', type=float, default=10)
+    parser.add_argument('--video', help="Vídeo a usar como fonte (por omissão gera um sintético)")
+    parser.add_argument('--json', help="Ficheiro onde gravar os resultados")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = args.video or gerar_video_sintetico(os.path.join(tmp, "fake_cam.avi"))
+        resultados = []
+        for num_shards in args.shards:
+            for num_cameras in args.cameras:
+                r = correr_cenario(num_shards, num_cameras, video_path, args.fps, args.port, args.warmup, args.duracao)
+                print(f"shards={r['shards']:<2} cameras={r['cameras']:<4} fps_total={r['fps_total']:<8} "
+                      f"no_alvo={r['cameras_no_alvo']}/{r['cameras']} latencia={r['latencia_media_ms']}ms")
+                resultados.append(r)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'camera_shards', 'resultados': resultados}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
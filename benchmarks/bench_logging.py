@@ -0,0 +1,145 @@
+# benchmarks/bench_logging.py - Custo do logging no caminho do /detect
+#
+# Simula o trabalho de um pedido /detect (decode do JPEG + redimensionamento no
+# lugar da inferência) com as mesmas mensagens que o detection_service regista
+# por deteção, e compara o débito (pedidos/s) com:
+#   - print()             : o comportamento antigo (escrita síncrona no stdout)
+#   - sincrono            : logging com StreamHandler direto (sem fila)
+#   - fila                : QueueHandler + QueueListener (shared/log.py)
+#   - desligado           : nível WARNING, as mensagens INFO nem são formatadas
+# A saída é uma "consola lenta" (cada write demora --atraso-ms), como um
+# terminal ou pipe saturado.
+#
+# Exemplo:
+#   python benchmarks/bench_logging.py --pedidos 2000 --threads 4 --atraso-ms 1
+
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from comum import ROOT_DIR
+
+sys.path.insert(0, ROOT_DIR)
+from shared.log import DroppingQueueHandler, RateLimitFilter, TextFormatter  # noqa: E402
+
+
+class ConsolaLenta:
+    """Stream em que cada write() demora atraso_s (simula um terminal/pipe lento)."""
+    def __init__(self, atraso_s):
+        self.atraso_s = atraso_s
+        self.linhas = 0
+        self._lock = threading.Lock()
+
+    def write(self, texto):
+        with self._lock:
+            time.sleep(self.atraso_s)
+            self.linhas += texto.count('\n')
+
+    def flush(self):
+        pass
+
+
+def gerar_jpeg():
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def pedido_detect(jpeg, registar):
+    """Trabalho equivalente a um /detect com deteção positiva."""
+    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    cv2.resize(frame, (320, 240))
+    registar("DETECTION: Detetada pessoa na câmara %s! A guardar evento...", "Bench")
+    registar("DETECTION: Evento da câmara %s salvo no banco de dados!", "Bench")
+    registar("DETECTION: Pedido de notificação enviado com sucesso.")
+
+
+def correr(nome, registar, jpeg, pedidos, threads):
+    por_thread = pedidos // threads
+
+    def worker():
+        for _ in range(por_thread):
+            pedido_detect(jpeg, registar)
+
+    inicio = time.perf_counter()
+    ts = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return {'modo': nome, 'pedidos_por_s': round(por_thread * threads / duracao, 1), 'duracao_s': round(duracao, 3)}
+
+
+def configurar_logger(nome, handler, nivel=logging.INFO):
+    logger = logging.getLogger(f"bench.{nome}")
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    logger.setLevel(nivel)
+    return logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débito do /detect com logging ligado vs. desligado")
+    parser.add_argument('--pedidos', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--atraso-ms', type=float, default=1.0, help="Custo de cada escrita na consola")
+    parser.add_argument('--json', help="Ficheiro onde gravar os resultados")
+    args = parser.parse_args()
+
+    jpeg = gerar_jpeg()
+    atraso = args.atraso_ms / 1000
+    resultados = []
+
+    # Sem qualquer registo (referência)
+    resultados.append(correr('sem_logs', lambda *a: None, jpeg, args.pedidos, args.threads))
+
+    # print() síncrono (como antes)
+    consola = ConsolaLenta(atraso)
+    resultados.append(correr('print', lambda msg, *a: print(msg % a, file=consola), jpeg, args.pedidos, args.threads))
+
+    # logging síncrono
+    consola = ConsolaLenta(atraso)
+    direto = logging.StreamHandler(consola)
+    direto.setFormatter(TextFormatter('bench'))
+    logger = configurar_logger('sincrono', direto)
+    resultados.append(correr('sincrono', logger.info, jpeg, args.pedidos, args.threads))
+
+    # logging com fila (configuração dos serviços)
+    consola = ConsolaLenta(atraso)
+    saida = logging.StreamHandler(consola)
+    saida.setFormatter(TextFormatter('bench'))
+    handler = DroppingQueueHandler(queue.Queue(maxsize=10000))
+    handler.addFilter(RateLimitFilter(burst=int(os.getenv("LOG_RATE_BURST", 5)),
+                                      window=float(os.getenv("LOG_RATE_WINDOW", 10))))
+    listener = logging.handlers.QueueListener(handler.queue, saida)
+    listener.start()
+    logger = configurar_logger('fila', handler)
+    r = correr('fila', logger.info, jpeg, args.pedidos, args.threads)
+    listener.stop()
+    r['escritas_na_consola'] = consola.linhas
+    r['descartados_fila_cheia'] = handler.descartados
+    resultados.append(r)
+
+    # LOG_LEVEL=WARNING: as mensagens INFO são ignoradas antes de formatar
+    logger = configurar_logger('desligado', logging.NullHandler(), nivel=logging.WARNING)
+    resultados.append(correr('desligado', logger.info, jpeg, args.pedidos, args.threads))
+
+    for r in resultados:
+        print(f"{r['modo']:<10} {r['pedidos_por_s']:>10} pedidos/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'logging', 'config': vars(args), 'resultados': resultados}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
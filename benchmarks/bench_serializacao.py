@@ -0,0 +1,124 @@
+# benchmarks/bench_serializacao.py - Serialização de listas no database_service: antes vs. depois
+#
+# Cria N eventos na partição do mês atual (eventos_store, como o POST /events)
+# e mede, dentro do processo (sem rede, para isolar o custo da serialização):
+#   antes:        entidades ORM + object_as_dict (inspect() por linha) + jsonify
+#   depois_json:  eventos_store.query (só as colunas) + RowSerializer + json da biblioteca padrão
+#   depois:       eventos_store.query (só as colunas) + RowSerializer + orjson
+# e o pedido GET /events?limite=N completo (test client) sem compressão, com gzip e com br.
+#
+# Exemplo:
+#   python benchmarks/bench_serializacao.py --linhas 10000 --repeticoes 5 --json serializacao.json
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+from comum import ROOT_DIR
+
+
+def melhor_tempo(funcao, repeticoes):
+    """Menor duração (s) de funcao() em 'repeticoes' execuções, e o último resultado."""
+    melhor, resultado = None, None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--json', help="Grava os resultados neste ficheiro")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='bench_serializacao_')
+    os.environ['DATABASE_PATH'] = os.path.join(tmp_dir, 'bench.db')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'database_service'))
+    import app as db_app  # noqa: E402  (lê DATABASE_PATH no import)
+    from flask import jsonify
+    from sqlalchemy import inspect
+    from sqlalchemy.orm import sessionmaker
+    from partitions import ID_FACTOR, month_of
+    import shared.responses as respostas
+
+    # Todos no mês atual (uma partição), do mais recente para o mais antigo, um por segundo
+    agora = datetime.datetime.utcnow()
+    inicio_mes = agora.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    mais_recente = min(agora, inicio_mes + datetime.timedelta(seconds=args.linhas))
+    db_app.eventos_store.insert_many([{
+        'camera_id': f"cam{i % 40}", 'camera_nome': f"Câmara {i % 40}", 'tipo_deteccao': 'pessoa',
+        'confianca': 0.5 + (i % 50) / 100, 'foto_path': f"/fotos/2025/01/01/cam{i % 40}/deteccao_{i}.jpg",
+        'bbox': str([i % 600, 40, i % 600 + 80, 300]), 'timestamp': mais_recente - datetime.timedelta(seconds=i),
+        'clip_path': None,
+    } for i in range(args.linhas)])
+    mes = month_of(mais_recente)
+    SessaoParticao = sessionmaker(bind=db_app.eventos_store._engine(mes))
+
+    def object_as_dict(obj):
+        # Implementação anterior (chamada para cada linha)
+        return {c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
+
+    def antes():
+        # Entidades ORM lidas da mesma partição, com o id global como o GET /events devolve
+        db = SessaoParticao()
+        try:
+            eventos = db.query(db_app.Evento).order_by(db_app.Evento.timestamp.desc()).limit(args.linhas).all()
+            return jsonify([dict(object_as_dict(e), id=mes * ID_FACTOR + e.id) for e in eventos]).get_data()
+        finally:
+            db.close()
+
+    def depois():
+        rows = db_app.eventos_store.query(limite=args.linhas)
+        return respostas.json_response(db_app.EVENTO_JSON.rows(rows)).get_data()
+
+    resultados = {}
+    with db_app.app.app_context():
+        t, corpo_antes = melhor_tempo(antes, args.repeticoes)
+        resultados['antes'] = {'s': t, 'bytes': len(corpo_antes)}
+
+        orjson = respostas.orjson
+        respostas.orjson = None
+        t, corpo = melhor_tempo(depois, args.repeticoes)
+        resultados['depois_json'] = {'s': t, 'bytes': len(corpo)}
+        respostas.orjson = orjson
+        if orjson is not None:
+            t, corpo = melhor_tempo(depois, args.repeticoes)
+            resultados['depois'] = {'s': t, 'bytes': len(corpo)}
+
+    # Mesmo conteúdo (a ordem das chaves pode mudar: o jsonify ordenava-as)
+    assert len(json.loads(corpo)) == args.linhas, "a consulta não devolveu os eventos criados"
+    assert json.loads(corpo_antes) == json.loads(corpo), "saída diferente da implementação anterior"
+
+    cliente = db_app.app.test_client()
+    for nome, encoding in (('http_identity', 'identity'), ('http_gzip', 'gzip'), ('http_br', 'br')):
+        if encoding == 'br' and respostas.brotli is None:
+            continue
+        def pedido():
+            return cliente.get(f'/events?limite={args.linhas}', headers={'Accept-Encoding': encoding})
+        t, resposta = melhor_tempo(pedido, args.repeticoes)
+        assert resposta.status_code == 200 and resposta.content_length != 2, f"GET /events vazio em {nome}"
+        resultados[nome] = {'s': t, 'bytes': len(resposta.get_data()),
+                            'content_encoding': resposta.headers.get('Content-Encoding')}
+
+    print(f"\n{args.linhas} eventos (melhor de {args.repeticoes})")
+    print(f"{'cenário':<14} {'ms':>9} {'linhas/s':>11} {'bytes':>11}")
+    for nome, r in resultados.items():
+        r['linhas_por_s'] = round(args.linhas / r['s'])
+        r['ms'] = round(r.pop('s') * 1000, 1)
+        print(f"{nome:<14} {r['ms']:>9} {r['linhas_por_s']:>11} {r['bytes']:>11}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'linhas': args.linhas, 'resultados': resultados}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
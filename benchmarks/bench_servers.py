@@ -0,0 +1,94 @@
+# benchmarks/bench_servers.py - Pedidos/s com o servidor de desenvolvimento vs. produção
+#
+# Lança o database_service (não precisa de YOLO nem de câmaras) com cada modo de
+# servidor de shared/serving.py e mede pedidos/s e latência em /health e /events,
+# com clientes keep-alive (uma requests.Session por thread).
+#
+# Exemplo:
+#   python benchmarks/bench_servers.py --concorrencia 16 --duracao 10 --json servidores.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from comum import ROOT_DIR, carga_concorrente, esperar_health, percentis
+
+sys.path.insert(0, ROOT_DIR)
+import run_services  # noqa: E402
+
+URL = "http://127.0.0.1:5004"
+CENARIOS = {
+    'dev': {'SERVER_MODE': 'dev'},
+    'waitress': {'SERVER_MODE': 'prod', 'SERVER_WORKERS': '1'},
+    'gunicorn_2w': {'SERVER_MODE': 'prod', 'SERVER_WORKERS': '2'},
+}
+
+
+def correr_cenario(nome, env, concorrencia, duracao):
+    sessoes = threading.local()
+
+    def pedir(caminho):
+        if not hasattr(sessoes, 's'):
+            sessoes.s = requests.Session()
+        return sessoes.s.get(f"{URL}{caminho}", timeout=10).status_code == 200
+
+    resultado = {'servidor': nome}
+    for caminho in ('/health', '/events?limite=20'):
+        pedir(caminho)     # aquecimento
+        latencias, erros = carga_concorrente(lambda: pedir(caminho), concorrencia, duracao)
+        resultado[caminho] = {
+            'pedidos_por_s': round(len(latencias) / duracao, 1),
+            'latencia_ms': percentis(latencias),
+            'erros': erros,
+        }
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de desenvolvimento vs. produção (database_service)")
+    parser.add_argument('--cenarios', nargs='+', default=list(CENARIOS), choices=list(CENARIOS))
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--duracao', type=float, default=10)
+    parser.add_argument('--eventos', type=int, default=200, help="Eventos inseridos antes de medir")
+    parser.add_argument('--json', help="Ficheiro onde gravar os resultados")
+    args = parser.parse_args()
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for nome in args.cenarios:
+            env = dict(CENARIOS[nome], DATABASE_PATH=os.path.join(tmp, f"{nome}.db"), LOG_LEVEL="WARNING")
+            config = run_services.services["Database Service"]
+            process = run_services.start_service(nome, config, env=env,
+                                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                if not esperar_health(URL):
+                    raise RuntimeError(f"database_service ({nome}) não arrancou")
+                for i in range(args.eventos):
+                    requests.post(f"{URL}/events", json={'camera_id': 'bench', 'camera_nome': 'Bench',
+                                                        'confianca': 0.9, 'bbox': [0, 0, 10, 10]}, timeout=10)
+                r = correr_cenario(nome, env, args.concorrencia, args.duracao)
+                print(f"{nome:<12} /health {r['/health']['pedidos_por_s']:>8}/s   "
+                      f"/events {r['/events?limite=20']['pedidos_por_s']:>8}/s")
+                resultados.append(r)
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                time.sleep(1)   # liberta a porta
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'servidores', 'config': vars(args), 'resultados': resultados}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/comum.py - Funções partilhadas pelos benchmarks
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import requests
+
+try:
+    import psutil   # opcional: sem ele usamos /proc (só Linux)
+except ImportError:
+    psutil = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def gerar_video_sintetico(path, width=1280, height=720, fps=25, seconds=20):
+    """Cria um vídeo MJPG com um padrão em movimento (simula uma câmara 720p)."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    ruido = np.random.default_rng(0).integers(0, 40, (height, width, 3), dtype=np.uint8)
+    for i in range(fps * seconds):
+        frame = ruido.copy()
+        x = (i * 15) % (width - 200)
+        cv2.rectangle(frame, (x, height // 3), (x + 200, height // 3 + 300), (200, 200, 200), -1)
+        cv2.putText(frame, f"frame {i}", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def esperar_health(url, timeout=30, chave=None):
+    """Espera por um 200 no /health; com 'chave', também que esse campo do JSON seja verdadeiro."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            r = requests.get(f"{url}/health", timeout=1)
+            if r.status_code == 200 and (chave is None or r.json().get(chave)):
+                return True
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        time.sleep(0.3)
+    return False
+
+
+def percentis(valores, pontos=(50, 90, 99)):
+    if not valores:
+        return {f"p{p}": None for p in pontos}
+    ordenados = np.sort(np.asarray(valores))
+    return {f"p{p}": round(float(np.percentile(ordenados, p)), 2) for p in pontos}
+
+
+def amostra_processo(pid):
+    """Devolve (segundos de CPU acumulados, RSS em MB) de um processo."""
+    if psutil:
+        proc = psutil.Process(pid)
+        cpu = proc.cpu_times()
+        return cpu.user + cpu.system, proc.memory_info().rss / 1024 / 1024
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu = (int(campos[11]) + int(campos[12])) / ticks
+        with open(f"/proc/{pid}/status") as f:
+            rss_kb = next(int(l.split()[1]) for l in f if l.startswith('VmRSS:'))
+        return cpu, rss_kb / 1024
+    except (OSError, StopIteration):
+        return None, None
+
+
+def carga_concorrente(funcao, concorrencia, duracao):
+    """Chama funcao() em 'concorrencia' threads durante 'duracao' s. Devolve (latências ms, erros)."""
+    latencias, erros = [], [0]
+    lock = threading.Lock()
+    fim = time.time() + duracao
+
+    def worker():
+        while time.time() < fim:
+            inicio = time.perf_counter()
+            try:
+                ok = funcao()
+            except requests.exceptions.RequestException:
+                ok = False
+            ms = (time.perf_counter() - inicio) * 1000
+            with lock:
+                if ok:
+                    latencias.append(ms)
+                else:
+                    erros[0] += 1
+
+    with ThreadPoolExecutor(concorrencia) as pool:
+        for _ in range(concorrencia):
+            pool.submit(worker)
+    return latencias, erros[0]
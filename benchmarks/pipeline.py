@@ -0,0 +1,255 @@
+# benchmarks/pipeline.py - Benchmark ponta-a-ponta da pipeline de microsserviços
+#
+# Lança database_service, detection_service e camera_service com a mesma
+# configuração do run_services.py, mas com:
+#   - vídeos sintéticos como fontes das câmaras,
+#   - uma base de dados SQLite temporária,
+#   - um "sink" falso no lugar do notification_service (conta os /notify),
+# e mede frames capturados/s, inferências/s, latência do /detect (percentis),
+# ingestão de eventos/s e CPU/RSS de cada serviço. O resultado é JSON, para
+# comparar execuções (ex: antes/depois de mexer no _capture_loop ou no detectar()).
+#
+# Exemplo:
+#   python benchmarks/pipeline.py --cameras 8 --duracao 20 --json antes.json
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import requests
+
+from comum import ROOT_DIR, amostra_processo, carga_concorrente, esperar_health, gerar_video_sintetico, percentis
+
+sys.path.insert(0, ROOT_DIR)
+import run_services  # noqa: E402  (reutiliza a configuração e o arranque dos serviços)
+
+URLS = {
+    "Database Service": "http://127.0.0.1:5004",
+    "Detection Service": "http://127.0.0.1:5002",
+    "Camera Service": "http://127.0.0.1:5001",
+}
+
+# ==============================================================================
+# SINK DE NOTIFICAÇÕES FALSO
+# ==============================================================================
+
+class NotificationSink(ThreadingHTTPServer):
+    """Servidor HTTP mínimo que aceita POST /notify e conta os pedidos."""
+    def __init__(self, port):
+        self.recebidas = 0
+        self._lock = threading.Lock()
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with sink._lock:
+                    sink.recebidas += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"mensagem": "ok"}')
+
+            def do_GET(self):
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'{"status": "ok"}')
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', port), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+# ==============================================================================
+# FASES DO BENCHMARK
+# ==============================================================================
+
+def fase_captura(num_cameras, video_path, fps, duracao):
+    url = URLS["Camera Service"]
+    for i in range(num_cameras):
+        requests.post(f"{url}/cameras", json={'id': f"bench{i}", 'nome': f"Bench {i}", 'url': video_path, 'fps': fps}, timeout=10)
+    time.sleep(3)   # aquecimento
+    inicio = {c['id']: c['frames_publicados'] for c in requests.get(f"{url}/cameras/stats", timeout=10).json()['cameras']}
+    time.sleep(duracao)
+    stats = requests.get(f"{url}/cameras/stats", timeout=10).json()['cameras']
+    total = sum(c['frames_publicados'] - inicio.get(c['id'], 0) for c in stats)
+    return {
+        'cameras': num_cameras,
+        'fps_alvo_por_camera': fps,
+        'frames_capturados_por_s': round(total / duracao, 1),
+        'encode_ms_medio': round(sum(c['encode_ms'] for c in stats) / max(len(stats), 1), 2),
+    }
+
+
+def parar_cameras(num_cameras):
+    """
+    Para as câmaras da fase de captura: senão continuavam a enviar frames para o
+    /detect e a gravar eventos durante as fases seguintes, que mediriam a carga
+    do benchmark mais a das câmaras.
+    """
+    url = URLS["Camera Service"]
+    for i in range(num_cameras):
+        requests.post(f"{url}/cameras/bench{i}/stop", timeout=10)
+    restantes = [c['id'] for c in requests.get(f"{url}/cameras/stats", timeout=10).json()['cameras']]
+    if restantes:
+        raise RuntimeError(f"Câmaras ainda ativas depois da fase de captura: {restantes}")
+    time.sleep(2)   # deixa acabar os /detect que já estavam a caminho
+
+
+def fase_detecao(video_path, concorrencia, duracao):
+    cap = cv2.VideoCapture(video_path)
+    _, frame = cap.read()
+    cap.release()
+    jpeg = cv2.imencode('.jpg', cv2.resize(frame, (640, 480)))[1].tobytes()
+    url = f"{URLS['Detection Service']}/detect"
+
+    cache_hits = []
+
+    def detectar():
+        r = requests.post(url, files={'frame': ('frame.jpg', jpeg, 'image/jpeg')},
+                          data={'camera_id': 'bench-carga', 'camera_nome': 'Bench Carga'}, timeout=30)
+        if r.status_code != 200:
+            return False
+        if r.json().get('cache'):
+            cache_hits.append(1)
+        return True
+
+    latencias, erros = carga_concorrente(detectar, concorrencia, duracao)
+    # Com a cache ligada o mesmo frame repetido é servido sem inferência:
+    # o hit rate diz quantos dos pedidos não chegaram ao modelo.
+    return {
+        'concorrencia': concorrencia,
+        'inferencias_por_s': round((len(latencias) - len(cache_hits)) / duracao, 2),
+        'pedidos_por_s': round(len(latencias) / duracao, 2),
+        'cache_hit_rate': round(len(cache_hits) / len(latencias), 3) if latencias else 0.0,
+        'latencia_ms': percentis(latencias),
+        'erros': erros,
+    }
+
+
+def fase_eventos(concorrencia, duracao):
+    url = f"{URLS['Database Service']}/events"
+    evento = {'camera_id': 'bench-eventos', 'camera_nome': 'Bench Eventos', 'confianca': 0.9,
+              'bbox': [10, 20, 110, 220], 'foto_path': None}
+
+    def ingerir():
+        return requests.post(url, json=evento, timeout=10).status_code == 201
+
+    latencias, erros = carga_concorrente(ingerir, concorrencia, duracao)
+    inicio = time.perf_counter()
+    requests.get(url, params={'limite': 1000}, timeout=30)
+    return {
+        'concorrencia': concorrencia,
+        'eventos_por_s': round(len(latencias) / duracao, 1),
+        'latencia_ms': percentis(latencias),
+        'erros': erros,
+        'listar_1000_ms': round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+def medir_recursos(pids, funcao):
+    """Executa funcao() e devolve (resultado, {serviço: CPU% e RSS durante a fase})."""
+    antes = {nome: amostra_processo(pid) for nome, pid in pids.items()}
+    inicio = time.time()
+    resultado = funcao()
+    duracao = time.time() - inicio
+    recursos = {}
+    for nome, pid in pids.items():
+        cpu, rss = amostra_processo(pid)
+        cpu_antes = antes[nome][0]
+        recursos[nome] = {
+            'cpu_percent': round(100 * (cpu - cpu_antes) / duracao, 1) if cpu is not None and cpu_antes is not None else None,
+            'rss_mb': round(rss, 1) if rss is not None else None,
+        }
+    return resultado, recursos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta-a-ponta da pipeline de monitoramento")
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--duracao', type=float, default=15, help="Duração de cada fase (s)")
+    parser.add_argument('--concorrencia-detecao', type=int, default=2)
+    parser.add_argument('--concorrencia-eventos', type=int, default=8)
+    parser.add_argument('--sem-detecao', action='store_true', help="Não lança o detection_service (sem YOLO)")
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help="DETECTION_CACHE_TTL do detection_service (0 = sem cache: mede inferências reais)")
+    parser.add_argument('--video', help="Vídeo a usar como fonte (por omissão gera um sintético)")
+    parser.add_argument('--sink-port', type=int, default=5903)
+    parser.add_argument('--json', help="Ficheiro onde gravar os resultados")
+    args = parser.parse_args()
+
+    nomes = ["Database Service", "Camera Service"] if args.sem_detecao else \
+            ["Database Service", "Detection Service", "Camera Service"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = args.video or gerar_video_sintetico(os.path.join(tmp, "fake_cam.avi"))
+        sink = NotificationSink(args.sink_port)
+        env = {
+            'DATABASE_PATH': os.path.join(tmp, "bench.db"),
+            'CAPTURES_DIR': os.path.join(tmp, "fotos"),
+            'CLIPS_DIR': os.path.join(tmp, "clips"),
+            'NOTIFICATION_SERVICE_URL': f"http://127.0.0.1:{args.sink_port}",
+            'DETECTION_SERVICE_URL': "" if args.sem_detecao else URLS["Detection Service"],
+            'DETECTION_CACHE_TTL': str(args.cache_ttl),
+        }
+        log = open(os.path.join(tmp, "servicos.log"), 'w')
+        resultados = {
+            'benchmark': 'pipeline',
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': {'plataforma': platform.platform(), 'cpus': os.cpu_count(), 'python': platform.python_version()},
+            'config': vars(args),
+            'fases': {},
+        }
+        try:
+            for nome in nomes:
+                run_services.start_service(nome, run_services.services[nome], env=env, stdout=log, stderr=subprocess.STDOUT)
+            for nome in nomes:
+                # O detection_service responde ao /health antes de o YOLO acabar de carregar
+                chave = 'modelo_carregado' if nome == "Detection Service" else None
+                if not esperar_health(URLS[nome], timeout=300, chave=chave):
+                    raise RuntimeError(f"{nome} não ficou pronto (/health)")
+            pids = {nome: run_services.processes[nome].pid for nome in nomes}
+
+            fases = [('captura', lambda: fase_captura(args.cameras, video_path, args.fps, args.duracao))]
+            if not args.sem_detecao:
+                fases.append(('detecao', lambda: fase_detecao(video_path, args.concorrencia_detecao, args.duracao)))
+            fases.append(('eventos', lambda: fase_eventos(args.concorrencia_eventos, args.duracao)))
+
+            for nome_fase, funcao in fases:
+                resultado, recursos = medir_recursos(pids, funcao)
+                resultado['servicos'] = recursos
+                resultados['fases'][nome_fase] = resultado
+                print(f"{nome_fase}: {json.dumps(resultado)}")
+                if nome_fase == 'captura':
+                    parar_cameras(args.cameras)
+
+            resultados['notificacoes_recebidas'] = sink.recebidas
+        finally:
+            run_services.stop_services()
+            sink.shutdown()
+            log.close()
+
+    saida = json.dumps(resultados, indent=2)
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(saida)
+    else:
+        print(saida)
+
+
+if __name__ == '__main__':
+    main()
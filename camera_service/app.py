@@ -1,14 +1,160 @@
 # camera_service/app.py - Versão POO com Lógica de Deteção Integrada
 
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.startup import startup  # primeiro, para o perfil de arranque medir os imports seguintes
+
 import cv2
+import numpy as np
 import time
 import threading
-import os
 import requests  # <-- Importado para "conversar" com o detection_service
 import io        # <-- Importado para formatar os dados da imagem
+import argparse
+import signal
 from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+from shared.metrics import REGISTRY, install_metrics_endpoint
+from shared.log import configure_logging, get_logger
+from shared.serving import serve
+from shared.camera_config import validar_config_camera
+
+from sharding import ShardCoordinator
+from reconnect import ReconnectScheduler
+from clips import FrameRingBuffer, ClipWriter
+from detection_rate import AdaptiveDetectionScheduler
+from detection_pool import DetectionPool, RESULTADO_FALHA, RESULTADO_OK, RESULTADO_SATURADO
+
+startup.marcar('imports')
+
+# ==============================================================================
+# CONFIGURAÇÃO DE CAPTURA
+# ==============================================================================
+
+# Opções passadas ao demuxer do FFmpeg (formato "chave;valor|chave;valor").
+# Por omissão: transporte RTSP por TCP (sem perdas de pacotes UDP) e flags de
+# baixa latência para não acumular frames no buffer interno do FFmpeg.
+DEFAULT_FFMPEG_OPTIONS = os.getenv(
+    "CAMERA_FFMPEG_OPTIONS",
+    "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay|max_delay;500000"
+)
+DEFAULT_FPS = float(os.getenv("CAMERA_FPS", 20))               # FPS de saída (stream)
+DEFAULT_DECODE_THREADS = int(os.getenv("CAMERA_DECODE_THREADS", 1))
+STREAM_SIZE = (640, 480)
+
+# Timeouts do FFmpeg: uma fonte morta não pode prender a thread indefinidamente
+OPEN_TIMEOUT_MS = int(os.getenv("CAMERA_OPEN_TIMEOUT_MS", 5000))
+READ_TIMEOUT_MS = int(os.getenv("CAMERA_READ_TIMEOUT_MS", 5000))
+
+configure_logging('camera_service')
+logger = get_logger('camera_service')
+
+# --- Métricas (expostas em /metrics) ---
+METRICA_FRAMES = REGISTRY.counter('camera_frames_published_total', 'Frames descodificados e publicados no stream', ('camera',))
+METRICA_GRABS = REGISTRY.counter('camera_frames_grabbed_total', 'Frames lidos da fonte (grab)', ('camera',))
+METRICA_FPS = REGISTRY.gauge('camera_output_fps', 'FPS de saída do stream', ('camera',))
+METRICA_ENCODE = REGISTRY.histogram('camera_encode_seconds', 'Resize + encode JPEG de um frame')
+METRICA_DETECAO = REGISTRY.histogram('camera_detection_request_seconds', 'Pedido /detect ao detection_service', ('resultado',))
+METRICA_DETECAO_DESCARTES = REGISTRY.counter('camera_detection_shed_total',
+                                             'Frames descartados pelo detection_service', ('motivo',))
+METRICA_OVERLAY = REGISTRY.histogram('camera_overlay_seconds', 'Desenho das caixas de deteção num frame do stream')
+METRICA_VIEWERS = REGISTRY.gauge('camera_stream_viewers', 'Clientes ligados ao stream MJPEG', ('camera',))
+
+# Agendador central de reconexões (backoff exponencial + jitter + limite global)
+reconnect_scheduler = ReconnectScheduler(
+    base_delay=float(os.getenv("RECONNECT_BASE_DELAY", 1)),
+    max_delay=float(os.getenv("RECONNECT_MAX_DELAY", 60)),
+    opens_per_second=float(os.getenv("RECONNECT_OPENS_PER_SECOND", 2)),
+    burst=int(os.getenv("RECONNECT_BURST", 4)),
+    healthy_after=float(os.getenv("RECONNECT_HEALTHY_AFTER", 10)),
+)
+
+# Ritmo de deteção adaptativo: mais frames das câmaras com deteções recentes,
+# menos das paradas, e abrandamento global quando o detection_service satura.
+# Os limites por câmara vêm da configuração (detecao_min_intervalo/detecao_max_intervalo).
+detection_scheduler = AdaptiveDetectionScheduler(
+    default_min=float(os.getenv("DETECTION_MIN_INTERVAL", 0.25)),
+    default_max=float(os.getenv("DETECTION_MAX_INTERVAL", 5)),
+    initial=float(os.getenv("DETECTION_INTERVAL", 0.5)),
+    idle_after=float(os.getenv("DETECTION_IDLE_AFTER", 10)),
+    target_latency_ms=float(os.getenv("DETECTION_TARGET_LATENCY_MS", 300)),
+    target_inflight=int(os.getenv("DETECTION_TARGET_INFLIGHT", 4)),
+    budget_per_s=float(os.getenv("DETECTION_BUDGET_PER_S", 0)),
+)
+
+DATABASE_SERVICE_URL = os.getenv("DATABASE_SERVICE_URL", "http://127.0.0.1:5004")
+
+# Nós de deteção: os URLs de DETECTION_SERVICE_URL (separados por vírgulas) e os
+# workers registados no database_service (DETECTION_REGISTRY_URL; vazio desliga).
+# DETECTION_SERVICE_URL vazio desliga a deteção por completo.
+_DETECTION_URLS = os.getenv("DETECTION_SERVICE_URL", "http://127.0.0.1:5002")
+detection_pool = DetectionPool(
+    static_urls=[url.strip() for url in _DETECTION_URLS.split(',') if url.strip()],
+    registry_url=(os.getenv("DETECTION_REGISTRY_URL", f"{DATABASE_SERVICE_URL}/detection-workers") or None)
+                 if _DETECTION_URLS else None,
+    refresh_interval=float(os.getenv("DETECTION_REGISTRY_REFRESH", 5)),
+    health_interval=float(os.getenv("DETECTION_HEALTH_INTERVAL", 2)),
+    fail_threshold=int(os.getenv("DETECTION_FAIL_THRESHOLD", 2)),
+)
+DETECTION_FAILOVER_ATTEMPTS = int(os.getenv("DETECTION_FAILOVER_ATTEMPTS", 2))
+# Tempo máximo (desde a captura) para um frame ser analisado; o detection_service
+# descarta-o antes da inferência se já não der tempo. Fica abaixo do timeout do pedido.
+DETECTION_FRAME_DEADLINE_MS = float(os.getenv("DETECTION_FRAME_DEADLINE_MS", 1500))
+# Caixas da última deteção desenhadas no stream com ?overlay=1 enquanto tiverem
+# no máximo CAMERA_OVERLAY_MAX_AGE segundos
+OVERLAY_MAX_AGE = float(os.getenv("CAMERA_OVERLAY_MAX_AGE", 2))
+
+# Clips de eventos: buffer circular de frames JPEG por câmara (limitado em MB)
+# e gravação assíncrona de N segundos antes e depois de cada evento.
+CLIPS_DIR = os.getenv("CLIPS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clips_eventos"))
+CLIP_PRE_SECONDS = float(os.getenv("CLIP_PRE_SECONDS", 5))
+CLIP_POST_SECONDS = float(os.getenv("CLIP_POST_SECONDS", 5))
+CLIP_BUFFER_MAX_MB = float(os.getenv("CLIP_BUFFER_MAX_MB", 16))
+
+clip_writer = ClipWriter(
+    CLIPS_DIR, CLIP_PRE_SECONDS, CLIP_POST_SECONDS, DATABASE_SERVICE_URL,
+    max_pending=int(os.getenv("CLIP_MAX_PENDING", 32)),
+    max_write_mbps=float(os.getenv("CLIP_MAX_WRITE_MBPS", 8)),
+)
+
+# O OpenCV lê as opções do FFmpeg de uma variável de ambiente global do processo.
+# Câmaras com as mesmas opções podem abrir em paralelo; só uma câmara com opções
+# diferentes tem de esperar que as aberturas em curso terminem.
+_ffmpeg_env = {'options': None, 'abrindo': 0}
+_ffmpeg_env_cond = threading.Condition()
+
+def abrir_captura(url, ffmpeg_options, decode_threads):
+    """Abre um cv2.VideoCapture com as opções FFmpeg, timeouts e threads de descodificação da câmara."""
+    params = []
+    if hasattr(cv2, 'CAP_PROP_OPEN_TIMEOUT_MSEC'):
+        params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+                   cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS]
+    if decode_threads and hasattr(cv2, 'CAP_PROP_N_THREADS'):
+        params += [cv2.CAP_PROP_N_THREADS, int(decode_threads)]
+
+    ffmpeg_options = ffmpeg_options or ''
+    with _ffmpeg_env_cond:
+        _ffmpeg_env_cond.wait_for(lambda: _ffmpeg_env['abrindo'] == 0 or _ffmpeg_env['options'] == ffmpeg_options)
+        if _ffmpeg_env['options'] != ffmpeg_options:
+            if ffmpeg_options:
+                os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = ffmpeg_options
+            else:
+                os.environ.pop("OPENCV_FFMPEG_CAPTURE_OPTIONS", None)
+            _ffmpeg_env['options'] = ffmpeg_options
+        _ffmpeg_env['abrindo'] += 1
+    try:
+        video_capture = cv2.VideoCapture(url, cv2.CAP_FFMPEG, params)
+    finally:
+        with _ffmpeg_env_cond:
+            _ffmpeg_env['abrindo'] -= 1
+            _ffmpeg_env_cond.notify_all()
+
+    video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return video_capture
+
 # ==============================================================================
 # CLASSE DA CÂMARA (POO)
 # ==============================================================================
@@ -24,118 +170,298 @@ class Camera:
         self.nome = config.get('nome', self.id)
         self.url = config['url']
 
+        # --- Afinação da captura (por câmara) ---
+        # Valores já validados no POST /cameras (validar_config_camera); None = por omissão
+        self.fps = float(config['fps']) if config.get('fps') is not None else DEFAULT_FPS
+        self.decode_threads = int(config['decode_threads']) if config.get('decode_threads') is not None else DEFAULT_DECODE_THREADS
+        self.ffmpeg_options = config.get('ffmpeg_options', DEFAULT_FFMPEG_OPTIONS)
+        # Ficheiros locais (sem "://") são lidos ao ritmo do vídeo, como uma câmara real
+        self.is_live = '://' in self.url
+
         self.thread = None          # A thread que executa a captura
         self.is_running = False     # Um sinalizador para controlar o estado da captura
         self.latest_frame = None    # Armazena o último frame capturado
+        self.latest_frame_ts = 0    # Instante (time.time) em que o frame foi capturado
+        self.frame_seq = 0          # Número de sequência do último frame publicado
+        self.criada_em = time.time()  # Distingue os ETags dos snapshots depois de reiniciar a câmara
         self._lock = threading.Lock() # "Cadeado" para acesso seguro ao frame
+        # Frames recentes para os clips (pre-roll + post-roll, com margem)
+        self.ring_buffer = FrameRingBuffer(
+            max_seconds=CLIP_PRE_SECONDS + CLIP_POST_SECONDS + 2,
+            max_bytes=int(CLIP_BUFFER_MAX_MB * 1024 * 1024)
+        )
+
+        # --- Estatísticas de captura ---
+        self.frames_grabbed = 0     # Frames lidos da fonte (grab)
+        self.frames_output = 0      # Frames descodificados e publicados (retrieve)
+        self.output_fps = 0.0
+        self.encode_ms = 0.0        # Média móvel do tempo de resize + JPEG
+        self.latency_ms = 0.0       # Média móvel captura -> envio ao cliente do stream
+        self.cpu_percent = 0.0      # CPU da thread de captura (não inclui threads do FFmpeg)
 
         # --- LINHAS CORRIGIDAS (ADICIONE ISTO) ---
-        self.detection_service_url = os.getenv("DETECTION_SERVICE_URL", "http://127.0.0.1:5002")
-        self.last_detection_time = 0
-        self.detection_interval = 0.5  # Intervalo entre deteções (em segundos)
+        # Os nós de deteção estão no detection_pool; DETECTION_SERVICE_URL vazio
+        # desliga a deteção (útil em benchmarks de captura)
+        self.detection_enabled = detection_pool.ativo
+        # O intervalo entre deteções é decidido pelo detection_scheduler (adaptativo)
+        detection_scheduler.configure(self.id, config.get('detecao_min_intervalo'),
+                                      config.get('detecao_max_intervalo'))
+        # Classe de prioridade na fila do detection_service (alta, normal, baixa)
+        self.prioridade = config.get('prioridade') or 'normal'
+        # Última resposta do /detect (pessoas e caixas), só em memória, para o
+        # overlay do stream e o GET /detection/state
+        self.estado_detecao = None
+        self._overlay = (None, None)    # ((seq, atualizado), JPEG com as caixas)
 
     def _capture_loop(self):
         """
         O método privado que corre em loop na sua própria thread.
         Responsável por conectar, capturar e agora, disparar a deteção.
+
+        Usa grab() em todos os frames (esvazia o buffer da fonte sem conversão
+        para BGR) e retrieve() apenas nos frames necessários para o FPS de saída,
+        em vez de read() + sleep fixo, que atrasava fontes de 25-30 FPS.
         """
-        print(f"THREAD {self.id}: A iniciar para {self.nome}...")
+        logger.info("THREAD %s: A iniciar para %s...", self.id, self.nome)
         video_capture = None
-        
+        frame_interval = 1.0 / self.fps
+        source_interval = 0
+        next_output = 0
+        stats_window_start = time.time()
+        stats_cpu_start = time.thread_time()
+        stats_frames = 0
+        stats_grabs = 0
+
         while self.is_running:
             try:
                 if video_capture is None or not video_capture.isOpened():
-                    # Lógica de conexão/reconexão
-                    print(f"THREAD {self.id}: A tentar conectar a {self.nome}...")
-                    video_capture = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
-                    video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                    # Lógica de conexão/reconexão: o agendador decide quando podemos tentar
+                    if not reconnect_scheduler.acquire_open(self.id, lambda: self.is_running):
+                        break
+                    logger.info("THREAD %s: A tentar conectar a %s...", self.id, self.nome)
+                    video_capture = abrir_captura(self.url, self.ffmpeg_options, self.decode_threads)
 
                     if not video_capture.isOpened():
-                        print(f"THREAD {self.id}: Falha ao conectar. A tentar novamente em 10s...")
-                        time.sleep(10)
+                        video_capture.release(); video_capture = None
+                        delay = reconnect_scheduler.report_failure(self.id, 'falha ao conectar')
+                        logger.warning("THREAD %s: Falha ao conectar. Nova tentativa em %.1fs...", self.id, delay)
                         continue
+                    reconnect_scheduler.report_success(self.id)
 
-                sucesso, frame = video_capture.read()
+                    source_fps = video_capture.get(cv2.CAP_PROP_FPS) or 0
+                    source_interval = 1.0 / source_fps if (not self.is_live and source_fps > 0) else 0
 
-                if not sucesso:
-                    print(f"THREAD {self.id}: Perdeu frame de {self.nome}. A reconectar...")
+                grab_start = time.time()
+                if not video_capture.grab():
+                    logger.warning("THREAD %s: Perdeu frame de %s. A reconectar...", self.id, self.nome)
                     video_capture.release(); video_capture = None
-                    time.sleep(2)
+                    reconnect_scheduler.report_failure(self.id, 'frame perdido')
+                    continue
+
+                capture_time = time.time()
+                self.frames_grabbed += 1
+
+                if source_interval:
+                    # Ficheiro local: simula o ritmo de uma câmara real
+                    time.sleep(max(0, source_interval - (capture_time - grab_start)))
+
+                if capture_time < next_output:
+                    continue  # Frame descartado sem conversão/encode
+                next_output = max(next_output + frame_interval, capture_time)
+
+                sucesso, frame = video_capture.retrieve()
+                if not sucesso:
                     continue
 
                 # Processa e armazena o frame para o STREAMING
-                frame_redimensionado = cv2.resize(frame, (640, 480))
+                encode_start = time.perf_counter()
+                frame_redimensionado = cv2.resize(frame, STREAM_SIZE)
                 _, buffer = cv2.imencode('.jpg', frame_redimensionado)
-                
+                encode_s = time.perf_counter() - encode_start
+                self.encode_ms = 0.9 * self.encode_ms + 0.1 * encode_s * 1000
+                METRICA_ENCODE.observe(encode_s)
+
                 frame_bytes_para_stream = buffer.tobytes()
                 with self._lock:
                     self.latest_frame = frame_bytes_para_stream
-                
+                    self.latest_frame_ts = capture_time
+                    self.frame_seq += 1
+                self.ring_buffer.append(capture_time, frame_bytes_para_stream)
+                self.frames_output += 1
+                stats_frames += 1
+
+                # Atualiza FPS e CPU da thread uma vez por segundo
+                elapsed = capture_time - stats_window_start
+                if elapsed >= 1.0:
+                    cpu_now = time.thread_time()
+                    self.output_fps = stats_frames / elapsed
+                    self.cpu_percent = 100.0 * (cpu_now - stats_cpu_start) / elapsed
+                    # Métricas atualizadas em lote (1x/s) para não pesar no loop
+                    METRICA_FRAMES.inc(stats_frames, camera=self.id)
+                    METRICA_GRABS.inc(self.frames_grabbed - stats_grabs, camera=self.id)
+                    METRICA_FPS.set(round(self.output_fps, 2), camera=self.id)
+                    stats_window_start, stats_cpu_start, stats_frames = capture_time, cpu_now, 0
+                    stats_grabs = self.frames_grabbed
+
                 # --- NOVA LÓGICA DE DETEÇÃO ---
-                current_time = time.time()
-                if current_time - self.last_detection_time > self.detection_interval:
-                    self.last_detection_time = current_time
-                    
+                if self.detection_enabled and detection_scheduler.should_detect(self.id, capture_time):
                     # Copiamos o frame para enviar para deteção
                     # Usamos uma nova thread para não bloquear o loop de captura!
                     detection_thread = threading.Thread(
                         target=self._send_frame_for_detection,
-                        args=(frame_bytes_para_stream,), # Passa o frame
+                        args=(frame_bytes_para_stream, capture_time), # Passa o frame
                         daemon=True
                     )
                     detection_thread.start()
                 # --- FIM DA LÓGICA DE DETEÇÃO ---
 
             except Exception as e:
-                print(f"THREAD {self.id}: Erro inesperado: {e}")
+                logger.error("THREAD %s: Erro inesperado: %s", self.id, e)
                 if video_capture: video_capture.release()
-                video_capture = None; time.sleep(5)
-            
-            time.sleep(1 / 20) # Limita a ~20 FPS
+                video_capture = None
+                reconnect_scheduler.report_failure(self.id, str(e))
 
         if video_capture: video_capture.release()
-        print(f"THREAD {self.id}: Captura para {self.nome} finalizada.")
+        logger.info("THREAD %s: Captura para %s finalizada.", self.id, self.nome)
 
-    def _send_frame_for_detection(self, frame_bytes):
+    def _send_frame_for_detection(self, frame_bytes, capture_ts):
         """
         NOVO MÉTODO: Envia um frame para o detection_service e imprime um alerta.
         Corre numa thread separada para não travar o vídeo.
+        O nó de deteção é escolhido pelo detection_pool; se o nó recusar a ligação
+        ou estiver saturado (503/429) o frame segue para outro nó (failover). Num
+        timeout não há nova tentativa: o nó pode ter processado o frame. Um frame
+        descartado pelo nó (X-Detect-Shed: fila cheia ou prazo ultrapassado) também
+        não segue para outro nó: já está velho, e o próximo é mais útil.
+        O resultado (e a carga do detection_service) é sempre reportado ao
+        detection_scheduler, que ajusta o ritmo de deteção.
         """
+        detectado, saturado, latency_ms, inflight = False, False, None, None
+        tentados = []
         try:
-            # Prepara o ficheiro em memória para enviar
-            files = {'frame': ('frame.jpg', io.BytesIO(frame_bytes), 'image/jpeg')}
             # Envia dados extra sobre a câmara
-            data = {'camera_id': self.id, 'camera_nome': self.nome}
-            
-            # Envia a requisição para o "cérebro"
-            response = requests.post(
-                f"{self.detection_service_url}/detect",
-                files=files,
-                data=data,
-                timeout=2 # Timeout curto para não prender a thread
-            )
-            
-            if response.status_code == 200:
-                resultado = response.json()
-                # Se o "cérebro" disse que detetou, imprimimos o alerta!
-                if resultado.get('detectado'):
-                    print("\n" + "="*50)
-                    print(f"!!! ALERTA DE DETEÇÃO NA CÂMARA {self.nome} !!!")
-                    print(f"!!! {len(resultado.get('pessoas', []))} pessoa(s) detectada(s).")
-                    print("="*50 + "\n")
-            else:
-                print(f"DETECTION_SERVICE: Respondeu com erro {response.status_code}")
+            data = {'camera_id': self.id, 'camera_nome': self.nome, 'prioridade': self.prioridade}
+
+            for _ in range(DETECTION_FAILOVER_ATTEMPTS):
+                url = detection_pool.acquire(self.id, excluir=tentados)
+                if url is None:
+                    # Nenhum nó disponível: conta como saturação para abrandar o envio
+                    saturado = True
+                    logger.debug("DETECTION_SERVICE: Nenhum nó de deteção disponível.")
+                    break
+                tentados.append(url)
+                # Prepara o ficheiro em memória para enviar
+                files = {'frame': ('frame.jpg', io.BytesIO(frame_bytes), 'image/jpeg')}
+
+                # Prazo que resta a este frame (inclui o tempo em tentativas anteriores)
+                data['deadline_ms'] = round(max(0.0, DETECTION_FRAME_DEADLINE_MS - (time.time() - capture_ts) * 1000))
+
+                # Envia a requisição para o "cérebro"
+                inicio = time.perf_counter()
+                try:
+                    response = requests.post(
+                        f"{url}/detect",
+                        files=files,
+                        data=data,
+                        timeout=2 # Timeout curto para não prender a thread
+                    )
+                except requests.exceptions.ConnectionError:
+                    detection_pool.release(url, RESULTADO_FALHA)
+                    METRICA_DETECAO.observe(time.perf_counter() - inicio, resultado='offline')
+                    # Normal se o nó estiver offline: tenta o próximo
+                    logger.debug("DETECTION_SERVICE: %s offline ou a recusar conexão.", url)
+                    continue
+                except requests.exceptions.Timeout:
+                    detection_pool.release(url, RESULTADO_SATURADO)
+                    raise
+
+                latency_ms = (time.perf_counter() - inicio) * 1000
+                METRICA_DETECAO.observe(latency_ms / 1000, resultado=response.status_code)
+
+                # Carga reportada pelo detection_service (se disponível) para o abrandamento global
+                if response.headers.get('X-Detect-Latency-Ms'):
+                    latency_ms = float(response.headers['X-Detect-Latency-Ms'])
+                if response.headers.get('X-Detect-Inflight'):
+                    inflight = int(response.headers['X-Detect-Inflight'])
+                if response.headers.get('X-Detect-Shed'):
+                    # O nó está bem, só deu prioridade a outros frames: sem pausa nem failover,
+                    # e não conta como saturação para o abrandamento global (saturado fica False)
+                    detection_pool.release(url, RESULTADO_OK)
+                    METRICA_DETECAO_DESCARTES.inc(motivo=response.headers['X-Detect-Shed'])
+                    logger.debug("DETECTION_SERVICE: Frame de %s descartado por %s (%s).",
+                                 self.id, url, response.headers['X-Detect-Shed'])
+                    break
+                saturado = response.status_code in (429, 503)
+                if saturado:
+                    detection_pool.release(url, RESULTADO_SATURADO,
+                                           retry_after=float(response.headers.get('Retry-After') or 1))
+                    continue
+                detection_pool.release(url, RESULTADO_OK if response.status_code < 500 else RESULTADO_FALHA, latency_ms)
+
+                if response.status_code == 200:
+                    resultado = response.json()
+                    detectado = bool(resultado.get('detectado'))
+                    self._atualizar_estado_detecao(resultado.get('pessoas', []), capture_ts, url)
+                    # Se o "cérebro" disse que detetou, registamos o alerta!
+                    if resultado.get('evento_id'):
+                        # Novo evento registado: grava o clip à volta deste frame
+                        clip_writer.schedule(self.id, self.ring_buffer, resultado['evento_id'], capture_ts)
+                    if detectado:
+                        logger.info("ALERTA DE DETEÇÃO NA CÂMARA %s: %d pessoa(s) detectada(s).",
+                                    self.nome, len(resultado.get('pessoas', [])))
+                else:
+                    logger.warning("DETECTION_SERVICE: %s respondeu com erro %s", url, response.status_code)
+                break
 
-        except requests.exceptions.ConnectionError:
-            # Normal se o detection_service estiver offline
-            # print(f"DETECTION_SERVICE: Offline ou a recusar conexão.")
-            pass
         except requests.exceptions.Timeout:
+            METRICA_DETECAO.observe(time.perf_counter() - inicio, resultado='timeout')
+            saturado = True
             # Normal se a deteção demorar mais que o nosso timeout
-            # print(f"DETECTION_SERVICE: Demorou muito a responder (Timeout).")
-            pass
+            logger.debug("DETECTION_SERVICE: Demorou muito a responder (Timeout).")
         except Exception as e:
-            print(f"DETECTION_SERVICE: Erro inesperado: {e}")
+            logger.error("DETECTION_SERVICE: Erro inesperado: %s", e)
+        finally:
+            detection_scheduler.report_result(self.id, detectado, latency_ms, saturado, inflight)
+
+    def _atualizar_estado_detecao(self, pessoas, capture_ts, url):
+        # Mesmo formato do GET /state do detection_service
+        self.estado_detecao = {
+            'atualizado': round(time.time(), 3),
+            'capturado': round(capture_ts, 3),
+            'pessoas': len(pessoas),
+            'caixas': [p['bbox'] + [round(p['confianca'], 2)] for p in pessoas],
+            'no': url,
+        }
+
+    def get_detection_state(self):
+        estado = self.estado_detecao
+        if estado is None:
+            return None
+        return dict(estado, idade_s=round(time.time() - estado['atualizado'], 2))
+
+    def get_overlay_frame_info(self):
+        """
+        Como get_frame_info, mas com as caixas da última deteção (se recente)
+        desenhadas por cima. Só corre para clientes que pedem overlay; o JPEG
+        desenhado é partilhado por todos eles até chegar outro frame ou deteção.
+        """
+        seq, capture_ts, frame = self.get_frame_info()
+        estado = self.estado_detecao
+        if (not frame or estado is None or not estado['caixas']
+                or time.time() - estado['atualizado'] > OVERLAY_MAX_AGE):
+            return seq, capture_ts, frame
+        chave = (seq, estado['atualizado'])
+        chave_atual, jpeg = self._overlay
+        if chave_atual != chave:
+            with METRICA_OVERLAY.time():
+                imagem = cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR)
+                for x1, y1, x2, y2, confianca in estado['caixas']:
+                    cv2.rectangle(imagem, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                    cv2.putText(imagem, f"Pessoa {confianca:.2f}", (x1, max(12, y1 - 6)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+                jpeg = cv2.imencode('.jpg', imagem)[1].tobytes()
+            self._overlay = (chave, jpeg)
+        return seq, capture_ts, jpeg
 
     def start(self):
         if self.is_running: return
@@ -152,6 +478,31 @@ class Camera:
         with self._lock:
             return self.latest_frame
 
+    def get_frame_info(self):
+        """Devolve (seq, instante de captura, bytes JPEG) do último frame."""
+        with self._lock:
+            return self.frame_seq, self.latest_frame_ts, self.latest_frame
+
+    def record_delivery(self, capture_ts):
+        """Regista a latência captura -> envio de um frame ao cliente do stream."""
+        latency = (time.time() - capture_ts) * 1000
+        self.latency_ms = latency if self.latency_ms == 0 else 0.9 * self.latency_ms + 0.1 * latency
+
+    def get_stats(self):
+        return {
+            'id': self.id,
+            'fps_alvo': self.fps,
+            'fps_saida': round(self.output_fps, 2),
+            'frames_lidos': self.frames_grabbed,
+            'frames_publicados': self.frames_output,
+            'encode_ms': round(self.encode_ms, 2),
+            'latencia_ms': round(self.latency_ms, 1),
+            'cpu_percent': round(self.cpu_percent, 1),
+            'decode_threads': self.decode_threads,
+            'buffer_clips': self.ring_buffer.get_stats(),
+            'detecao': detection_scheduler.get_camera_stats(self.id),
+        }
+
 # ==============================================================================
 # GESTOR DE CÂMARAS E ROTAS DA API (Sem alterações)
 # ==============================================================================
@@ -179,6 +530,10 @@ class CameraManager:
             if cam_id in self.cameras:
                 self.cameras[cam_id].stop()
                 del self.cameras[cam_id]
+                METRICA_FPS.remove(camera=cam_id)
+                reconnect_scheduler.remove(cam_id)
+                detection_scheduler.remove(cam_id)
+                detection_pool.forget(cam_id)
                 return True
             return False
 
@@ -186,12 +541,47 @@ class CameraManager:
         with self._lock:
             return [cam_id for cam_id, cam in self.cameras.items() if cam.is_running]
 
+    def get_all_stats(self):
+        with self._lock:
+            cameras = list(self.cameras.values())
+        return [cam.get_stats() for cam in cameras]
+
+    def get_all_detection_states(self):
+        with self._lock:
+            cameras = list(self.cameras.values())
+        estados = ((cam.id, cam.get_detection_state()) for cam in cameras)
+        return {cam_id: estado for cam_id, estado in estados if estado is not None}
+
 app = Flask(__name__)
 CORS(app)
+install_metrics_endpoint(app)
 manager = CameraManager()
+REGISTRY.gauge_function('camera_active_cameras', 'Câmaras com captura ativa', lambda: len(manager.get_active_camera_ids()))
+REGISTRY.gauge_function('camera_clip_queue_depth', 'Clips à espera de gravação', lambda: clip_writer.get_stats()['pendentes'])
+REGISTRY.gauge_function('camera_detection_throttle_factor', 'Fator global de abrandamento da deteção', lambda: detection_scheduler.throttle)
+REGISTRY.gauge_function('camera_detection_nodes_healthy', 'Nós de deteção disponíveis', detection_pool.healthy_count)
+
+# Modo sharded: com CAMERA_SERVICE_SHARDS > 1 este processo é só um coordenador
+# que distribui as câmaras por N processos worker (hashing consistente no id).
+CAMERA_SERVICE_SHARDS = int(os.getenv("CAMERA_SERVICE_SHARDS", 1))
+CAMERA_SHARD_BASE_PORT = int(os.getenv("CAMERA_SHARD_BASE_PORT", 5101))
+coordinator = None
+
+def resposta_do_shard(response):
+    """Converte a resposta de um worker numa resposta Flask."""
+    return Response(response.content, status=response.status_code,
+                    content_type=response.headers.get('content-type'))
 
 @app.route('/health')
 def health():
+    if coordinator:
+        return jsonify({
+            'status': 'ok',
+            'service': 'camera_service',
+            'modo': 'coordenador',
+            'cameras_ativas': len(coordinator.active_camera_ids()),
+            'shards': coordinator.shard_status()
+        })
     return jsonify({
         'status': 'ok',
         'service': 'camera_service',
@@ -203,6 +593,15 @@ def iniciar_camera_api():
     data = request.get_json()
     if not data or 'id' not in data or 'url' not in data:
         return jsonify({'erro': 'ID e URL da câmara são obrigatórios'}), 400
+    afinacao, erro = validar_config_camera(data)
+    if erro:
+        return jsonify({'erro': erro}), 400
+    data.update(afinacao)
+    if coordinator:
+        try:
+            return resposta_do_shard(coordinator.start_camera(data))
+        except requests.exceptions.RequestException as e:
+            return jsonify({'erro': f'Shard indisponível: {e}'}), 503
     cam_id = data['id']
     camera_obj = manager.get_camera(cam_id)
     if not camera_obj:
@@ -212,34 +611,203 @@ def iniciar_camera_api():
 
 @app.route('/cameras/<camera_id>/stop', methods=['POST'])
 def parar_camera_api(camera_id):
+    if coordinator:
+        try:
+            return resposta_do_shard(coordinator.stop_camera(camera_id))
+        except requests.exceptions.RequestException as e:
+            return jsonify({'erro': f'Shard indisponível: {e}'}), 503
     if manager.remove_camera(camera_id):
         return jsonify({'mensagem': f'Câmara {camera_id} parada e removida.'})
     else:
         return jsonify({'erro': 'Câmara não encontrada.'}), 404
 
-def gerar_frames_stream(camera_id):
+def gerar_frames_stream(camera_id, overlay=False):
     camera_obj = manager.get_camera(camera_id)
     if not camera_obj: return
-    while camera_obj.is_running:
-        frame = camera_obj.get_frame()
-        if frame:
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        time.sleep(0.05)
+    last_seq = -1
+    obter_frame = camera_obj.get_overlay_frame_info if overlay else camera_obj.get_frame_info
+    METRICA_VIEWERS.inc(camera=camera_id)
+    try:
+        while camera_obj.is_running:
+            seq, capture_ts, frame = obter_frame()
+            if frame and seq != last_seq:
+                # Só envia frames novos; o cabeçalho permite ao cliente medir a latência total
+                last_seq = seq
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n'
+                       b'X-Capture-Timestamp: ' + f'{capture_ts:.3f}'.encode() + b'\r\n\r\n' + frame + b'\r\n')
+                camera_obj.record_delivery(capture_ts)
+            time.sleep(0.01)
+    finally:
+        METRICA_VIEWERS.dec(camera=camera_id)
 
 @app.route('/cameras/<camera_id>/stream')
 def stream_camera(camera_id):
+    """Stream MJPEG; com ?overlay=1 leva desenhadas as caixas da última deteção."""
+    if coordinator:
+        return proxy_stream_shard(camera_id)
     camera_obj = manager.get_camera(camera_id)
     if not camera_obj or not camera_obj.is_running:
         return "Câmara não encontrada ou não está ativa.", 404
-    return Response(gerar_frames_stream(camera_id), mimetype='multipart/x-mixed-replace; boundary=frame')
+    overlay = request.args.get('overlay') == '1'
+    return Response(gerar_frames_stream(camera_id, overlay), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def proxy_stream_shard(camera_id):
+    """Repassa o stream MJPEG do worker dono da câmara (modo coordenador)."""
+    try:
+        req = requests.get(f"{coordinator.shard_url(camera_id)}/cameras/{camera_id}/stream", params=request.args,
+                           stream=True, timeout=10)
+    except requests.exceptions.RequestException:
+        return "Shard da câmara indisponível.", 503
+    if req.status_code != 200:
+        return "Câmara não encontrada ou não está ativa.", req.status_code
+
+    def generate():
+        try:
+            for chunk in req.iter_content(chunk_size=65536):
+                if chunk:
+                    yield chunk
+        finally:
+            req.close()
+
+    return Response(generate(), content_type=req.headers['content-type'])
+
+# Último frame em JPEG, para grelhas com muitas câmaras (em vez de um stream por câmara)
+SNAPSHOT_MAX_AGE = int(os.getenv("CAMERA_SNAPSHOT_MAX_AGE", 1))     # segundos (Cache-Control)
+
+@app.route('/cameras/<camera_id>/snapshot')
+def snapshot_camera(camera_id):
+    """
+    Último frame publicado. O ETag muda a cada frame novo: um pedido com
+    If-None-Match igual recebe 304 sem corpo (câmara parada ou frame repetido).
+    """
+    if coordinator:
+        try:
+            req = requests.get(f"{coordinator.shard_url(camera_id)}/cameras/{camera_id}/snapshot", timeout=3,
+                               headers={'If-None-Match': request.headers.get('If-None-Match', '')})
+        except requests.exceptions.RequestException:
+            return "Shard da câmara indisponível.", 503
+        headers = {k: req.headers[k] for k in ('ETag', 'Cache-Control', 'Last-Modified', 'X-Capture-Timestamp', 'Retry-After')
+                   if k in req.headers}
+        return Response(req.content, status=req.status_code, headers=headers,
+                        content_type=req.headers.get('content-type'))
+
+    camera_obj = manager.get_camera(camera_id)
+    if not camera_obj or not camera_obj.is_running:
+        return "Câmara não encontrada ou não está ativa.", 404
+    seq, capture_ts, frame = camera_obj.get_frame_info()
+    if not frame:
+        return "Câmara ainda sem frames.", 503, {'Retry-After': '1'}
+
+    response = Response(frame, mimetype='image/jpeg')
+    response.set_etag(f"{camera_id}-{camera_obj.criada_em:.0f}-{seq}")
+    response.last_modified = capture_ts
+    response.cache_control.max_age = SNAPSHOT_MAX_AGE
+    response.headers['X-Capture-Timestamp'] = f'{capture_ts:.3f}'
+    return response.make_conditional(request)
+
+@app.route('/cameras/<camera_id>/stats')
+def estatisticas_camera_api(camera_id):
+    if coordinator:
+        try:
+            return resposta_do_shard(requests.get(f"{coordinator.shard_url(camera_id)}/cameras/{camera_id}/stats", timeout=3))
+        except requests.exceptions.RequestException as e:
+            return jsonify({'erro': f'Shard indisponível: {e}'}), 503
+    camera_obj = manager.get_camera(camera_id)
+    if not camera_obj:
+        return jsonify({'erro': 'Câmara não encontrada.'}), 404
+    return jsonify(camera_obj.get_stats())
+
+@app.route('/cameras/stats')
+def estatisticas_cameras_api():
+    if coordinator:
+        return jsonify({'cameras': coordinator.all_stats()})
+    return jsonify({'cameras': manager.get_all_stats()})
+
+@app.route('/cameras/<camera_id>/health')
+def saude_camera_api(camera_id):
+    if coordinator:
+        try:
+            return resposta_do_shard(requests.get(f"{coordinator.shard_url(camera_id)}/cameras/{camera_id}/health", timeout=3))
+        except requests.exceptions.RequestException as e:
+            return jsonify({'erro': f'Shard indisponível: {e}'}), 503
+    saude = reconnect_scheduler.get_health(camera_id)
+    if not saude:
+        return jsonify({'erro': 'Câmara não encontrada.'}), 404
+    return jsonify(saude)
+
+@app.route('/cameras/health')
+def saude_cameras_api():
+    """Estado de conexão de todas as câmaras (conectando, conectada, backoff, falhando)."""
+    if coordinator:
+        return jsonify({'cameras': coordinator.all_health()})
+    return jsonify({'cameras': reconnect_scheduler.get_all_health()})
+
+@app.route('/clips/stats')
+def estatisticas_clips_api():
+    """Fila e débito do gravador de clips (por shard no modo coordenador)."""
+    if coordinator:
+        return jsonify({'shards': {name: data for name, data in coordinator.gather('/clips/stats')}})
+    return jsonify(clip_writer.get_stats())
+
+@app.route('/detection/stats')
+def estatisticas_detecao_api():
+    """Intervalos de deteção por câmara e abrandamento global (por shard no modo coordenador)."""
+    if coordinator:
+        return jsonify({'shards': {name: data for name, data in coordinator.gather('/detection/stats')}})
+    return jsonify(detection_scheduler.get_stats())
+
+@app.route('/detection/nodes')
+def nos_detecao_api():
+    """Nós de deteção conhecidos (fixos e registados), carga e saúde (por shard no modo coordenador)."""
+    if coordinator:
+        return jsonify({'shards': {name: data for name, data in coordinator.gather('/detection/nodes')}})
+    return jsonify(detection_pool.get_stats())
+
+@app.route('/detection/state')
+def estado_detecao_api():
+    """
+    Deteção ao vivo por câmara (pessoas e caixas da última resposta do /detect),
+    só em memória: o dashboard sabe quem está à frente da câmara sem ler eventos.
+    """
+    if coordinator:
+        cameras = {}
+        for _, data in coordinator.gather('/detection/state'):
+            cameras.update(data.get('cameras', {}))
+        return jsonify({'cameras': cameras})
+    return jsonify({'cameras': manager.get_all_detection_states()})
 
 @app.route('/cameras/active')
 def listar_cameras_ativas_api():
+    if coordinator:
+        ids = coordinator.active_camera_ids()
+        return jsonify({'cameras': ids, 'total': len(ids)})
     return jsonify({'cameras': manager.get_active_camera_ids(), 'total': len(manager.get_active_camera_ids())})
 
 if __name__ == '__main__':
-    print("Camera Service - Iniciado (Versao POO + Deteccao)")
-    print("Porta: 5001")
-    print("=" * 50)
-    app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Camera Service")
+    parser.add_argument('--port', type=int, default=int(os.getenv("CAMERA_SERVICE_PORT", 5001)))
+    parser.add_argument('--worker', action='store_true', help="Processo worker de um coordenador (uso interno)")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(f"Camera Service - Worker de shard na porta {args.port}")
+        serve(app, '127.0.0.1', args.port, single_process=True, threads=32,
+              debug=False, use_reloader=False, threaded=True)
+    else:
+        print("Camera Service - Iniciado (Versao POO + Deteccao)")
+        print(f"Porta: {args.port}")
+        if CAMERA_SERVICE_SHARDS > 1:
+            print(f"Modo sharded: {CAMERA_SERVICE_SHARDS} workers a partir da porta {CAMERA_SHARD_BASE_PORT}")
+            coordinator = ShardCoordinator(CAMERA_SERVICE_SHARDS, CAMERA_SHARD_BASE_PORT)
+            coordinator.start()
+            # Garante que o SIGTERM (ex: run_services.py) também encerra os workers
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        print("=" * 50)
+        try:
+            # Um só processo: as threads de captura (ou o coordenador) são deste processo
+            serve(app, '0.0.0.0', args.port, single_process=True, threads=32,
+                  debug=True, use_reloader=False)
+        finally:
+            if coordinator:
+                coordinator.stop()
\ No newline at end of file
@@ -0,0 +1,268 @@
+# camera_service/clips.py - Buffer circular de frames e gravação de clips de eventos
+
+import collections
+import heapq
+import itertools
+import logging
+import os
+import struct
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger('camera_service.clips')
+
+# ==============================================================================
+# BUFFER CIRCULAR DE FRAMES (POR CÂMARA)
+# ==============================================================================
+
+class FrameRingBuffer:
+    """
+    Guarda os frames JPEG mais recentes de uma câmara, limitado em tempo
+    (max_seconds) e em memória (max_bytes). Os frames já vêm codificados do
+    loop de captura, por isso cada entrada é só (instante, bytes).
+    """
+    def __init__(self, max_seconds, max_bytes):
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self._frames = collections.deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def append(self, capture_ts, jpeg_bytes):
+        with self._lock:
+            self._frames.append((capture_ts, jpeg_bytes))
+            self._bytes += len(jpeg_bytes)
+            limite_ts = capture_ts - self.max_seconds
+            while self._frames and (self._bytes > self.max_bytes or self._frames[0][0] < limite_ts):
+                _, antigo = self._frames.popleft()
+                self._bytes -= len(antigo)
+
+    def snapshot(self, start_ts, end_ts):
+        """Devolve os frames capturados no intervalo [start_ts, end_ts]."""
+        with self._lock:
+            return [(ts, data) for ts, data in self._frames if start_ts <= ts <= end_ts]
+
+    def get_stats(self):
+        with self._lock:
+            segundos = self._frames[-1][0] - self._frames[0][0] if self._frames else 0
+            return {
+                'frames': len(self._frames),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'segundos': round(segundos, 1),
+            }
+
+# ==============================================================================
+# CONTENTOR AVI (MJPEG) ESCRITO A PARTIR DOS JPEG
+# ==============================================================================
+
+# Marcadores SOF do JPEG (têm a altura e a largura); C4, C8 e CC são outros segmentos
+_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_dimensoes(jpeg):
+    """(largura, altura) lidas do cabeçalho de um JPEG, sem o descodificar; None se não for JPEG."""
+    if jpeg[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 <= len(jpeg):
+        if jpeg[i] != 0xFF:
+            return None
+        marcador = jpeg[i + 1]
+        if marcador == 0xFF:    # enchimento
+            i += 1
+            continue
+        if marcador in _SOF:
+            altura, largura = struct.unpack('>HH', jpeg[i + 5:i + 9])
+            return largura, altura
+        i += 2 + struct.unpack('>H', jpeg[i + 2:i + 4])[0]
+    return None
+
+
+class MjpegAviWriter:
+    """
+    Escreve um AVI MJPEG com os JPEG tal como vêm do buffer (cada frame é um
+    chunk '00dc'), sem descodificar nem voltar a codificar. Os tamanhos e o
+    número de frames dos cabeçalhos são corrigidos no close(), junto com o
+    índice idx1.
+    """
+    def __init__(self, path, fps, largura, altura):
+        self.f = open(path, 'wb')
+        self.fps = fps
+        self.largura, self.altura = largura, altura
+        self.indice = []        # (offset desde 'movi', tamanho)
+        self.maior = 0
+        self._cabecalhos()
+
+    def _cabecalhos(self):
+        f = self.f
+        escala, taxa = 1000, max(1, round(self.fps * 1000))
+        avih = struct.pack('<14I', round(1000000 / self.fps), 0, 0, 0x10, 0, 0, 1, 0,
+                           self.largura, self.altura, 0, 0, 0, 0)
+        strh = (b'vidsMJPG' + struct.pack('<IHHIIIIIIiI', 0, 0, 0, 0, escala, taxa, 0, 0, 0, -1, 0)
+                + struct.pack('<4h', 0, 0, self.largura, self.altura))
+        strf = struct.pack('<IiiHH4sIiiII', 40, self.largura, self.altura, 1, 24, b'MJPG',
+                           self.largura * self.altura * 3, 0, 0, 0, 0)
+        strl = b'strl' + b'strh' + struct.pack('<I', len(strh)) + strh + b'strf' + struct.pack('<I', len(strf)) + strf
+        hdrl = b'hdrl' + b'avih' + struct.pack('<I', len(avih)) + avih + b'LIST' + struct.pack('<I', len(strl)) + strl
+        f.write(b'RIFF\0\0\0\0AVI ')
+        f.write(b'LIST' + struct.pack('<I', len(hdrl)) + hdrl)
+        # Posições dos campos a corrigir no fim
+        self._avih_frames = 12 + 8 + 4 + 8 + 16
+        self._avih_buffer = self._avih_frames + 12
+        self._strh_length = 12 + 8 + len(hdrl) - len(strl) + 4 + 8 + 32
+        self._movi = f.tell()
+        f.write(b'LIST\0\0\0\0movi')
+
+    def write(self, jpeg):
+        offset = self.f.tell() - (self._movi + 8)
+        self.f.write(b'00dc' + struct.pack('<I', len(jpeg)) + jpeg)
+        if len(jpeg) % 2:
+            self.f.write(b'\0')
+        self.indice.append((offset, len(jpeg)))
+        self.maior = max(self.maior, len(jpeg))
+
+    def close(self):
+        f = self.f
+        fim_movi = f.tell()
+        f.write(b'idx1' + struct.pack('<I', 16 * len(self.indice)))
+        for offset, tamanho in self.indice:
+            f.write(b'00dc' + struct.pack('<III', 0x10, offset, tamanho))
+        fim = f.tell()
+        for posicao, valor in ((4, fim - 8), (self._movi + 4, fim_movi - self._movi - 8),
+                               (self._avih_frames, len(self.indice)), (self._avih_buffer, self.maior),
+                               (self._strh_length, len(self.indice))):
+            f.seek(posicao)
+            f.write(struct.pack('<I', valor))
+        f.close()
+
+# ==============================================================================
+# GRAVADOR DE CLIPS (THREAD EM SEGUNDO PLANO)
+# ==============================================================================
+
+class ClipWriter:
+    """
+    Escreve clips de eventos (pre-roll + post-roll) em disco numa thread própria.
+    Os JPEG do buffer vão diretos para um AVI MJPEG (sem imdecode/re-encode).
+
+    Cada pedido fica em espera até o post-roll estar disponível no buffer; a
+    fila é limitada (max_pending) e a escrita respeita um teto de MB/s para não
+    competir com a captura pelo disco/CPU. Depois de escrito, o clip é associado
+    ao Evento no database_service.
+    """
+    def __init__(self, output_dir, pre_seconds, post_seconds, database_service_url,
+                 max_pending=32, max_write_mbps=8.0):
+        self.output_dir = output_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.database_service_url = database_service_url
+        self.max_pending = max_pending
+        self.max_write_bytes_per_s = max_write_mbps * 1024 * 1024
+
+        self._pending = []                  # heap de (pronto_em, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+        # --- Estatísticas ---
+        self.clips_escritos = 0
+        self.clips_descartados = 0
+        self.bytes_escritos = 0
+        self.segundos_a_escrever = 0.0
+
+    def start(self):
+        if self._thread:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    def schedule(self, camera_id, ring_buffer, evento_id, event_ts):
+        """Agenda um clip à volta de event_ts. Devolve False se a fila estiver cheia."""
+        job = {'camera_id': camera_id, 'buffer': ring_buffer, 'evento_id': evento_id, 'event_ts': event_ts}
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.clips_descartados += 1
+                logger.warning("CLIPS: Fila cheia, clip do evento %s descartado.", evento_id)
+                return False
+            heapq.heappush(self._pending, (event_ts + self.post_seconds, next(self._seq), job))
+            self._cond.notify()
+        self.start()
+        return True
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending or self._pending[0][0] > time.time():
+                    timeout = self._pending[0][0] - time.time() if self._pending else None
+                    self._cond.wait(timeout)
+                _, _, job = heapq.heappop(self._pending)
+            try:
+                self._write_clip(job)
+            except Exception as e:
+                logger.error("CLIPS: Erro ao gravar clip do evento %s: %s", job['evento_id'], e)
+
+    def _write_clip(self, job):
+        event_ts = job['event_ts']
+        frames = job['buffer'].snapshot(event_ts - self.pre_seconds, event_ts + self.post_seconds)
+        if len(frames) < 2:
+            logger.warning("CLIPS: Sem frames suficientes para o evento %s.", job['evento_id'])
+            return
+
+        duracao = frames[-1][0] - frames[0][0]
+        fps = max(1.0, (len(frames) - 1) / duracao) if duracao > 0 else 10.0
+        filename = f"evento_{job['evento_id']}_{job['camera_id']}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(event_ts))}.avi"
+        filepath = os.path.join(self.output_dir, filename)
+
+        inicio = time.time()
+        writer = None
+        escritos = 0
+        try:
+            for _, jpeg in frames:
+                dimensoes = jpeg_dimensoes(jpeg)
+                if dimensoes is None:
+                    continue
+                if writer is None:
+                    writer = MjpegAviWriter(filepath, fps, *dimensoes)
+                elif dimensoes != (writer.largura, writer.altura):
+                    continue    # o AVI tem um só tamanho de frame
+                writer.write(jpeg)
+                escritos += len(jpeg)
+                # Teto de débito: dorme se estivermos acima dos MB/s configurados
+                adiantado = escritos / self.max_write_bytes_per_s - (time.time() - inicio)
+                if adiantado > 0:
+                    time.sleep(adiantado)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        tamanho = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+        self.clips_escritos += 1
+        self.bytes_escritos += tamanho
+        self.segundos_a_escrever += time.time() - inicio
+        logger.info("CLIPS: Clip do evento %s gravado em %s (%d frames).", job['evento_id'], filepath, len(frames))
+        self._link_evento(job['evento_id'], filepath)
+
+    def _link_evento(self, evento_id, filepath):
+        try:
+            response = requests.patch(f"{self.database_service_url}/events/{evento_id}",
+                                      json={'clip_path': filepath}, timeout=5)
+            if response.status_code != 200:
+                logger.warning("CLIPS: Erro ao associar clip ao evento %s. Status: %s", evento_id, response.status_code)
+        except requests.exceptions.RequestException as e:
+            logger.error("CLIPS: Erro de conexão com Database Service: %s", e)
+
+    def get_stats(self):
+        with self._cond:
+            pendentes = len(self._pending)
+        return {
+            'pendentes': pendentes,
+            'max_pendentes': self.max_pending,
+            'clips_escritos': self.clips_escritos,
+            'clips_descartados': self.clips_descartados,
+            'bytes_escritos': self.bytes_escritos,
+            'debito_mbps': round(self.bytes_escritos / 1024 / 1024 / self.segundos_a_escrever, 2) if self.segundos_a_escrever else 0.0,
+            'max_debito_mbps': round(self.max_write_bytes_per_s / 1024 / 1024, 2),
+        }
@@ -0,0 +1,211 @@
+# camera_service/detection_pool.py - Distribuição dos frames por vários nós de deteção
+
+import logging
+import random
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger('camera_service.detection_pool')
+
+# Resultado de um pedido /detect, reportado em release()
+RESULTADO_OK = 'ok'
+RESULTADO_SATURADO = 'saturado'    # 503/429/timeout: o nó está vivo mas não aceita mais agora
+RESULTADO_FALHA = 'falha'          # ligação recusada, 5xx
+
+
+class DetectionPool:
+    """
+    Conjunto de nós do detection_service para onde a câmara envia frames.
+
+    - Nós: os URLs fixos (DETECTION_SERVICE_URL, separados por vírgulas) mais os
+      workers registados no database_service (GET registry_url), atualizados a
+      cada refresh_interval segundos; um worker sem heartbeat sai do registo.
+      Os workers com o mesmo URL (processos gunicorn de um nó, cada um com o
+      seu registo) contam como um nó com a soma das capacidades.
+    - Escolha: menor número de pedidos em curso por unidade de capacidade
+      (least outstanding requests). A câmara fica no mesmo nó enquanto este não
+      tiver mais de um pedido acima do menos carregado (mantém a cache de
+      resultados e o cooldown de eventos do nó).
+    - Falhas: após fail_threshold falhas seguidas (ligação recusada, 5xx ou
+      health check falhado; GET /health a cada health_interval segundos) o nó
+      fica fora até um health check voltar a dar ok. Um 503/429 ou um timeout
+      (nó lento, não morto) só o põe de parte durante o Retry-After.
+    """
+    def __init__(self, static_urls=(), registry_url=None, refresh_interval=5.0,
+                 health_interval=2.0, fail_threshold=2, default_capacity=4):
+        self.registry_url = registry_url
+        self.refresh_interval = refresh_interval
+        self.health_interval = health_interval
+        self.fail_threshold = fail_threshold
+        self.default_capacity = default_capacity
+
+        self._nos = {}              # url -> estado
+        self._afinidade = {}        # camera_id -> url do último nó usado
+        self._lock = threading.Lock()
+        self._monitor = None
+        for url in static_urls:
+            self._adicionar(url, 'estatico')
+
+        # --- Estatísticas ---
+        self.sem_nos = 0
+
+    @property
+    def ativo(self):
+        return bool(self._nos) or bool(self.registry_url)
+
+    def _adicionar(self, url, origem, capacidade=None, saudavel=True, worker_id=None):
+        url = url.rstrip('/')
+        no = self._nos.get(url)
+        if no is None:
+            no = self._nos[url] = {
+                'url': url, 'origem': origem, 'worker_id': worker_id,
+                'capacidade': capacidade or self.default_capacity,
+                'em_curso': 0, 'saudavel': saudavel, 'falhas': 0, 'pausa_ate': 0.0,
+                'enviados': 0, 'erros': 0, 'latencia_ms': None,
+            }
+            logger.info("DETECTION_POOL: Nó %s adicionado (%s).", url, origem)
+        else:
+            if capacidade:
+                no['capacidade'] = capacidade
+            no['worker_id'] = worker_id or no['worker_id']
+        return no
+
+    # --- Monitor: registo e health checks ---
+
+    def _garantir_monitor(self):
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._monitor_loop, daemon=True, name='detection-pool')
+            self._monitor.start()
+
+    def _monitor_loop(self):
+        proximo_refresh = 0
+        while True:
+            if self.registry_url and time.monotonic() >= proximo_refresh:
+                self.refresh()
+                proximo_refresh = time.monotonic() + self.refresh_interval
+            self.check_health()
+            time.sleep(self.health_interval)
+
+    def refresh(self):
+        """Sincroniza os nós com os workers vivos do registo (os estáticos ficam sempre)."""
+        try:
+            response = requests.get(self.registry_url, timeout=2)
+            response.raise_for_status()
+            workers = response.json().get('workers', [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.debug("DETECTION_POOL: Registo indisponível (%s); mantém os nós atuais.", e)
+            return
+        por_url = {}
+        for worker in workers:
+            agregado = por_url.setdefault(worker['url'].rstrip('/'), {'capacidade': 0, 'saudavel': False, 'ids': []})
+            agregado['capacidade'] += worker.get('capacidade') or self.default_capacity
+            agregado['saudavel'] |= bool(worker.get('modelo_carregado', True))
+            agregado['ids'].append(worker.get('worker_id') or '')
+        with self._lock:
+            vivos = set()
+            for url, agregado in por_url.items():
+                no = self._adicionar(url, 'registo', agregado['capacidade'], saudavel=agregado['saudavel'],
+                                     worker_id=', '.join(sorted(agregado['ids'])))
+                vivos.add(no['url'])
+            for url in [u for u, no in self._nos.items() if no['origem'] == 'registo' and u not in vivos]:
+                del self._nos[url]
+                logger.warning("DETECTION_POOL: Nó %s saiu do registo (sem heartbeat).", url)
+
+    def check_health(self):
+        with self._lock:
+            urls = list(self._nos)
+        for url in urls:
+            try:
+                response = requests.get(f"{url}/health", timeout=1)
+                ok = response.status_code == 200 and response.json().get('modelo_carregado', True)
+            except (requests.exceptions.RequestException, ValueError):
+                ok = False
+            with self._lock:
+                no = self._nos.get(url)
+                if no is None:
+                    continue
+                if ok:
+                    if not no['saudavel']:
+                        logger.info("DETECTION_POOL: Nó %s de volta.", url)
+                    no['saudavel'], no['falhas'] = True, 0
+                else:
+                    self._falhou(no, 'health check')
+
+    # --- Escolha do nó ---
+
+    def acquire(self, camera_id, excluir=()):
+        """Escolhe o nó para o próximo frame da câmara (None se não houver nenhum disponível)."""
+        self._garantir_monitor()
+        agora = time.monotonic()
+        with self._lock:
+            candidatos = [no for no in self._nos.values()
+                          if no['saudavel'] and no['pausa_ate'] <= agora and no['url'] not in excluir]
+            if not candidatos:
+                self.sem_nos += 1
+                return None
+            carga = lambda no: no['em_curso'] / no['capacidade']
+            menor = min(carga(no) for no in candidatos)
+            preferido = self._nos.get(self._afinidade.get(camera_id))
+            if preferido in candidatos and carga(preferido) <= menor + 1 / preferido['capacidade']:
+                no = preferido
+            else:
+                no = random.choice([no for no in candidatos if carga(no) == menor])
+            no['em_curso'] += 1
+            no['enviados'] += 1
+            self._afinidade[camera_id] = no['url']
+            return no['url']
+
+    def release(self, url, resultado, latency_ms=None, retry_after=None):
+        with self._lock:
+            no = self._nos.get(url)
+            if no is None:
+                return      # saiu do registo entretanto
+            no['em_curso'] = max(0, no['em_curso'] - 1)
+            if resultado == RESULTADO_OK:
+                no['falhas'] = 0
+                if latency_ms is not None:
+                    no['latencia_ms'] = latency_ms if no['latencia_ms'] is None else 0.8 * no['latencia_ms'] + 0.2 * latency_ms
+            elif resultado == RESULTADO_SATURADO:
+                no['pausa_ate'] = time.monotonic() + min(retry_after or 1.0, 5.0)
+            else:
+                no['erros'] += 1
+                self._falhou(no, 'pedido /detect')
+
+    def _falhou(self, no, origem):
+        """Conta uma falha seguida do nó (chamado com o cadeado)."""
+        no['falhas'] += 1
+        if no['falhas'] >= self.fail_threshold and no['saudavel']:
+            no['saudavel'] = False
+            logger.warning("DETECTION_POOL: Nó %s retirado após %d falhas seguidas (%s).",
+                           no['url'], no['falhas'], origem)
+
+    def forget(self, camera_id):
+        with self._lock:
+            self._afinidade.pop(camera_id, None)
+
+    def healthy_count(self):
+        with self._lock:
+            return sum(1 for no in self._nos.values() if no['saudavel'])
+
+    def get_stats(self):
+        agora = time.monotonic()
+        with self._lock:
+            return {
+                'registo': self.registry_url,
+                'sem_nos_disponiveis': self.sem_nos,
+                'nos': [{
+                    'url': no['url'],
+                    'origem': no['origem'],
+                    'worker_id': no['worker_id'],
+                    'saudavel': no['saudavel'],
+                    'em_pausa': no['pausa_ate'] > agora,
+                    'capacidade': no['capacidade'],
+                    'em_curso': no['em_curso'],
+                    'enviados': no['enviados'],
+                    'erros': no['erros'],
+                    'latencia_ms': round(no['latencia_ms'], 1) if no['latencia_ms'] is not None else None,
+                    'cameras': sum(1 for url in self._afinidade.values() if url == no['url']),
+                } for no in self._nos.values()],
+            }
@@ -0,0 +1,148 @@
+# camera_service/detection_rate.py - Ritmo de deteção adaptativo por câmara
+
+import threading
+import time
+
+
+class AdaptiveDetectionScheduler:
+    """
+    Decide quando cada câmara envia um frame para o detection_service.
+
+    - Por câmara: o intervalo entre deteções vai do mínimo (câmara com deteções
+      recentes) ao máximo (câmara parada há muito tempo). Uma deteção repõe o
+      mínimo; cada resultado vazio depois de idle_after segundos sem deteções
+      multiplica o intervalo por idle_growth até ao máximo.
+    - Global: quando o detection_service dá sinais de saturação (latência acima
+      do alvo, pedidos em curso acima do alvo, 503/429 ou timeouts) todos os
+      intervalos são multiplicados por um fator de abrandamento (aumento
+      multiplicativo, diminuição gradual quando volta ao normal).
+    - Orçamento: no máximo budget_per_s envios por segundo no total (balde de
+      fichas); as câmaras ativas, com intervalos mais curtos, ficam com a maior parte.
+    """
+    def __init__(self, default_min=0.25, default_max=5.0, initial=0.5, idle_after=10.0,
+                 idle_growth=1.25, target_latency_ms=300.0, target_inflight=4,
+                 max_throttle=8.0, budget_per_s=0.0):
+        self.default_min = default_min
+        self.default_max = default_max
+        self.initial = initial
+        self.idle_after = idle_after
+        self.idle_growth = idle_growth
+        self.target_latency_ms = target_latency_ms
+        self.target_inflight = target_inflight
+        self.max_throttle = max_throttle
+        self.budget_per_s = budget_per_s
+
+        self._cameras = {}          # camera_id -> estado
+        self._lock = threading.Lock()
+        self.throttle = 1.0         # fator global (1 = sem abrandamento)
+        self.em_curso = 0           # envios à espera de resposta (deste processo)
+        self._fichas = budget_per_s
+        self._ultima_reposicao = time.monotonic()
+
+        # --- Estatísticas ---
+        self.enviados = 0
+        self.sem_orcamento = 0
+        self.saturacoes = 0
+
+    def _estado(self, camera_id):
+        estado = self._cameras.get(camera_id)
+        if estado is None:
+            estado = self._cameras[camera_id] = {
+                'min': self.default_min, 'max': self.default_max,
+                'intervalo': min(max(self.initial, self.default_min), self.default_max),
+                'ultimo_envio': 0.0, 'ultima_detecao': 0.0, 'enviados': 0, 'detecoes': 0,
+                'ativa_desde': time.time(),     # última deteção (ou registo da câmara)
+            }
+        return estado
+
+    def configure(self, camera_id, min_interval=None, max_interval=None):
+        """Limites da câmara (guardados no database_service junto com a configuração)."""
+        with self._lock:
+            estado = self._estado(camera_id)
+            estado['min'] = float(min_interval) if min_interval else self.default_min
+            estado['max'] = max(estado['min'], float(max_interval) if max_interval else self.default_max)
+            estado['intervalo'] = min(max(estado['intervalo'], estado['min']), estado['max'])
+
+    def remove(self, camera_id):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def should_detect(self, camera_id, now=None):
+        """Chamado pelo loop de captura a cada frame. Se devolver True, o envio fica registado."""
+        now = now or time.time()
+        with self._lock:
+            estado = self._estado(camera_id)
+            if now - estado['ultimo_envio'] < estado['intervalo'] * self.throttle:
+                return False
+            if self.budget_per_s > 0:
+                agora = time.monotonic()
+                # Capacidade de pelo menos uma ficha: com orçamentos < 1/s (ex: 0.2)
+                # a ficha inteira acumula-se em 1/budget_per_s segundos
+                self._fichas = min(max(1.0, self.budget_per_s),
+                                   self._fichas + (agora - self._ultima_reposicao) * self.budget_per_s)
+                self._ultima_reposicao = agora
+                if self._fichas < 1:
+                    self.sem_orcamento += 1
+                    return False
+                self._fichas -= 1
+            estado['ultimo_envio'] = now
+            estado['enviados'] += 1
+            self.enviados += 1
+            self.em_curso += 1
+            return True
+
+    def report_result(self, camera_id, detectado=False, latency_ms=None, saturado=False, inflight=None):
+        """
+        Resultado de um envio. 'saturado' indica 503/429/timeout; 'inflight' e
+        'latency_ms' são os valores reportados pelo detection_service (ou medidos aqui).
+        """
+        now = time.time()
+        with self._lock:
+            self.em_curso = max(0, self.em_curso - 1)
+            if (saturado or (latency_ms is not None and latency_ms > self.target_latency_ms)
+                    or (inflight is not None and inflight > self.target_inflight)):
+                self.saturacoes += 1
+                self.throttle = min(self.max_throttle, self.throttle * 1.5)
+            else:
+                self.throttle = max(1.0, self.throttle * 0.95)
+
+            estado = self._cameras.get(camera_id)
+            if estado is None:
+                return
+            if detectado:
+                estado['detecoes'] += 1
+                estado['ultima_detecao'] = estado['ativa_desde'] = now
+                estado['intervalo'] = estado['min']
+            elif now - estado['ativa_desde'] > self.idle_after:
+                estado['intervalo'] = min(estado['max'], estado['intervalo'] * self.idle_growth)
+
+    def get_camera_stats(self, camera_id):
+        with self._lock:
+            estado = self._cameras.get(camera_id)
+            if estado is None:
+                return None
+            return {
+                'intervalo_s': round(estado['intervalo'], 3),
+                'intervalo_efetivo_s': round(estado['intervalo'] * self.throttle, 3),
+                'min_s': estado['min'],
+                'max_s': estado['max'],
+                'enviados': estado['enviados'],
+                'detecoes': estado['detecoes'],
+                'ultima_detecao': estado['ultima_detecao'] or None,
+            }
+
+    def get_stats(self):
+        with self._lock:
+            cameras = list(self._cameras)
+            resumo = {
+                'fator_abrandamento': round(self.throttle, 2),
+                'em_curso': self.em_curso,
+                'enviados': self.enviados,
+                'sem_orcamento': self.sem_orcamento,
+                'saturacoes': self.saturacoes,
+                'orcamento_por_s': self.budget_per_s or None,
+                'alvo_latencia_ms': self.target_latency_ms,
+                'alvo_em_curso': self.target_inflight,
+            }
+        resumo['cameras'] = {cam_id: self.get_camera_stats(cam_id) for cam_id in cameras}
+        return resumo
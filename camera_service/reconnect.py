@@ -0,0 +1,131 @@
+# camera_service/reconnect.py - Agendador central de (re)conexões das câmaras
+
+import random
+import threading
+import time
+
+# Estados de saúde de uma câmara
+ESTADO_CONECTANDO = 'conectando'
+ESTADO_CONECTADA = 'conectada'
+ESTADO_BACKOFF = 'backoff'
+ESTADO_FALHANDO = 'falhando'
+
+
+class ReconnectScheduler:
+    """
+    Decide QUANDO cada câmara pode tentar abrir a sua fonte.
+
+    - Backoff exponencial com jitter por câmara: após n falhas seguidas a câmara
+      espera um tempo aleatório entre base_delay e min(max_delay, base_delay * 2^n),
+      o que dessincroniza as câmaras depois de uma queda geral do NVR.
+    - Limite global de aberturas (token bucket): no máximo opens_per_second
+      aberturas por segundo (com rajada `burst`), para a recuperação não causar
+      um pico de CPU/rede.
+    - Estado de saúde por câmara (conectando, conectada, backoff, falhando).
+    - As falhas seguidas só voltam a zero depois de a ligação aguentar
+      healthy_after segundos: uma fonte que abre e cai logo a seguir continua
+      a subir no backoff em vez de voltar sempre ao atraso mínimo.
+    """
+    def __init__(self, base_delay=1.0, max_delay=60.0, failing_after=5,
+                 opens_per_second=2.0, burst=4, healthy_after=10.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failing_after = failing_after
+        self.healthy_after = healthy_after
+        self.opens_per_second = opens_per_second
+        self.burst = burst
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._state = {}    # cam_id -> dict com o estado de saúde
+        self._lock = threading.Lock()
+
+    def _entry(self, cam_id):
+        if cam_id not in self._state:
+            self._state[cam_id] = {
+                'estado': ESTADO_CONECTANDO,
+                'falhas_seguidas': 0,
+                'proxima_tentativa': 0.0,   # time.monotonic()
+                'ultimo_erro': None,
+                'conectada_desde': None,
+                'conexoes': 0,
+            }
+        return self._state[cam_id]
+
+    def _take_token(self):
+        """Tenta consumir um token do limite global. Chamado com o cadeado."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.opens_per_second)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.opens_per_second
+
+    def acquire_open(self, cam_id, is_running):
+        """
+        Bloqueia até a câmara poder tentar abrir a fonte (backoff cumprido e token
+        global disponível). Devolve False se a câmara foi parada entretanto.
+        """
+        while is_running():
+            with self._lock:
+                entry = self._entry(cam_id)
+                wait = entry['proxima_tentativa'] - time.monotonic()
+                if wait <= 0:
+                    wait = self._take_token()
+                    if wait == 0:
+                        if entry['estado'] == ESTADO_BACKOFF:
+                            entry['estado'] = ESTADO_CONECTANDO
+                        return True
+            # Dorme em fatias curtas para reagir rapidamente a um stop()
+            time.sleep(min(wait, 0.5))
+        return False
+
+    def report_success(self, cam_id):
+        """A fonte abriu. As falhas seguidas mantêm-se até a ligação ficar estável (_consolidar)."""
+        with self._lock:
+            entry = self._entry(cam_id)
+            entry['conexoes'] += 1
+            entry.update(estado=ESTADO_CONECTADA, proxima_tentativa=0.0, conectada_desde=time.time())
+
+    def _consolidar(self, entry):
+        """Zera as falhas de uma ligação aberta há pelo menos healthy_after segundos. Chamado com o cadeado."""
+        if (entry['estado'] == ESTADO_CONECTADA and entry['conectada_desde'] is not None
+                and time.time() - entry['conectada_desde'] >= self.healthy_after):
+            entry['falhas_seguidas'] = 0
+
+    def report_failure(self, cam_id, motivo):
+        """Regista uma falha e agenda a próxima tentativa. Devolve o atraso em segundos."""
+        with self._lock:
+            entry = self._entry(cam_id)
+            self._consolidar(entry)
+            entry['falhas_seguidas'] += 1
+            teto = min(self.max_delay, self.base_delay * (2 ** min(entry['falhas_seguidas'], 16)))
+            delay = random.uniform(self.base_delay, max(self.base_delay, teto))
+            entry.update(
+                estado=ESTADO_FALHANDO if entry['falhas_seguidas'] >= self.failing_after else ESTADO_BACKOFF,
+                proxima_tentativa=time.monotonic() + delay,
+                ultimo_erro=motivo,
+                conectada_desde=None,
+            )
+            return delay
+
+    def remove(self, cam_id):
+        with self._lock:
+            self._state.pop(cam_id, None)
+
+    def get_health(self, cam_id):
+        with self._lock:
+            entry = self._state.get(cam_id)
+            if entry is None:
+                return None
+            self._consolidar(entry)
+            health = dict(entry)
+        health['id'] = cam_id
+        health['proxima_tentativa_em'] = round(max(0.0, health.pop('proxima_tentativa') - time.monotonic()), 1)
+        return health
+
+    def get_all_health(self):
+        with self._lock:
+            cam_ids = list(self._state)
+        return [h for h in (self.get_health(cam_id) for cam_id in cam_ids) if h]
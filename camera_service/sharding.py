@@ -0,0 +1,204 @@
+# camera_service/sharding.py - Distribuição das câmaras por vários processos
+
+import bisect
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger('camera_service.sharding')
+
+# ==============================================================================
+# ANEL DE HASHING CONSISTENTE
+# ==============================================================================
+
+class HashRing:
+    """
+    Anel de hashing consistente: cada shard ocupa vários pontos virtuais no anel
+    e uma câmara pertence ao primeiro ponto a seguir ao hash do seu id.
+    Adicionar/remover um shard só move as câmaras vizinhas desse shard.
+    """
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self._keys = []
+        self._ring = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def add_node(self, node):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            self._ring[h] = node
+            bisect.insort(self._keys, h)
+
+    def remove_node(self, node):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            del self._ring[h]
+            self._keys.remove(h)
+
+    def get_node(self, key):
+        if not self._keys:
+            return None
+        idx = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[self._keys[idx]]
+
+# ==============================================================================
+# COORDENADOR DOS SHARDS
+# ==============================================================================
+
+class ShardCoordinator:
+    """
+    Lança N processos worker do camera_service (cada um com o seu CameraManager)
+    e encaminha os pedidos da API para o worker dono de cada câmara.
+    Guarda a configuração das câmaras iniciadas para as repor se um worker morrer.
+    """
+    def __init__(self, num_shards, base_port, host='127.0.0.1'):
+        self.host = host
+        self.shards = {}            # nome -> {'port', 'url', 'process'}
+        self.camera_configs = {}    # cam_id -> config enviada no POST /cameras
+        self._lock = threading.Lock()
+
+        for i in range(num_shards):
+            port = base_port + i
+            self.shards[f"shard-{i}"] = {'port': port, 'url': f"http://{host}:{port}", 'process': None}
+        self.ring = HashRing(self.shards.keys())
+
+        self._monitor_thread = None
+        self._running = False
+
+    # --- Ciclo de vida dos workers ---
+
+    def _spawn(self, name):
+        shard = self.shards[name]
+        app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+        shard['process'] = subprocess.Popen(
+            [sys.executable, app_path, '--worker', '--port', str(shard['port'])],
+            cwd=os.path.dirname(app_path)
+        )
+        logger.info("COORDENADOR: %s iniciado (PID %s, porta %s)", name, shard['process'].pid, shard['port'])
+
+    def _wait_ready(self, name, timeout=15):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                if requests.get(f"{self.shards[name]['url']}/health", timeout=1).status_code == 200:
+                    return True
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(0.2)
+        return False
+
+    def start(self):
+        self._running = True
+        for name in self.shards:
+            self._spawn(name)
+        for name in self.shards:
+            if not self._wait_ready(name):
+                logger.warning("COORDENADOR: %s não respondeu ao /health a tempo.", name)
+        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor_thread.start()
+
+    def stop(self):
+        self._running = False
+        for shard in self.shards.values():
+            process = shard['process']
+            if process and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    def _monitor_loop(self):
+        """Reinicia workers que morreram e volta a iniciar as câmaras que lhes pertenciam."""
+        while self._running:
+            for name, shard in self.shards.items():
+                if shard['process'].poll() is None:
+                    continue
+                logger.error("COORDENADOR: %s terminou (código %s). A reiniciar...", name, shard['process'].returncode)
+                self._spawn(name)
+                if not self._wait_ready(name):
+                    continue
+                with self._lock:
+                    configs = [c for cid, c in self.camera_configs.items() if self.ring.get_node(cid) == name]
+                for config in configs:
+                    try:
+                        requests.post(f"{shard['url']}/cameras", json=config, timeout=5)
+                    except requests.exceptions.RequestException as e:
+                        logger.error("COORDENADOR: Falha ao repor câmara %s em %s: %s", config['id'], name, e)
+            time.sleep(2)
+
+    # --- Encaminhamento da API ---
+
+    def shard_url(self, cam_id):
+        return self.shards[self.ring.get_node(cam_id)]['url']
+
+    def start_camera(self, config):
+        response = requests.post(f"{self.shard_url(config['id'])}/cameras", json=config, timeout=10)
+        if response.status_code == 200:
+            with self._lock:
+                self.camera_configs[config['id']] = config
+        return response
+
+    def stop_camera(self, cam_id):
+        # Só esquece a configuração depois de o shard parar a câmara (ou já não a
+        # ter): se o pedido falhar, o supervisor continua a repô-la num reinício
+        response = requests.post(f"{self.shard_url(cam_id)}/cameras/{cam_id}/stop", timeout=10)
+        if response.status_code in (200, 404):
+            with self._lock:
+                self.camera_configs.pop(cam_id, None)
+        return response
+
+    def gather(self, path):
+        """Faz GET a todos os shards e devolve as respostas JSON (ignora shards em baixo)."""
+        resultados = []
+        for name, shard in self.shards.items():
+            try:
+                response = requests.get(f"{shard['url']}{path}", timeout=3)
+                if response.status_code == 200:
+                    resultados.append((name, response.json()))
+            except requests.exceptions.RequestException:
+                logger.warning("COORDENADOR: %s não respondeu a %s", name, path)
+        return resultados
+
+    def active_camera_ids(self):
+        ids = []
+        for _, data in self.gather('/cameras/active'):
+            ids.extend(data.get('cameras', []))
+        return ids
+
+    def all_stats(self):
+        cameras = []
+        for name, data in self.gather('/cameras/stats'):
+            for stats in data.get('cameras', []):
+                stats['shard'] = name
+                cameras.append(stats)
+        return cameras
+
+    def all_health(self):
+        cameras = []
+        for name, data in self.gather('/cameras/health'):
+            for health in data.get('cameras', []):
+                health['shard'] = name
+                cameras.append(health)
+        return cameras
+
+    def shard_status(self):
+        return {
+            name: {
+                'porta': shard['port'],
+                'pid': shard['process'].pid if shard['process'] else None,
+                'vivo': bool(shard['process']) and shard['process'].poll() is None,
+            }
+            for name, shard in self.shards.items()
+        }
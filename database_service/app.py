@@ -1,23 +1,71 @@
 # database_service/app.py - Versão com "Memória" (guarda Câmaras e Eventos)
 
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.startup import startup  # primeiro, para o perfil de arranque medir os imports seguintes
+
+import time
 import datetime
+import contextlib
 from flask import Flask, request, jsonify
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, inspect
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, inspect, select, delete, text, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from shared.metrics import REGISTRY, install_metrics_endpoint
+from shared.log import configure_logging, get_logger
+from shared.serving import serve
+from shared.responses import json_response, install_compression
+from shared.camera_config import validar_config_camera
+
+from serializers import RowSerializer
+from partitions import EventPartitions, ForaDaRetencao, month_of
+
+try:
+    import fcntl    # lock da migração (Linux/macOS; no Windows corre sempre num só processo)
+except ImportError:
+    fcntl = None
+
+configure_logging('database_service')
+logger = get_logger('database_service')
+startup.marcar('imports')
+
 # ==============================================================================
 # CONFIGURAÇÕES DO SERVIÇO
 # ==============================================================================
 
 app = Flask(__name__)
+install_metrics_endpoint(app)
+# Listas grandes (ex: 10k eventos) vão comprimidas com br/gzip se o cliente aceitar
+install_compression(app)
 
 # O ficheiro .db será criado na pasta raiz do projeto.
 DATABASE_FILE = "monitoramento.db"
-DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), DATABASE_FILE)
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), DATABASE_FILE))
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
+# Eventos particionados por mês: um ficheiro SQLite por mês em EVENT_PARTITIONS_DIR
+# (por omissão monitoramento_eventos/ ao lado da base de dados principal)
+EVENT_PARTITIONS_DIR = os.getenv("EVENT_PARTITIONS_DIR", os.path.splitext(DATABASE_PATH)[0] + "_eventos")
+EVENT_RETENTION_MONTHS = int(os.getenv("EVENT_RETENTION_MONTHS", 0))   # 0 = guarda tudo
+
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# --- Métricas: duração de cada query SQL, por operação (SELECT, INSERT, ...) ---
+# Registadas na classe Engine para incluir também os engines das partições de eventos
+METRICA_QUERIES = REGISTRY.histogram('db_query_seconds', 'Duração das queries SQL', ('operacao',))
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _inicio_query(conn, cursor, statement, parameters, context, executemany):
+    context._inicio_query = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _fim_query(conn, cursor, statement, parameters, context, executemany):
+    operacao = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OUTRA'
+    METRICA_QUERIES.observe(time.perf_counter() - context._inicio_query, operacao=operacao)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -25,10 +73,6 @@ Base = declarative_base()
 # MODELO DAS TABELAS (MOLDES)
 # ==============================================================================
 
-def object_as_dict(obj):
-    """Função utilitária para converter objetos SQLAlchemy em dicionários"""
-    return {c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
-
 class Camera(Base):
     """Molde para a tabela 'cameras' (isto já tínhamos)"""
     __tablename__ = "cameras"
@@ -41,21 +85,153 @@ class Camera(Base):
     area_x2 = Column(Integer, default=640)
     area_y2 = Column(Integer, default=480)
     receiver_email = Column(String)
+    # Limites do ritmo de deteção adaptativo do camera_service (segundos; vazio = por omissão)
+    detecao_min_intervalo = Column(Float)
+    detecao_max_intervalo = Column(Float)
+    # Classe de prioridade no detection_service em sobrecarga (vazio = 'normal')
+    prioridade = Column(String, default='normal')
+    # Afinação da captura no camera_service (vazio = CAMERA_FPS, CAMERA_DECODE_THREADS, CAMERA_FFMPEG_OPTIONS)
+    fps = Column(Float)
+    decode_threads = Column(Integer)
+    ffmpeg_options = Column(String)
+
+# Campos de configuração da câmara que podem ser alterados depois de criada
+CAMPOS_CAMERA_ATUALIZAVEIS = ('nome', 'url', 'receiver_email', 'detecao_min_intervalo', 'detecao_max_intervalo',
+                              'prioridade', 'fps', 'decode_threads', 'ffmpeg_options')
+PRIORIDADES_CAMERA = ('alta', 'normal', 'baixa')
 
 class Evento(Base):
-    """NOVO MOLDE: A nossa 'Memória' para a tabela 'eventos'"""
+    """
+    NOVO MOLDE: A nossa 'Memória' para a tabela 'eventos'.
+    Os eventos ficam nas partições mensais (ver partitions.py); na base de dados
+    principal a tabela só existe para migrar os eventos de versões anteriores.
+    """
     __tablename__ = "eventos"
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     camera_id = Column(String, index=True)
     camera_nome = Column(String)
     tipo_deteccao = Column(String, default="pessoa")
     confianca = Column(Float)
-    foto_path = Column(String) # Caminho para a foto que o detection_service vai guardar
+    foto_path = Column(String, index=True) # Caminho para a foto que o detection_service vai guardar
     bbox = Column(String) # Coordenadas da deteção
+    clip_path = Column(String) # Clip (pre-roll + post-roll) gravado pelo camera_service
+
+class DetectionWorker(Base):
+    """Registo dos nós do detection_service (URL, capacidade e último heartbeat)"""
+    __tablename__ = "detection_workers"
+    id = Column(Integer, primary_key=True, index=True)
+    worker_id = Column(String, unique=True, nullable=False, index=True)
+    url = Column(String, nullable=False)
+    capacidade = Column(Integer, default=4)
+    modelo_carregado = Column(Integer, default=0)
+    em_curso = Column(Integer, default=0)
+    latencia_ms = Column(Float)
+    registado_em = Column(DateTime, default=datetime.datetime.utcnow)
+    ultimo_heartbeat = Column(DateTime, default=datetime.datetime.utcnow)
+
+# Um worker sem heartbeat há mais de DETECTION_WORKER_TTL segundos deixa de contar como vivo
+DETECTION_WORKER_TTL = float(os.getenv("DETECTION_WORKER_TTL", 15))
+
+# Serializadores calculados uma vez por modelo (ver serializers.py), usados em
+# todas as respostas em vez de inspecionar cada objeto
+CAMERA_JSON = RowSerializer(Camera)
+EVENTO_JSON = RowSerializer(Evento)
+WORKER_JSON = RowSerializer(DetectionWorker)
+
+def garantir_colunas(engine=engine, tabelas=None):
+    """
+    Migração simples: o create_all não altera tabelas existentes, por isso
+    acrescentamos com ALTER TABLE as colunas do modelo que faltem na base de dados.
+    Uma coluna acrescentada entretanto por outro processo (workers a abrir a
+    mesma partição) é ignorada.
+    """
+    inspetor = inspect(engine)
+    for tabela in tabelas or Base.metadata.sorted_tables:
+        existentes = {c['name'] for c in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name not in existentes:
+                tipo = coluna.type.compile(dialect=engine.dialect)
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+                except OperationalError as e:
+                    if 'duplicate column' not in str(e):
+                        raise
+                    continue
+                logger.info("DATABASE: Coluna %s.%s adicionada.", tabela.name, coluna.name)
+
+eventos_store = EventPartitions(EVENT_PARTITIONS_DIR, Evento.__table__, EVENT_RETENTION_MONTHS,
+                                on_open=lambda e: garantir_colunas(e, [Evento.__table__]))
+
+def migrar_eventos_para_particoes(lote=10000):
+    """
+    Move os eventos da tabela única antiga para as partições mensais, em lotes
+    (recebem ids novos). Idempotente: cada partição regista o último id antigo
+    copiado na mesma transação dos eventos (EventPartitions.migrate_many), por
+    isso uma falha entre a cópia e o DELETE não duplica eventos no arranque
+    seguinte. Corre com o lock de lock_arranque() (ver migrar_no_arranque).
+    """
+    tabela = Evento.__table__
+    total = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select(tabela).order_by(tabela.c.id).limit(lote)).mappings().all()
+        if not rows:
+            break
+        pares = [(row['id'], dict({k: v for k, v in row.items() if k != 'id'},
+                                  timestamp=row['timestamp'] or datetime.datetime.utcnow()))
+                 for row in rows]
+        # Os eventos de meses já fora da retenção seriam apagados logo a seguir
+        total += eventos_store.migrate_many([p for p in pares if eventos_store.accepts(month_of(p[1]['timestamp']))])
+        with engine.begin() as conn:
+            conn.execute(delete(tabela).where(tabela.c.id <= rows[-1]['id']))
+    if total:
+        logger.info("DATABASE: %d eventos migrados para as partições mensais em %s.", total, EVENT_PARTITIONS_DIR)
+
+@contextlib.contextmanager
+def lock_arranque():
+    """
+    Lock exclusivo (DATABASE_PATH.migracao.lock) para as alterações de esquema e
+    a migração: com --workers N os workers importam este módulo ao mesmo tempo.
+    """
+    with open(DATABASE_PATH + ".migracao.lock", 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+def migrar_no_arranque():
+    """
+    Corre a migração dos eventos uma só vez, no processo principal antes de
+    serve() (com --workers N, no master do gunicorn, antes de lançar os workers,
+    que importam este módulo sem o __main__), com o lock de lock_arranque().
+    """
+    with lock_arranque(), startup.etapa('migracao_eventos'):
+        migrar_eventos_para_particoes()
+
+_migrado = False
+
+def migracao_concluida():
+    """
+    Prova de prontidão do /health (campo 'migrado', usado pelo run_services.py):
+    verdadeira só quando a tabela antiga de eventos está vazia, em qualquer
+    processo (os workers gunicorn não correm a migração).
+    """
+    global _migrado
+    if not _migrado:
+        with engine.connect() as conn:
+            _migrado = conn.execute(select(Evento.__table__.c.id).limit(1)).first() is None
+    return _migrado
 
 # Cria AMBAS as tabelas no banco de dados se elas não existirem
-Base.metadata.create_all(bind=engine)
+with lock_arranque(), startup.etapa('migracao'):
+    Base.metadata.create_all(bind=engine)
+    garantir_colunas()
+    eventos_store.apply_retention()
 
 # ==============================================================================
 # APIs DO SERVIÇO (AS "PORTAS" DE COMUNICAÇÃO)
@@ -63,7 +239,7 @@ Base.metadata.create_all(bind=engine)
 
 @app.route('/health')
 def health():
-    return jsonify({"status": "ok", "service": "database_service"}), 200
+    return jsonify({"status": "ok", "service": "database_service", "migrado": migracao_concluida()}), 200
 
 # --- APIs de Câmaras (sem alteração) ---
 
@@ -72,6 +248,11 @@ def adicionar_camera():
     data = request.get_json()
     if not data or not all(k in data for k in ['cam_id', 'nome', 'url']):
         return jsonify({'erro': 'Campos cam_id, nome e url são obrigatórios'}), 400
+    if data.get('prioridade', 'normal') not in PRIORIDADES_CAMERA:
+        return jsonify({'erro': f'Prioridade inválida ({", ".join(PRIORIDADES_CAMERA)})'}), 400
+    afinacao, erro = validar_config_camera(data)
+    if erro:
+        return jsonify({'erro': erro}), 400
     db = SessionLocal()
     try:
         existente = db.query(Camera).filter(Camera.cam_id == data['cam_id']).first()
@@ -82,14 +263,20 @@ def adicionar_camera():
             cam_id=data['cam_id'],
             nome=data['nome'],
             url=data['url'],
-            receiver_email=data.get('receiver_email', 'admin@example.com')
+            receiver_email=data.get('receiver_email', 'admin@example.com'),
+            detecao_min_intervalo=afinacao.get('detecao_min_intervalo'),
+            detecao_max_intervalo=afinacao.get('detecao_max_intervalo'),
+            prioridade=data.get('prioridade', 'normal'),
+            fps=afinacao.get('fps'),
+            decode_threads=afinacao.get('decode_threads'),
+            ffmpeg_options=data.get('ffmpeg_options')
         )
         if 'area' in data and len(data['area']) == 4:
             nova_camera.area_x1, nova_camera.area_y1, nova_camera.area_x2, nova_camera.area_y2 = data['area']
         
         db.add(nova_camera)
         db.commit(); db.refresh(nova_camera)
-        return jsonify(object_as_dict(nova_camera)), 201
+        return json_response(CAMERA_JSON.entity(nova_camera), 201)
     except Exception as e:
         db.rollback(); return jsonify({'erro': str(e)}), 500
     finally:
@@ -97,12 +284,10 @@ def adicionar_camera():
 
 @app.route('/cameras', methods=['GET'])
 def listar_cameras():
-    db = SessionLocal()
-    try:
-        cameras = db.query(Camera).all()
-        return jsonify([object_as_dict(cam) for cam in cameras]), 200
-    finally:
-        db.close()
+    # SELECT só das colunas (sem entidades ORM), serializado direto para JSON
+    with engine.connect() as conn:
+        rows = conn.execute(CAMERA_JSON.select()).all()
+    return json_response(CAMERA_JSON.rows(rows))
         
 @app.route('/cameras/<string:cam_id>', methods=['DELETE'])
 def remover_camera(cam_id):
@@ -124,20 +309,71 @@ def remover_camera(cam_id):
 @app.route('/cameras/<string:cam_id>', methods=['GET'])
 def obter_camera(cam_id):
     """NOVA PORTA: Obtém os detalhes de uma única câmera."""
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(CAMERA_JSON.select().where(Camera.cam_id == cam_id)).first()
+        if not row:
+            return jsonify({'erro': 'Câmera não encontrada'}), 404
+        # Retorna os detalhes da câmera como um dicionário
+        return json_response(CAMERA_JSON.row(row))
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/cameras/<string:cam_id>', methods=['PATCH'])
+def atualizar_camera(cam_id):
+    """Altera a configuração de uma câmara (ex: limites do ritmo de deteção)."""
+    data = request.get_json()
+    campos = {k: v for k, v in (data or {}).items() if k in CAMPOS_CAMERA_ATUALIZAVEIS}
+    if not campos:
+        return jsonify({'erro': f'Nenhum campo atualizável ({", ".join(CAMPOS_CAMERA_ATUALIZAVEIS)})'}), 400
+    if 'prioridade' in campos and campos['prioridade'] not in PRIORIDADES_CAMERA:
+        return jsonify({'erro': f'Prioridade inválida ({", ".join(PRIORIDADES_CAMERA)})'}), 400
+
     db = SessionLocal()
     try:
         camera = db.query(Camera).filter(Camera.cam_id == cam_id).first()
         if not camera:
             return jsonify({'erro': 'Câmera não encontrada'}), 404
-        # Retorna os detalhes da câmera como um dicionário
-        return jsonify(object_as_dict(camera)), 200
+        # Com os limites guardados, para o min <= max valer mesmo quando só um muda
+        afinacao, erro = validar_config_camera(campos, {'detecao_min_intervalo': camera.detecao_min_intervalo,
+                                                        'detecao_max_intervalo': camera.detecao_max_intervalo})
+        if erro:
+            return jsonify({'erro': erro}), 400
+        campos.update(afinacao)
+        for campo, valor in campos.items():
+            setattr(camera, campo, valor)
+        db.commit(); db.refresh(camera)
+        return json_response(CAMERA_JSON.entity(camera))
     except Exception as e:
-        return jsonify({'erro': str(e)}), 500
+        db.rollback(); return jsonify({'erro': str(e)}), 500
     finally:
         db.close()
 
 # --- NOVAS APIs de Eventos ---
 
+# Limite de eventos por pedido ao /events/bulk
+BULK_MAX_EVENTOS = int(os.getenv("BULK_MAX_EVENTOS", 5000))
+
+def linha_evento(data):
+    """Converte o JSON de um evento numa linha da tabela 'eventos' (timestamp ISO opcional)."""
+    return {
+        'camera_id': data['camera_id'],
+        'camera_nome': data.get('camera_nome'),
+        'tipo_deteccao': data.get('tipo_deteccao', 'pessoa'),
+        'confianca': data.get('confianca'),
+        'foto_path': data.get('foto_path'),
+        'bbox': str(data.get('bbox', '[]')),
+        # Todas as linhas de um lote têm de ter as mesmas colunas (executemany)
+        'timestamp': timestamp_utc(data['timestamp']) if data.get('timestamp') else datetime.datetime.utcnow(),
+    }
+
+def timestamp_utc(texto):
+    """ISO 8601 -> datetime UTC sem fuso (como são guardados); sem fuso já é UTC."""
+    momento = datetime.datetime.fromisoformat(texto)
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return momento
+
 @app.route('/events', methods=['POST'])
 def adicionar_evento():
     """NOVA PORTA: O detection_service vai enviar dados para aqui."""
@@ -145,49 +381,181 @@ def adicionar_evento():
     if not data or not data.get('camera_id'):
         return jsonify({'erro': 'Dados do evento inválidos'}), 400
 
-    db = SessionLocal()
     try:
-        novo_evento = Evento(
-            camera_id=data.get('camera_id'),
-            camera_nome=data.get('camera_nome'),
-            confianca=data.get('confianca'),
-            foto_path=data.get('foto_path'),
-            bbox=str(data.get('bbox', '[]')) # Guarda a BBox como string
-        )
-        db.add(novo_evento)
-        db.commit()
-        db.refresh(novo_evento)
-        
-        print(f"DATABASE: Novo evento registado da câmara {data.get('camera_nome')}!")
-        return jsonify(object_as_dict(novo_evento)), 201
-    
+        linha = linha_evento(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({'erro': f'Evento inválido: {e}'}), 400
+    try:
+        # Vai para a partição do mês do evento
+        evento_id = eventos_store.insert(linha)
+        logger.debug("DATABASE: Novo evento registado da câmara %s!", data.get('camera_nome'))
+        return json_response(EVENTO_JSON.mapping(dict(linha, id=evento_id)), 201)
+    except ForaDaRetencao as e:
+        return jsonify({'erro': f'Evento inválido: {e}'}), 400
+    except Exception as e:
+        logger.error("DATABASE: Erro ao registar evento: %s", e)
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/events/bulk', methods=['POST'])
+def adicionar_eventos_em_lote():
+    """
+    Regista muitos eventos numa só transação (ex: reanálise offline de vídeos).
+    Aceita uma lista JSON ou {"eventos": [...]}; devolve quantos foram inseridos.
+    Com ?sem_fotos_repetidas=1 ignora os eventos de fotos que já têm evento.
+    """
+    data = request.get_json()
+    eventos = data.get('eventos') if isinstance(data, dict) else data
+    if not isinstance(eventos, list) or not eventos:
+        return jsonify({'erro': 'Envie uma lista de eventos'}), 400
+    if len(eventos) > BULK_MAX_EVENTOS:
+        return jsonify({'erro': f'No máximo {BULK_MAX_EVENTOS} eventos por pedido'}), 413
+    try:
+        linhas = [linha_evento(e) for e in eventos]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'erro': f'Evento inválido: {e}'}), 400
+
+    try:
+        inseridos = eventos_store.insert_many(linhas, request.args.get('sem_fotos_repetidas') == '1')
+        logger.info("DATABASE: %d eventos registados em lote (%d repetidos ignorados).", inseridos, len(linhas) - inseridos)
+        return jsonify({'inseridos': inseridos, 'ignorados': len(linhas) - inseridos}), 201
+    except ForaDaRetencao as e:
+        return jsonify({'erro': f'Evento inválido: {e}'}), 400
+    except Exception as e:
+        logger.error("DATABASE: Erro ao registar eventos em lote: %s", e)
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/events/<int:evento_id>', methods=['PATCH'])
+def atualizar_evento(evento_id):
+    """Associa ficheiros a um evento já registado (ex: o clip gravado pelo camera_service)."""
+    data = request.get_json()
+    campos = {k: v for k, v in (data or {}).items() if k in ('clip_path', 'foto_path')}
+    if not campos:
+        return jsonify({'erro': 'Nenhum campo atualizável (clip_path, foto_path)'}), 400
+
+    try:
+        # O id indica a partição (mês) do evento
+        if not eventos_store.update(evento_id, campos):
+            return jsonify({'erro': 'Evento não encontrado'}), 404
+        return json_response(EVENTO_JSON.row(eventos_store.get(evento_id)))
     except Exception as e:
-        db.rollback()
-        print(f"DATABASE: Erro ao registar evento: {e}")
         return jsonify({'erro': str(e)}), 500
-    finally:
-        db.close()
 
 @app.route('/events', methods=['GET'])
 def listar_eventos():
-    """NOVA PORTA: A nossa interface web vai usar isto no Passo 3."""
+    """
+    NOVA PORTA: A nossa interface web vai usar isto no Passo 3.
+    Filtros opcionais: desde/ate (ISO 8601, UTC) e camera_id; só as partições
+    (meses) do intervalo são consultadas.
+    """
     limite = request.args.get('limite', 10, type=int)
+    if limite <= 0:
+        return jsonify({'erro': 'limite tem de ser positivo'}), 400
+    try:
+        desde = request.args.get('desde')
+        ate = request.args.get('ate')
+        desde = timestamp_utc(desde) if desde else None
+        ate = timestamp_utc(ate) if ate else None
+    except ValueError as e:
+        return jsonify({'erro': f'Data inválida: {e}'}), 400
+    try:
+        rows = eventos_store.query(desde, ate, request.args.get('camera_id'), limite)
+        return json_response(EVENTO_JSON.rows(rows))
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/events/partitions', methods=['GET'])
+def listar_particoes():
+    """Partições mensais de eventos (ficheiro, tamanho, eventos aproximados)."""
+    return json_response(eventos_store.get_stats())
+
+@app.route('/events/partitions/<int:mes>', methods=['DELETE'])
+def apagar_particao(mes):
+    """Retenção: apaga todos os eventos de um mês (AAAAMM) de uma vez, removendo o ficheiro."""
+    if not eventos_store.drop(mes):
+        return jsonify({'erro': 'Partição não encontrada'}), 404
+    logger.info("DATABASE: Partição de eventos %s apagada.", mes)
+    return jsonify({'mensagem': f'Eventos de {mes} apagados'}), 200
+
+# --- Registo de nós de deteção ---
+
+def worker_como_dict(worker, agora):
+    dados = WORKER_JSON.entity(worker)
+    dados['modelo_carregado'] = bool(worker.modelo_carregado)
+    dados['vivo'] = (agora - worker.ultimo_heartbeat).total_seconds() <= DETECTION_WORKER_TTL
+    return dados
+
+@app.route('/detection-workers', methods=['POST'])
+def heartbeat_worker():
+    """Registo/heartbeat de um nó do detection_service (cria ou atualiza pelo worker_id)."""
+    data = request.get_json()
+    if not data or not data.get('worker_id') or not data.get('url'):
+        return jsonify({'erro': 'worker_id e url são obrigatórios'}), 400
+
+    db = SessionLocal()
+    try:
+        agora = datetime.datetime.utcnow()
+        worker = db.query(DetectionWorker).filter(DetectionWorker.worker_id == data['worker_id']).first()
+        if not worker:
+            worker = DetectionWorker(worker_id=data['worker_id'], registado_em=agora)
+            db.add(worker)
+            logger.info("DATABASE: Nó de deteção %s registado (%s).", data['worker_id'], data['url'])
+        worker.url = data['url']
+        worker.capacidade = int(data.get('capacidade') or 4)
+        worker.modelo_carregado = int(bool(data.get('modelo_carregado')))
+        worker.em_curso = data.get('em_curso')
+        worker.latencia_ms = data.get('latencia_ms')
+        worker.ultimo_heartbeat = agora
+        db.commit(); db.refresh(worker)
+        return jsonify(worker_como_dict(worker, agora)), 200
+    except Exception as e:
+        db.rollback(); return jsonify({'erro': str(e)}), 500
+    finally:
+        db.close()
+
+@app.route('/detection-workers', methods=['GET'])
+def listar_workers():
+    """Nós de deteção vivos (heartbeat recente); ?todos=1 inclui os expirados."""
+    todos = request.args.get('todos') == '1'
     db = SessionLocal()
     try:
-        eventos = db.query(Evento).order_by(Evento.timestamp.desc()).limit(limite).all()
-        return jsonify([object_as_dict(e) for e in eventos]), 200
+        agora = datetime.datetime.utcnow()
+        query = db.query(DetectionWorker).order_by(DetectionWorker.worker_id)
+        if not todos:
+            query = query.filter(DetectionWorker.ultimo_heartbeat >= agora - datetime.timedelta(seconds=DETECTION_WORKER_TTL))
+        workers = [worker_como_dict(w, agora) for w in query.all()]
+        return json_response({'workers': workers, 'ttl_s': DETECTION_WORKER_TTL})
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
     finally:
         db.close()
 
+@app.route('/detection-workers/<string:worker_id>', methods=['DELETE'])
+def remover_worker(worker_id):
+    """Paragem limpa de um nó: sai do registo sem esperar que o heartbeat expire."""
+    db = SessionLocal()
+    try:
+        apagados = db.query(DetectionWorker).filter(DetectionWorker.worker_id == worker_id).delete()
+        db.commit()
+        if not apagados:
+            return jsonify({'erro': 'Worker não encontrado'}), 404
+        logger.info("DATABASE: Nó de deteção %s removido do registo.", worker_id)
+        return jsonify({'mensagem': 'Worker removido'}), 200
+    except Exception as e:
+        db.rollback(); return jsonify({'erro': str(e)}), 500
+    finally:
+        db.close()
+
 # ==============================================================================
 # INICIALIZAÇÃO DO SERVIÇO
 # ==============================================================================
 
 if __name__ == '__main__':
+    migrar_no_arranque()
+    if '--migrar-eventos' in sys.argv:
+        # Passo explícito para quem serve o app:app com um gunicorn externo
+        sys.exit(0)
     print("Database Service - Iniciado (Com Memoria de Eventos)")
     print(f"Usando base de dados em: {DATABASE_PATH}")
     print("Porta: 5004")
     print("=" * 50)
-    app.run(host='0.0.0.0', port=5004, debug=True, use_reloader=False)
\ No newline at end of file
+    serve(app, '0.0.0.0', 5004, app_uri='app:app', debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,277 @@
+# database_service/partitions.py - Eventos particionados por mês (um ficheiro SQLite por mês)
+
+import datetime
+import os
+import re
+import threading
+
+from sqlalchemy import create_engine, insert, select, text, update
+from sqlalchemy.exc import OperationalError
+
+# id global de um evento = AAAAMM * ID_FACTOR + id local na partição do mês
+ID_FACTOR = 10 ** 10
+
+_FICHEIRO = re.compile(r'^eventos_(\d{6})\.db$')
+
+
+def month_of(dt):
+    return dt.year * 100 + dt.month
+
+
+def add_months(mes, n):
+    total = (mes // 100) * 12 + (mes % 100 - 1) + n
+    return (total // 12) * 100 + total % 12 + 1
+
+
+class ForaDaRetencao(ValueError):
+    """Evento de um mês já apagado pela retenção ou demasiado no futuro."""
+
+
+class EventPartitions:
+    """
+    Tabela de eventos dividida por mês do timestamp: cada mês é um ficheiro
+    SQLite (<base_dir>/eventos_AAAAMM.db) com a mesma tabela e índices.
+
+    - Inserir: vai só para o ficheiro do mês do evento (índices pequenos).
+    - Consultar um intervalo: só abre os meses que o intersetam, do mais recente
+      para o mais antigo, e para quando já tem 'limite' linhas.
+    - Retenção: apagar um mês é apagar um ficheiro (O(1), sem DELETE linha a
+      linha nem VACUUM); retention_months > 0 aplica-a (sempre a partir do mês
+      UTC atual) ao abrir um mês novo. Eventos de meses já fora da retenção ou
+      depois do próximo mês são recusados (ForaDaRetencao).
+    - ids: AAAAMM * 10^10 + id local, por isso o id indica a partição.
+    """
+    def __init__(self, base_dir, table, retention_months=0, on_open=None):
+        self.base_dir = base_dir
+        self.table = table
+        self.retention_months = retention_months
+        self.on_open = on_open      # chamado com o engine de cada partição aberta (ex: migrar colunas)
+        self._engines = {}          # AAAAMM -> engine
+        self._lock = threading.Lock()
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _path(self, mes):
+        return os.path.join(self.base_dir, f"eventos_{mes}.db")
+
+    def months(self):
+        """Meses com partição, por ordem crescente."""
+        return sorted(int(m.group(1)) for m in map(_FICHEIRO.match, os.listdir(self.base_dir)) if m)
+
+    def _engine(self, mes, criar=False):
+        path = self._path(mes)
+        novo = False
+        with self._lock:
+            engine = self._engines.get(mes)
+            if engine is not None and not os.path.exists(path):
+                # Apagada por outro processo (retenção): não escrever num ficheiro já removido
+                engine.dispose()
+                del self._engines[mes]
+                engine = None
+            if engine is None:
+                if not criar and not os.path.exists(path):
+                    return None
+                novo = not os.path.exists(path)
+                engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+                try:
+                    self.table.create(engine, checkfirst=True)
+                    # O create não acrescenta índices novos a partições antigas
+                    for indice in self.table.indexes:
+                        indice.create(engine, checkfirst=True)
+                except OperationalError:
+                    pass    # criada ao mesmo tempo por outro processo
+                if self.on_open:
+                    self.on_open(engine)
+                self._engines[mes] = engine
+        if novo:
+            self.apply_retention()
+        return engine
+
+    def _mes_atual(self):
+        return month_of(datetime.datetime.utcnow())
+
+    def accepts(self, mes):
+        """
+        True se um evento deste mês pode ser guardado: não anterior à janela de
+        retenção nem depois do próximo mês (um relógio adiantado não cria meses
+        que empurrariam a retenção).
+        """
+        atual = self._mes_atual()
+        if mes > add_months(atual, 1):
+            return False
+        return self.retention_months <= 0 or mes >= add_months(atual, -(self.retention_months - 1))
+
+    def _verificar(self, mes):
+        if not self.accepts(mes):
+            raise ForaDaRetencao(f"mês {mes} fora da janela de retenção de eventos")
+
+    def _select(self, mes):
+        """SELECT das colunas da tabela com o id já convertido em id global."""
+        base = mes * ID_FACTOR
+        return select(*[(c + base).label('id') if c.key == 'id' else c for c in self.table.columns])
+
+    # --- Escrita ---
+
+    def insert(self, linha):
+        """Insere um evento (com 'timestamp') e devolve o id global."""
+        mes = month_of(linha['timestamp'])
+        self._verificar(mes)
+        with self._engine(mes, criar=True).begin() as conn:
+            local_id = conn.execute(insert(self.table), linha).inserted_primary_key[0]
+        return mes * ID_FACTOR + local_id
+
+    def insert_many(self, linhas, sem_fotos_repetidas=False):
+        """
+        Insere muitos eventos, uma transação (executemany) por mês. Recusa o lote
+        todo se algum mês não for aceite. Com sem_fotos_repetidas, os eventos
+        cujo foto_path já existe na partição do mês (ou mais acima no lote) são
+        ignorados (ex: reanalisar as mesmas fotos). Devolve quantos inseriu.
+        """
+        por_mes = {}
+        for linha in linhas:
+            por_mes.setdefault(month_of(linha['timestamp']), []).append(linha)
+        for mes in por_mes:
+            self._verificar(mes)
+        inseridos = 0
+        for mes, grupo in por_mes.items():
+            with self._engine(mes, criar=True).begin() as conn:
+                if sem_fotos_repetidas:
+                    grupo = self._sem_fotos_repetidas(conn, grupo)
+                if grupo:
+                    conn.execute(insert(self.table), grupo)
+            inseridos += len(grupo)
+        return inseridos
+
+    def _sem_fotos_repetidas(self, conn, grupo, lote=500):
+        fotos = list({linha['foto_path'] for linha in grupo if linha.get('foto_path')})
+        vistas = set()
+        coluna = self.table.c.foto_path
+        # Em blocos, abaixo do limite de parâmetros do SQLite
+        for i in range(0, len(fotos), lote):
+            vistas.update(conn.execute(select(coluna).where(coluna.in_(fotos[i:i + lote]))).scalars())
+        novas = []
+        for linha in grupo:
+            foto = linha.get('foto_path')
+            if foto:
+                if foto in vistas:
+                    continue
+                vistas.add(foto)
+            novas.append(linha)
+        return novas
+
+    def migrate_many(self, pares):
+        """
+        Insere eventos copiados de outra tabela, [(id de origem, linha)] por ordem
+        crescente do id de origem, sem duplicar se a cópia for repetida depois de
+        uma falha: cada partição guarda, na mesma transação dos eventos, o maior
+        id de origem já copiado (tabela migracao) e ignora os ids até esse.
+        Devolve quantos eventos inseriu.
+        """
+        por_mes = {}
+        for id_origem, linha in pares:
+            mes = month_of(linha['timestamp'])
+            self._verificar(mes)
+            por_mes.setdefault(mes, []).append((id_origem, linha))
+        inseridos = 0
+        for mes, grupo in por_mes.items():
+            with self._engine(mes, criar=True).begin() as conn:
+                conn.execute(text("CREATE TABLE IF NOT EXISTS migracao (ultimo_id INTEGER NOT NULL)"))
+                ultimo = conn.execute(text("SELECT max(ultimo_id) FROM migracao")).scalar() or 0
+                novos = [linha for id_origem, linha in grupo if id_origem > ultimo]
+                if novos:
+                    conn.execute(insert(self.table), novos)
+                    conn.execute(text("INSERT INTO migracao (ultimo_id) VALUES (:ultimo)"), {'ultimo': grupo[-1][0]})
+                inseridos += len(novos)
+        return inseridos
+
+    def update(self, evento_id, campos):
+        """Altera um evento pelo id global. Devolve False se não existir."""
+        mes, local_id = divmod(evento_id, ID_FACTOR)
+        engine = self._engine(mes)
+        if engine is None:
+            return False
+        with engine.begin() as conn:
+            return conn.execute(update(self.table).where(self.table.c.id == local_id).values(**campos)).rowcount > 0
+
+    # --- Leitura ---
+
+    def get(self, evento_id):
+        mes, local_id = divmod(evento_id, ID_FACTOR)
+        engine = self._engine(mes)
+        if engine is None:
+            return None
+        with engine.connect() as conn:
+            return conn.execute(self._select(mes).where(self.table.c.id == local_id)).first()
+
+    def query(self, inicio=None, fim=None, camera_id=None, limite=10):
+        """
+        Eventos mais recentes primeiro com inicio <= timestamp < fim (ambos
+        opcionais), lidos só das partições desse intervalo.
+        """
+        if limite <= 0:
+            raise ValueError("limite tem de ser positivo")
+        meses = [m for m in self.months()
+                 if (inicio is None or m >= month_of(inicio)) and (fim is None or m <= month_of(fim))]
+        ts = self.table.c.timestamp
+        linhas = []
+        for mes in reversed(meses):
+            engine = self._engine(mes)
+            if engine is None:
+                continue
+            stmt = self._select(mes)
+            if inicio is not None:
+                stmt = stmt.where(ts >= inicio)
+            if fim is not None:
+                stmt = stmt.where(ts < fim)
+            if camera_id is not None:
+                stmt = stmt.where(self.table.c.camera_id == camera_id)
+            with engine.connect() as conn:
+                linhas.extend(conn.execute(stmt.order_by(ts.desc()).limit(limite - len(linhas))).all())
+            if len(linhas) >= limite:
+                break
+        return linhas
+
+    # --- Retenção ---
+
+    def drop(self, mes):
+        """Apaga a partição de um mês inteiro (remove o ficheiro)."""
+        with self._lock:
+            engine = self._engines.pop(mes, None)
+            if engine is not None:
+                engine.dispose()
+            path = self._path(mes)
+            if not os.path.exists(path):
+                return False
+            for sufixo in ('', '-journal', '-wal', '-shm'):
+                if os.path.exists(path + sufixo):
+                    os.remove(path + sufixo)
+        return True
+
+    def apply_retention(self, mes_atual=None):
+        """Apaga os meses anteriores aos últimos retention_months. Devolve os meses apagados."""
+        if self.retention_months <= 0:
+            return []
+        mes_atual = mes_atual or self._mes_atual()
+        limite = add_months(mes_atual, -(self.retention_months - 1))
+        return [mes for mes in self.months() if mes < limite and self.drop(mes)]
+
+    def get_stats(self):
+        particoes = []
+        for mes in self.months():
+            path = self._path(mes)
+            engine = self._engine(mes)
+            if engine is None:
+                continue    # apagada entretanto (retenção noutro processo)
+            with engine.connect() as conn:
+                # max(id) é uma leitura do fim do índice (o count(*) percorria a tabela)
+                ultimo = conn.execute(select(self.table.c.id).order_by(self.table.c.id.desc()).limit(1)).scalar()
+            try:
+                tamanho = os.path.getsize(path)
+            except OSError:
+                continue
+            particoes.append({
+                'mes': mes,
+                'ficheiro': os.path.basename(path),
+                'bytes': tamanho,
+                'eventos_aprox': ultimo or 0,
+            })
+        return {'diretorio': self.base_dir, 'retencao_meses': self.retention_months or None, 'particoes': particoes}
@@ -0,0 +1,58 @@
+# database_service/serializers.py - Conversão rápida de linhas em dicionários JSON
+
+from sqlalchemy import DateTime, select
+
+_DIAS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MESES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def http_date(dt):
+    """Data no formato que o jsonify do Flask usava (RFC 822, ex: 'Wed, 01 Jan 2025 10:00:00 GMT')."""
+    return '%s, %02d %s %04d %02d:%02d:%02d GMT' % (
+        _DIAS[dt.weekday()], dt.day, _MESES[dt.month - 1], dt.year, dt.hour, dt.minute, dt.second)
+
+
+class RowSerializer:
+    """
+    Serializador de um modelo calculado uma só vez: nomes das colunas, posição das
+    datas e um SELECT só com as colunas (sem entidades ORM). Substitui o
+    object_as_dict, que chamava inspect() e percorria o mapper em cada linha.
+    O resultado (tipos JSON) vai direto para o json_response (orjson).
+    """
+    def __init__(self, model):
+        self.colunas = tuple(model.__table__.columns)
+        self.nomes = tuple(c.key for c in self.colunas)
+        self.datas = tuple(c.key for c in self.colunas if isinstance(c.type, DateTime))
+
+    def select(self):
+        """SELECT de todas as colunas do modelo, a completar com where/order_by/limit."""
+        return select(*self.colunas)
+
+    def row(self, row):
+        """Linha de um resultado Core (tuplo pela ordem de self.colunas)."""
+        dados = dict(zip(self.nomes, row))
+        for nome in self.datas:
+            if dados[nome] is not None:
+                dados[nome] = http_date(dados[nome])
+        return dados
+
+    def rows(self, rows):
+        nomes, datas = self.nomes, self.datas
+        if not datas:
+            return [dict(zip(nomes, row)) for row in rows]
+        resultado = []
+        for row in rows:
+            dados = dict(zip(nomes, row))
+            for nome in datas:
+                if dados[nome] is not None:
+                    dados[nome] = http_date(dados[nome])
+            resultado.append(dados)
+        return resultado
+
+    def entity(self, obj):
+        """Entidade ORM já carregada (ex: depois de um INSERT/UPDATE)."""
+        return self.row(tuple(getattr(obj, nome) for nome in self.nomes))
+
+    def mapping(self, dados):
+        """Dicionário com as colunas (ex: a linha acabada de inserir, sem a voltar a ler)."""
+        return self.row(tuple(dados.get(nome) for nome in self.nomes))
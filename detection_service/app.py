@@ -1,27 +1,132 @@
 # detection_service/app.py
 
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.startup import startup  # primeiro, para o perfil de arranque medir os imports seguintes
+
 import cv2
 import numpy as np
-from ultralytics import YOLO
-import os
-import datetime
 import requests
 import io
 import time
-from flask import Flask, request, jsonify
+import atexit
+import socket
+import argparse
+import threading
+from flask import Flask, request, jsonify, send_file, g
+
+from shared.metrics import REGISTRY, install_metrics_endpoint
+from shared.log import configure_logging, get_logger
+from shared.serving import serve, uses_worker_processes
+
+configure_logging('detection_service')
+logger = get_logger('detection_service')
+
+from photo_store import PhotoStore
+from result_cache import DetectionResultCache
+from registration import WorkerRegistration
+from inference_queue import InferenceQueue
+from live_state import LiveState
+
+startup.marcar('imports')
 
 # ==============================================================================
 # CONFIGURAÇÕES DO SERVIÇO
 # ==============================================================================
 
 app = Flask(__name__)
+install_metrics_endpoint(app)
+
+# --- Métricas (expostas em /metrics) ---
+# Latência do /detect separada por etapa: decode, cache, fila, infer, postprocess, persist
+METRICA_ETAPAS = REGISTRY.histogram('detection_stage_seconds', 'Duração de cada etapa do /detect', ('etapa',))
+METRICA_DETECOES = REGISTRY.counter('detection_requests_total', 'Pedidos /detect por resultado', ('resultado',))
 
-CAPTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fotos_capturadas")
+# --- Carga do /detect ---
+# Enviada em cada resposta (X-Detect-Inflight, X-Detect-Latency-Ms) para os
+# clientes (camera_service) abrandarem quando o serviço está saturado.
+carga = {'em_curso': 0, 'latencia_ms': 0.0}
+_carga_lock = threading.Lock()
+REGISTRY.gauge_function('detection_inflight_requests', 'Pedidos /detect em curso', lambda: carga['em_curso'])
+
+@app.before_request
+def _inicio_detect():
+    if request.endpoint == 'detectar':
+        g.detect_inicio = time.perf_counter()
+        with _carga_lock:
+            carga['em_curso'] += 1
+
+@app.after_request
+def _fim_detect(response):
+    if request.endpoint == 'detectar' and 'detect_inicio' in g:
+        ms = (time.perf_counter() - g.detect_inicio) * 1000
+        with _carga_lock:
+            carga['em_curso'] -= 1
+            # Média móvel só dos pedidos processados (os 503 de arranque não contam)
+            if response.status_code == 200:
+                carga['latencia_ms'] = ms if carga['latencia_ms'] == 0 else 0.8 * carga['latencia_ms'] + 0.2 * ms
+            response.headers['X-Detect-Inflight'] = str(carga['em_curso'])
+            response.headers['X-Detect-Latency-Ms'] = f"{carga['latencia_ms']:.1f}"
+    return response
+
+CAPTURES_DIR = os.getenv("CAPTURES_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "fotos_capturadas"))
 os.makedirs(CAPTURES_DIR, exist_ok=True)
 
+# Cache por câmara do último resultado: frames quase iguais (câmaras estáticas)
+# não voltam a passar pelo YOLO. DETECTION_CACHE_TTL=0 desliga a cache.
+result_cache = DetectionResultCache(
+    ttl=float(os.getenv("DETECTION_CACHE_TTL", 2.0)),
+    tolerance=float(os.getenv("DETECTION_CACHE_TOLERANCE", 6)),
+)
+METRICA_CACHE = REGISTRY.counter('detection_cache_lookups_total', 'Consultas à cache de resultados', ('resultado',))
+REGISTRY.gauge_function('detection_cache_hit_rate', 'Fração de /detect servidos pela cache', result_cache.hit_rate)
+
+# Último resultado de cada câmara (pessoas e caixas), só em memória: GET /state
+live_state = LiveState()
+
+# Fotos gravadas em segundo plano, em CAPTURES_DIR/AAAA/MM/DD/<camera_id>/
+photo_store = PhotoStore(
+    CAPTURES_DIR,
+    jpeg_quality=int(os.getenv("PHOTO_JPEG_QUALITY", 85)),
+    workers=int(os.getenv("PHOTO_WRITER_WORKERS", 2)),
+    max_queue=int(os.getenv("PHOTO_MAX_QUEUE", 256)),
+    max_cache=int(os.getenv("PHOTO_INDEX_CACHE", 10000)),
+)
+REGISTRY.gauge_function('detection_photo_queue_depth', 'Fotos à espera de gravação', lambda: photo_store.get_stats()['fila'])
+REGISTRY.gauge_function('detection_photo_write_latency_ms', 'Latência média pedido -> foto em disco', lambda: photo_store.get_stats()['latencia_ms'])
+
 
 MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "modelo", "yolov8s.pt")
-modelo = YOLO(MODEL_PATH)
+# O modelo é carregado numa thread em segundo plano (ver carregar_modelo): o
+# /health responde logo e o /detect devolve 503 até o modelo estar pronto.
+modelo = None
+erro_modelo = None
+
+# --- Fila de inferência com prioridades ---
+# Todos os /detect passam por uma fila servida por INFERENCE_WORKERS threads: as
+# câmaras de prioridade 'alta' passam à frente, e em sobrecarga (DETECTION_QUEUE_MAX
+# frames à espera) ou com o prazo do frame ultrapassado o frame é descartado
+# antes da inferência (503 com X-Detect-Shed). O prazo vem do cliente (deadline_ms)
+# ou, sem ele, é DETECTION_FRAME_DEADLINE_MS.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))
+DETECTION_QUEUE_MAX = int(os.getenv("DETECTION_QUEUE_MAX", 16))
+DETECTION_FRAME_DEADLINE_MS = float(os.getenv("DETECTION_FRAME_DEADLINE_MS", 1500))
+
+METRICA_DESCARTES = REGISTRY.counter('detection_shed_total', 'Frames descartados antes da inferência',
+                                     ('prioridade', 'motivo'))
+
+def inferir(frame):
+    return modelo(frame, verbose=False)
+
+inference_queue = InferenceQueue(
+    inferir,
+    workers=INFERENCE_WORKERS,
+    max_queue=DETECTION_QUEUE_MAX,
+    on_shed=lambda prioridade, motivo: METRICA_DESCARTES.inc(prioridade=prioridade, motivo=motivo),
+)
+REGISTRY.gauge_function('detection_queue_depth', 'Frames à espera de inferência', inference_queue.depth)
 
 DATABASE_SERVICE_URL = os.getenv("DATABASE_SERVICE_URL", "http://127.0.0.1:5004")
 
@@ -30,28 +135,31 @@ NOTIFICATION_SERVICE_URL = os.getenv("NOTIFICATION_SERVICE_URL", "http://127.0.0
 alert_cooldown = {}
 COOLDOWN_SECONDS = 10
 
+# --- Registo no database_service (vários nós de deteção) ---
+# Cada nó anuncia o seu URL e capacidade (pedidos /detect em simultâneo) e renova
+# o registo com heartbeats; o camera_service distribui os frames pelos nós vivos.
+DETECTION_REGISTER = os.getenv("DETECTION_REGISTER", "1") == "1"
+DETECTION_CAPACITY = int(os.getenv("DETECTION_CAPACITY", 4))
+DETECTION_SERVICE_PORT = int(os.getenv("DETECTION_SERVICE_PORT", 5002))
+registo = None
+
 # ==============================================================================
 # FUNÇÕES AUXILIARES
 # ==============================================================================
 
-def salvar_foto(frame, camera_id):
-    try:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"deteccao_{camera_id}_{timestamp}.jpg"
-        filepath = os.path.join(CAPTURES_DIR, filename)
-        
-        cv2.imwrite(filepath, frame)
-        print(f"DETECTION: Foto da deteção salva em {filepath}")
-        return filepath
-    except Exception as e:
-        print(f"DETECTION: Erro ao salvar foto: {e}")
-        return None
+def salvar_foto(frame, camera_id, on_saved=None):
+    """
+    Agenda a gravação da foto no PhotoStore e devolve logo o caminho final.
+    on_saved(registo) é chamado quando o ficheiro já está em disco, ou
+    on_saved(None) se a gravação falhar.
+    """
+    registo = photo_store.save(frame, camera_id, on_saved=on_saved)
+    return registo['path'] if registo else None
 
 def salvar_evento_database(camera_id, camera_nome, confianca, bbox, foto_path):
     """
-    Esta função agora faz DUAS coisas:
-    1. Salva o evento no Banco de Dados (como antes)
-    2. Tenta enviar uma notificação (NOVO)
+    Salva o evento no Banco de Dados.
+    Devolve (id do Evento criado ou None, dados do evento para a notificação).
     """
 
     # 1. Prepara os dados do evento
@@ -68,29 +176,79 @@ def salvar_evento_database(camera_id, camera_nome, confianca, bbox, foto_path):
     try:
         response = requests.post(f"{DATABASE_SERVICE_URL}/events", json=data, timeout=5)
 
+        evento_id = None
         if response.status_code == 201:
-            print(f"DETECTION: Evento da câmara {camera_nome} salvo no banco de dados!")
+            evento_id = response.json().get('id')
+            logger.info("DETECTION: Evento da câmara %s salvo no banco de dados!", camera_nome)
         else:
-            print(f"DETECTION: Erro ao salvar evento no banco. Status: {response.status_code}")
+            logger.warning("DETECTION: Erro ao salvar evento no banco. Status: %s", response.status_code)
 
     except Exception as e:
-        print(f"DETECTION: Erro de conexão com Database Service: {e}")
+        logger.error("DETECTION: Erro de conexão com Database Service: %s", e)
         # Se nem salvou no DB, provavelmente não vale a pena notificar.
-        return # Sai da função
+        return None, None # Sai da função
+
+    return evento_id, data
 
-    # 3. Tenta enviar a notificação (NOVO!)
-    # (Só chegamos aqui se o passo 2 funcionou)
+def enviar_notificacao(data):
+    """Pede ao notification_service para enviar o alerta (com a foto já em disco)."""
     try:
         # Vamos usar a mesma 'data' que enviámos para o DB
         notify_response = requests.post(f"{NOTIFICATION_SERVICE_URL}/notify", json=data, timeout=10) # Damos 10s para o email
 
         if notify_response.status_code == 200:
-            print(f"DETECTION: Pedido de notificação enviado com sucesso.")
+            logger.info("DETECTION: Pedido de notificação enviado com sucesso.")
         else:
-            print(f"DETECTION: AVISO! O Notification Service respondeu com erro: {notify_response.status_code}")
+            logger.warning("DETECTION: O Notification Service respondeu com erro: %s", notify_response.status_code)
 
     except Exception as e:
-        print(f"DETECTION: AVISO! Falha ao conectar com Notification Service: {e}")
+        logger.warning("DETECTION: Falha ao conectar com Notification Service: %s", e)
+
+def limpar_foto_evento(evento_id):
+    """Tira o foto_path de um evento cuja foto não chegou a ser gravada."""
+    try:
+        requests.patch(f"{DATABASE_SERVICE_URL}/events/{evento_id}", json={'foto_path': None}, timeout=5)
+    except Exception as e:
+        logger.warning("DETECTION: Falha ao limpar a foto do evento %s: %s", evento_id, e)
+
+class NotificacaoPendente:
+    """
+    Envia a notificação uma única vez, quando o evento e a foto estão prontos.
+    Se a foto falhar, a notificação segue sem anexo e o evento fica sem foto_path.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._foto = False
+        self._foto_falhou = False
+        self._dados = None
+        self._evento_id = None
+        self._enviada = False
+
+    def foto_pronta(self, gravada=True):
+        with self._lock:
+            self._foto = True
+            self._foto_falhou = not gravada
+        self._tentar()
+
+    def evento_pronto(self, dados, evento_id=None):
+        with self._lock:
+            self._dados = dados
+            self._evento_id = evento_id
+        self._tentar()
+
+    def _tentar(self):
+        with self._lock:
+            if self._enviada or not self._foto or self._dados is None:
+                return
+            self._enviada = True
+            dados, evento_id = self._dados, self._evento_id
+            if self._foto_falhou and dados.get('foto_path'):
+                dados = dict(dados, foto_path=None)
+            else:
+                evento_id = None    # nada a limpar
+        if evento_id:
+            threading.Thread(target=limpar_foto_evento, args=(evento_id,), daemon=True).start()
+        threading.Thread(target=enviar_notificacao, args=(dados,), daemon=True).start()
 
 # ==============================================================================
 # API DE DETEÇÃO
@@ -98,7 +256,21 @@ def salvar_evento_database(camera_id, camera_nome, confianca, bbox, foto_path):
 
 @app.route('/health')
 def health():
-    return jsonify({'status': 'ok', 'service': 'detection_service'})
+    return jsonify({
+        'status': 'ok',
+        'service': 'detection_service',
+        'modelo_carregado': modelo is not None,
+        'erro_modelo': erro_modelo,
+        'arranque': startup.report(),
+        'registo': registo.get_stats() if registo else None,
+    })
+
+def resposta_descartado(pedido):
+    """503 para um frame descartado pela fila (o cliente não deve reenviá-lo a outro nó)."""
+    METRICA_DETECOES.inc(resultado='descartado')
+    return (jsonify({'erro': 'Frame descartado antes da inferência', 'motivo': pedido.motivo,
+                     'prioridade': pedido.prioridade}),
+            503, {'Retry-After': '1', 'X-Detect-Shed': pedido.motivo})
 
 @app.route('/detect', methods=['POST'])
 def detectar():
@@ -106,78 +278,241 @@ def detectar():
         if 'frame' not in request.files:
             return jsonify({'erro': 'Nenhum frame enviado'}), 400
 
+        if modelo is None:
+            METRICA_DETECOES.inc(resultado='a_carregar')
+            return jsonify({'erro': 'Modelo ainda a carregar'}), 503, {'Retry-After': '5'}
+
         camera_id = request.form.get('camera_id', 'unknown')
         camera_nome = request.form.get('camera_nome', 'Câmera Desconhecida')
+        prioridade = request.form.get('prioridade')
+        # Tempo que o cliente ainda espera pela resposta (conta desde a chegada do pedido)
+        prazo_s = request.form.get('deadline_ms', DETECTION_FRAME_DEADLINE_MS, type=float) / 1000
+        prazo_s -= time.perf_counter() - g.detect_inicio
+        if prazo_s <= 0:
+            # Já fora de prazo ao chegar: descartado sem sequer descodificar
+            return resposta_descartado(inference_queue.submit(prioridade, prazo_s, None))
         
-        frame_file = request.files['frame'].read()
-        np_arr = np.frombuffer(frame_file, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        with METRICA_ETAPAS.time(etapa='decode'):
+            frame_file = request.files['frame'].read()
+            np_arr = np.frombuffer(frame_file, np.uint8)
+            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
 
         if frame is None:
+            METRICA_DETECOES.inc(resultado='invalido')
             return jsonify({'erro': 'Frame inválido'}), 400
 
-        resultados = modelo(frame, verbose=False)
+        if result_cache.ativo:
+            with METRICA_ETAPAS.time(etapa='cache'):
+                em_cache, chave_cache = result_cache.lookup(camera_id, frame)
+            if em_cache is not None:
+                live_state.update(camera_id, em_cache, frame.shape[1], frame.shape[0], cache=True)
+                METRICA_CACHE.inc(resultado='hit')
+                METRICA_DETECOES.inc(resultado='cache')
+                # Mesmo frame que o último analisado: nenhum evento novo a registar
+                return jsonify({'detectado': bool(em_cache), 'pessoas': em_cache, 'evento_id': None, 'cache': True})
+            METRICA_CACHE.inc(resultado='miss')
+
+        pedido = inference_queue.wait(inference_queue.submit(prioridade, prazo_s, frame))
+        if pedido.espera_ms is not None:
+            METRICA_ETAPAS.observe(pedido.espera_ms / 1000, etapa='fila')
+        if pedido.inferencia_ms is not None:
+            METRICA_ETAPAS.observe(pedido.inferencia_ms / 1000, etapa='infer')
+        if pedido.motivo is not None:
+            return resposta_descartado(pedido)
+        resultados = pedido.resultado
         
         pessoas_detectadas = []
         
-        for resultado in resultados:
-            for caixa in resultado.boxes:
-                
-                # --- NOSSA LINHA DE DEPURAÇÃO ---
-                classe_id = int(caixa.cls[0])
-                confianca = float(caixa.conf[0])
-                print(f"!!! DEBUG YOLO: VI a classe {classe_id} com {confianca*100:.0f}% de confiança.")
-                # --- FIM DA DEPURAÇÃO ---
-
-                # Classe 0 = Pessoa
-                if classe_id == 0 and confianca > 0.25:
-                    bbox = [int(c) for c in caixa.xyxy[0]]
-                    pessoas_detectadas.append({
-                        'bbox': bbox,
-                        'confianca': confianca
-                    })
-                    
-                    x1, y1, x2, y2 = bbox
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    cv2.putText(frame, f"Pessoa {confianca:.2f}", (x1, y1 - 10), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        with METRICA_ETAPAS.time(etapa='postprocess'):
+            for resultado in resultados:
+                caixas = resultado.boxes
+                # Converte os tensores de uma só vez em vez de caixa a caixa
+                for classe_id, confianca, xyxy in zip(caixas.cls.tolist(), caixas.conf.tolist(), caixas.xyxy.tolist()):
+                    # Classe 0 = Pessoa
+                    if int(classe_id) == 0 and confianca > 0.25:
+                        bbox = [int(c) for c in xyxy]
+                        pessoas_detectadas.append({
+                            'bbox': bbox,
+                            'confianca': confianca
+                        })
+                        
+                        x1, y1, x2, y2 = bbox
+                        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                        cv2.putText(frame, f"Pessoa {confianca:.2f}", (x1, y1 - 10), 
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        if result_cache.ativo:
+            result_cache.store(camera_id, chave_cache, pessoas_detectadas)
+        live_state.update(camera_id, pessoas_detectadas, frame.shape[1], frame.shape[0])
 
         if pessoas_detectadas:
+            METRICA_DETECOES.inc(resultado='pessoa')
+            evento_id = None
             current_time = time.time()
             last_alert = alert_cooldown.get(camera_id, 0)
             
             if (current_time - last_alert) > COOLDOWN_SECONDS:
-                print(f"DETECTION: Detetada pessoa na câmara {camera_nome}! A guardar evento...")
+                logger.info("DETECTION: Detetada pessoa na câmara %s! A guardar evento...", camera_nome)
                 alert_cooldown[camera_id] = current_time
                 
                 primeira_deteccao = pessoas_detectadas[0]
                 
-                foto_path = salvar_foto(frame, camera_id)
-                
-                salvar_evento_database(
-                    camera_id,
-                    camera_nome,
-                    primeira_deteccao['confianca'],
-                    primeira_deteccao['bbox'],
-                    foto_path
-                )
+                # A notificação só parte quando o evento está salvo E a foto escrita
+                # (para ir em anexo), o que pode acontecer por qualquer ordem.
+                with METRICA_ETAPAS.time(etapa='persist'):
+                    notificacao = NotificacaoPendente()
+                    foto_path = salvar_foto(frame, camera_id, on_saved=lambda registo: notificacao.foto_pronta(registo is not None))
+                    if foto_path is None:
+                        notificacao.foto_pronta()
+                    
+                    evento_id, data = salvar_evento_database(
+                        camera_id,
+                        camera_nome,
+                        primeira_deteccao['confianca'],
+                        primeira_deteccao['bbox'],
+                        foto_path
+                    )
+                    if data:
+                        notificacao.evento_pronto(data, evento_id)
             
-            return jsonify({'detectado': True, 'pessoas': pessoas_detectadas})
+            return jsonify({'detectado': True, 'pessoas': pessoas_detectadas, 'evento_id': evento_id})
 
+        METRICA_DETECOES.inc(resultado='vazio')
         return jsonify({'detectado': False, 'pessoas': []})
 
     except Exception as e:
-        print(f"DETECTION: Erro grave na API /detect: {e}")
+        METRICA_DETECOES.inc(resultado='erro')
+        logger.exception("DETECTION: Erro grave na API /detect: %s", e)
         return jsonify({'erro': str(e)}), 500
 
+# ==============================================================================
+# API DE FOTOS (ÍNDICE)
+# ==============================================================================
+
+@app.route('/photos')
+def listar_fotos():
+    """Fotos mais recentes, opcionalmente filtradas por câmara (sem percorrer diretórios)."""
+    camera_id = request.args.get('camera_id')
+    limite = request.args.get('limite', 20, type=int)
+    return jsonify(photo_store.list(camera_id=camera_id, limite=limite))
+
+@app.route('/state')
+def estado_ao_vivo():
+    """
+    Deteção ao vivo por câmara (última inferência, pessoas, caixas), sem tocar
+    na base de dados. ?camera_id= devolve só essa câmara.
+    """
+    camera_id = request.args.get('camera_id')
+    if camera_id:
+        estado = live_state.get(camera_id)
+        if estado is None:
+            return jsonify({'erro': 'Câmara sem deteções neste nó'}), 404
+        return jsonify(estado)
+    return jsonify({'cameras': live_state.snapshot()})
+
+@app.route('/queue/stats')
+def estatisticas_fila():
+    """Fila de inferência: frames à espera, servidos e descartados por prioridade."""
+    return jsonify(inference_queue.get_stats())
+
+@app.route('/cache/stats')
+def estatisticas_cache():
+    """Hit rate da cache de resultados por frames quase iguais."""
+    return jsonify(result_cache.get_stats())
+
+@app.route('/photos/stats')
+def estatisticas_fotos():
+    """Profundidade da fila de escrita e latência pedido -> ficheiro em disco."""
+    return jsonify(photo_store.get_stats())
+
+@app.route('/photos/<photo_id>')
+def obter_foto(photo_id):
+    registo = photo_store.get(photo_id)
+    if not registo or not os.path.exists(registo['path']):
+        return jsonify({'erro': 'Foto não encontrada'}), 404
+    return send_file(registo['path'], mimetype='image/jpeg')
+
+# ==============================================================================
+# CARREGAMENTO DO MODELO (EM SEGUNDO PLANO)
+# ==============================================================================
+
+def carregar_modelo():
+    """
+    Importa o ultralytics/torch só aqui (é o import mais lento do serviço),
+    carrega o modelo e faz uma inferência de aquecimento antes de o publicar.
+    """
+    global modelo, erro_modelo
+    try:
+        with startup.etapa('import_ultralytics'):
+            from ultralytics import YOLO
+        with startup.etapa('carregar_modelo'):
+            novo_modelo = YOLO(MODEL_PATH)
+        with startup.etapa('aquecimento'):
+            # A primeira inferência inicializa kernels/buffers e é muito mais lenta
+            novo_modelo(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False)
+        modelo = novo_modelo
+        logger.info("DETECTION: Modelo carregado (%.1fs).", sum(startup.etapas.get(e, 0) for e in
+                    ('import_ultralytics', 'carregar_modelo', 'aquecimento')))
+        startup.log_report("modelo pronto")
+    except Exception as e:
+        erro_modelo = str(e)
+        logger.exception("DETECTION: Falha ao carregar o modelo: %s", e)
+
+def iniciar_carregamento_modelo():
+    threading.Thread(target=carregar_modelo, daemon=True, name='carregar-modelo').start()
+
+def iniciar_registo(port, por_processo=False):
+    """
+    Regista este nó no database_service (DETECTION_REGISTER=0 desliga). Com
+    por_processo (workers gunicorn) cada worker regista-se com o seu id
+    (<nó>-w<pid>) e a sua carga; o camera_service soma as capacidades dos
+    registos com o mesmo URL, e um worker que sai só remove o seu registo.
+    """
+    global registo
+    if not DETECTION_REGISTER:
+        return
+    url = os.getenv("DETECTION_ADVERTISE_URL") or f"http://{os.getenv('DETECTION_ADVERTISE_HOST', '127.0.0.1')}:{port}"
+    worker_id = os.getenv("DETECTION_WORKER_ID") or f"{socket.gethostname()}-{port}"
+    if por_processo:
+        worker_id = f"{worker_id}-w{os.getpid()}"
+    registo = WorkerRegistration(
+        f"{DATABASE_SERVICE_URL}/detection-workers",
+        worker_id,
+        url,
+        DETECTION_CAPACITY,
+        estado=lambda: {'modelo_carregado': modelo is not None, 'em_curso': carga['em_curso'],
+                        'latencia_ms': round(carga['latencia_ms'], 1)},
+        interval=float(os.getenv("DETECTION_HEARTBEAT_INTERVAL", 5)),
+    )
+    registo.start()
+    atexit.register(registo.stop)
+
+# Importado por um worker gunicorn (módulo 'app'): cada worker carrega o seu modelo
+# e envia heartbeats com o seu próprio id (mesmo URL do nó).
+if __name__ != '__main__':
+    iniciar_carregamento_modelo()
+    iniciar_registo(DETECTION_SERVICE_PORT, por_processo=True)
+
 # ==============================================================================
 # INICIALIZAÇÃO
 # ==============================================================================
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Detection Service")
+    parser.add_argument('--port', type=int, default=DETECTION_SERVICE_PORT,
+                        help="Porta deste nó (vários nós locais em portas diferentes)")
+    args = parser.parse_args()
+    # Os workers gunicorn importam o app.py de novo e leem a porta daqui
+    os.environ["DETECTION_SERVICE_PORT"] = str(args.port)
+
     print("Detection Service - Iniciado (Modo de Depuracao)")
     print(f"Fotos de captura salvas em: {CAPTURES_DIR}")
     print(f"Database Service URL: {DATABASE_SERVICE_URL}")
-    print("Porta: 5002")
+    print(f"Porta: {args.port}")
     print("=" * 50)
-    app.run(host='0.0.0.0', port=5002, debug=True, use_reloader=False)
\ No newline at end of file
+    # Com SERVER_WORKERS > 1 cada worker gunicorn importa o app.py e carrega o seu
+    # modelo; o processo principal só gere os workers e não precisa do modelo.
+    if not uses_worker_processes('app:app'):
+        iniciar_carregamento_modelo()
+        iniciar_registo(args.port)
+    serve(app, '0.0.0.0', args.port, app_uri='app:app', debug=True, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,191 @@
+# detection_service/inference_queue.py - Fila de inferência com prioridades e prazos
+
+import heapq
+import itertools
+import threading
+import time
+
+# Classes de prioridade das câmaras (configuradas no database_service), da mais para a menos urgente
+PRIORIDADES = ('alta', 'normal', 'baixa')
+PRIORIDADE_OMISSAO = 'normal'
+
+# Motivos de descarte de um frame (sem inferência)
+DESCARTE_FILA_CHEIA = 'fila_cheia'    # saiu da fila para dar lugar a um frame mais prioritário/recente
+DESCARTE_EXPIRADO = 'expirado'        # o prazo do frame passou antes de chegar ao modelo
+
+
+def normalizar_prioridade(prioridade):
+    return prioridade if prioridade in PRIORIDADES else PRIORIDADE_OMISSAO
+
+
+class Pedido:
+    """Um frame à espera de inferência. 'estado': novo -> fila -> a_correr -> feito, ou descartado."""
+    __slots__ = ('prioridade', 'nivel', 'seq', 'prazo', 'frame', 'chegada', 'estado',
+                 'motivo', 'resultado', 'erro', 'espera_ms', 'inferencia_ms', '_feito')
+
+    def __init__(self, prioridade, seq, prazo, frame):
+        self.prioridade = prioridade
+        self.nivel = PRIORIDADES.index(prioridade)
+        self.seq = seq
+        self.prazo = prazo
+        self.frame = frame
+        self.chegada = time.monotonic()
+        self.estado = 'novo'
+        self.motivo = None
+        self.resultado = None
+        self.erro = None
+        self.espera_ms = None
+        self.inferencia_ms = None
+        self._feito = threading.Event()
+
+    def __lt__(self, outro):
+        # Mais prioritário primeiro; dentro da mesma classe, por ordem de chegada
+        return (self.nivel, self.seq) < (outro.nivel, outro.seq)
+
+
+class InferenceQueue:
+    """
+    Fila única à frente do modelo, servida por 'workers' threads.
+
+    - Ordem: as câmaras de prioridade 'alta' passam à frente das 'normal' e
+      estas das 'baixa'; dentro da mesma classe, por ordem de chegada.
+    - Sobrecarga: com max_queue frames à espera, um frame novo tira da fila o
+      frame da classe menos prioritária e, nela, o mais antigo (ou é ele o
+      descartado, se for menos prioritário do que todos os que esperam).
+    - Prazo: cada frame traz o tempo que o cliente ainda espera pela resposta;
+      se passar antes de chegar ao modelo é descartado sem gastar CPU.
+    Os descartes são contados por prioridade e motivo (on_shed, get_stats).
+    """
+    def __init__(self, executar, workers=1, max_queue=16, on_shed=None):
+        self.executar = executar
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.on_shed = on_shed
+        self._heap = []
+        self._na_fila = 0           # pedidos em estado 'fila' (o heap pode ter descartados)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads = []
+
+        # --- Estatísticas ---
+        self.servidos = {p: 0 for p in PRIORIDADES}
+        self.descartados = {p: {DESCARTE_FILA_CHEIA: 0, DESCARTE_EXPIRADO: 0} for p in PRIORIDADES}
+        self.espera_ms = {p: 0.0 for p in PRIORIDADES}   # média móvel fila -> modelo
+
+    def _garantir_workers(self):
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, daemon=True, name=f'inferencia-{i}')
+                thread.start()
+                self._threads.append(thread)
+
+    # --- Pedidos ---
+
+    def submit(self, prioridade, prazo_s, frame):
+        """Põe um frame na fila; prazo_s = segundos até o cliente desistir. Devolve o Pedido."""
+        pedido = Pedido(normalizar_prioridade(prioridade), next(self._seq), time.monotonic() + prazo_s, frame)
+        with self._cond:
+            self._garantir_workers()
+            if pedido.prazo <= pedido.chegada:
+                self._descartar(pedido, DESCARTE_EXPIRADO)
+                return pedido
+            if self._na_fila >= self.max_queue:
+                vitima = max((p for p in self._heap if p.estado == 'fila'),
+                             key=lambda p: (p.nivel, -p.seq))
+                if vitima.nivel < pedido.nivel:
+                    # Todos os frames à espera são mais prioritários do que este
+                    self._descartar(pedido, DESCARTE_FILA_CHEIA)
+                    return pedido
+                self._descartar(vitima, DESCARTE_FILA_CHEIA)
+            pedido.estado = 'fila'
+            heapq.heappush(self._heap, pedido)
+            self._na_fila += 1
+            if len(self._heap) > 2 * self.max_queue:
+                # Limpa os descartados que ainda não chegaram ao topo do heap
+                self._heap = [p for p in self._heap if p.estado == 'fila']
+                heapq.heapify(self._heap)
+            self._cond.notify()
+        return pedido
+
+    def wait(self, pedido):
+        """
+        Espera pelo resultado. Se o prazo passar com o frame ainda na fila, é
+        descartado; se já estiver no modelo, espera que a inferência acabe.
+        """
+        if not pedido._feito.wait(max(0.0, pedido.prazo - time.monotonic())):
+            with self._cond:
+                if pedido.estado == 'fila':
+                    self._descartar(pedido, DESCARTE_EXPIRADO)
+            pedido._feito.wait()
+        if pedido.erro is not None:
+            raise pedido.erro
+        return pedido
+
+    def _descartar(self, pedido, motivo):
+        """Chamado com o cadeado. O pedido pode ficar no heap; os workers ignoram-no."""
+        if pedido.estado == 'fila':
+            self._na_fila -= 1
+        pedido.estado, pedido.motivo, pedido.frame = 'descartado', motivo, None
+        self.descartados[pedido.prioridade][motivo] += 1
+        pedido._feito.set()
+        if self.on_shed:
+            self.on_shed(pedido.prioridade, motivo)
+
+    # --- Workers ---
+
+    def _proximo(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0].estado != 'fila':
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    pedido = heapq.heappop(self._heap)
+                    self._na_fila -= 1
+                    pedido.estado = 'a_correr'
+                    if pedido.prazo <= time.monotonic():
+                        # O cliente já desistiu: não vale a pena gastar CPU com este frame
+                        self._descartar(pedido, DESCARTE_EXPIRADO)
+                        continue
+                    pedido.espera_ms = (time.monotonic() - pedido.chegada) * 1000
+                    media = self.espera_ms[pedido.prioridade]
+                    self.espera_ms[pedido.prioridade] = pedido.espera_ms if media == 0 else 0.8 * media + 0.2 * pedido.espera_ms
+                    return pedido
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            pedido = self._proximo()
+            inicio = time.perf_counter()
+            try:
+                pedido.resultado = self.executar(pedido.frame)
+            except Exception as e:
+                pedido.erro = e
+            pedido.inferencia_ms = (time.perf_counter() - inicio) * 1000
+            with self._cond:
+                pedido.estado, pedido.frame = 'feito', None
+                self.servidos[pedido.prioridade] += 1
+            pedido._feito.set()
+
+    # --- Estatísticas ---
+
+    def depth(self):
+        with self._cond:
+            return self._na_fila
+
+    def get_stats(self):
+        with self._cond:
+            na_fila = {p: 0 for p in PRIORIDADES}
+            for pedido in self._heap:
+                if pedido.estado == 'fila':
+                    na_fila[pedido.prioridade] += 1
+            return {
+                'workers': self.workers,
+                'max_fila': self.max_queue,
+                'na_fila': self._na_fila,
+                'prioridades': {p: {
+                    'na_fila': na_fila[p],
+                    'servidos': self.servidos[p],
+                    'descartados': dict(self.descartados[p]),
+                    'espera_ms': round(self.espera_ms[p], 1),
+                } for p in PRIORIDADES},
+            }
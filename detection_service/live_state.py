@@ -0,0 +1,45 @@
+# detection_service/live_state.py - Estado de deteção ao vivo por câmara (só em memória)
+
+import threading
+import time
+
+
+class LiveState:
+    """
+    Último resultado de deteção de cada câmara: instante da inferência, número de
+    pessoas e caixas ([x1, y1, x2, y2, confiança] em píxeis do frame recebido).
+    Responde a "está alguém à frente da câmara agora?" sem passar pelos eventos
+    (que têm cooldown) nem pelo disco/SQLite. Atualizado em cada /detect,
+    incluindo os servidos pela cache de resultados.
+    """
+    def __init__(self, max_cameras=1024):
+        self.max_cameras = max_cameras
+        self._cameras = {}          # camera_id -> estado
+        self._lock = threading.Lock()
+
+    def update(self, camera_id, pessoas, largura, altura, cache=False):
+        estado = {
+            'atualizado': round(time.time(), 3),
+            'pessoas': len(pessoas),
+            'caixas': [p['bbox'] + [round(p['confianca'], 2)] for p in pessoas],
+            'largura': largura,
+            'altura': altura,
+            'cache': cache,
+        }
+        with self._lock:
+            if camera_id not in self._cameras and len(self._cameras) >= self.max_cameras:
+                # Esquece a câmara atualizada há mais tempo
+                del self._cameras[min(self._cameras, key=lambda c: self._cameras[c]['atualizado'])]
+            self._cameras[camera_id] = estado
+
+    def get(self, camera_id):
+        with self._lock:
+            estado = self._cameras.get(camera_id)
+        return dict(estado, idade_s=round(time.time() - estado['atualizado'], 2)) if estado else None
+
+    def snapshot(self):
+        """Estado de todas as câmaras, com a idade (s) de cada resultado."""
+        agora = time.time()
+        with self._lock:
+            return {camera_id: dict(estado, idade_s=round(agora - estado['atualizado'], 2))
+                    for camera_id, estado in self._cameras.items()}
@@ -0,0 +1,226 @@
+# detection_service/photo_store.py - Gravação assíncrona e indexada das fotos de deteção
+
+import collections
+import datetime
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+import cv2
+
+logger = logging.getLogger('detection_service.photos')
+
+
+def para_utc(timestamp):
+    """
+    Converte um timestamp ISO 8601 (ou datetime) do índice para UTC. Os índices
+    antigos gravavam a hora local sem fuso: esses são lidos como hora local.
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    return timestamp.astimezone(datetime.timezone.utc)
+
+
+class PhotoStore:
+    """
+    Guarda as fotos das deteções sem bloquear o pedido /detect.
+
+    - save() calcula logo o caminho final e devolve o registo; o encode JPEG e a
+      escrita em disco são feitos por um pool de threads em segundo plano.
+    - Diretórios por data (UTC) e câmara: <base>/AAAA/MM/DD/<camera_id>/
+    - Nomes sem colisões: timestamp com microssegundos + sufixo aleatório.
+    - Índice partilhado em index.jsonl (os processos só acrescentam linhas).
+      Cada processo guarda em memória as max_cache fotos mais recentes, por
+      ordem de escrita, e antes de responder lê as linhas que os outros
+      processos (workers gunicorn) acrescentaram desde a última leitura. Uma
+      foto mais antiga do que a cache é procurada no ficheiro.
+    """
+    def __init__(self, base_dir, jpeg_quality=85, workers=2, max_queue=256, max_cache=10000):
+        self.base_dir = base_dir
+        self.jpeg_quality = jpeg_quality
+        self.max_cache = max_cache
+        self.index_path = os.path.join(base_dir, "index.jsonl")
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._index = collections.OrderedDict()     # photo_id -> registo (ordem de escrita)
+        self._por_camera = {}       # camera_id -> deque de photo_id (ordem de escrita)
+        self._index_lock = threading.Lock()
+        self._lido_ate = 0          # bytes do index.jsonl já lidos
+
+        # --- Estatísticas ---
+        self.escritas = 0
+        self.falhas = 0
+        self.descartadas = 0
+        self.latencia_ms = 0.0       # média móvel pedido -> ficheiro escrito
+        self.latencia_max_ms = 0.0
+        self.fila_max = 0
+
+        os.makedirs(base_dir, exist_ok=True)
+        with self._index_lock:
+            self._sincronizar()
+        for _ in range(workers):
+            threading.Thread(target=self._writer_loop, daemon=True).start()
+
+    # --- Índice ---
+
+    @staticmethod
+    def _ler_registo(linha):
+        registo = json.loads(linha)
+        # Os índices antigos tinham a hora local sem fuso
+        registo['timestamp'] = para_utc(registo['timestamp']).isoformat()
+        return registo
+
+    def _sincronizar(self):
+        """Lê as linhas novas do index.jsonl (deste e dos outros processos). Chamado com o cadeado."""
+        try:
+            if os.path.getsize(self.index_path) <= self._lido_ate:
+                return
+            with open(self.index_path, 'rb') as f:
+                f.seek(self._lido_ate)
+                dados = f.read()
+        except OSError:
+            return
+        # Uma linha ainda a meio de ser escrita por outro processo fica para a próxima leitura
+        completo = dados.rfind(b'\n') + 1
+        self._lido_ate += completo
+        for linha in dados[:completo].decode('utf-8', errors='replace').splitlines():
+            try:
+                self._add_to_index(self._ler_registo(linha))
+            except (ValueError, KeyError):
+                continue
+
+    def _add_to_index(self, registo):
+        if registo['id'] in self._index:
+            return
+        self._index[registo['id']] = registo
+        ids = self._por_camera.get(registo['camera_id'])
+        if ids is None:
+            ids = self._por_camera[registo['camera_id']] = collections.deque()
+        ids.append(registo['id'])
+        while len(self._index) > self.max_cache:
+            # Esquece a foto mais antiga (continua no index.jsonl)
+            antigo_id, antigo = self._index.popitem(last=False)
+            ids_antigo = self._por_camera[antigo['camera_id']]
+            if ids_antigo and ids_antigo[0] == antigo_id:
+                ids_antigo.popleft()
+            if not ids_antigo:
+                del self._por_camera[antigo['camera_id']]
+
+    def get(self, photo_id):
+        with self._index_lock:
+            self._sincronizar()
+            registo = self._index.get(photo_id)
+        if registo is not None:
+            return registo
+        # Mais antiga do que a cache: procura no ficheiro
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                for linha in f:
+                    if photo_id in linha:
+                        try:
+                            registo = self._ler_registo(linha)
+                        except (ValueError, KeyError):
+                            continue
+                        if registo['id'] == photo_id:
+                            return registo
+        except OSError:
+            pass
+        return None
+
+    def list(self, camera_id=None, limite=20):
+        """Fotos mais recentes (de uma câmara ou de todas), sem ordenar o índice."""
+        with self._index_lock:
+            self._sincronizar()
+            if camera_id:
+                ids = self._por_camera.get(camera_id, ())
+                return [self._index[i] for i in itertools.islice(reversed(ids), limite)]
+            return list(itertools.islice(reversed(self._index.values()), limite))
+
+    # --- Escrita ---
+
+    def save(self, frame, camera_id, on_saved=None):
+        """
+        Agenda a gravação de um frame. Devolve o registo da foto (com o caminho
+        final) ou None se a fila estiver cheia. on_saved(registo) é chamado pela
+        thread de escrita quando o ficheiro já existe em disco, ou on_saved(None)
+        se a gravação falhar.
+        """
+        agora = datetime.datetime.now(datetime.timezone.utc)
+        camera_dir = re.sub(r'[^A-Za-z0-9_-]', '_', str(camera_id))
+        photo_id = f"{agora.strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+        diretorio = os.path.join(self.base_dir, agora.strftime('%Y'), agora.strftime('%m'), agora.strftime('%d'), camera_dir)
+        registo = {
+            'id': photo_id,
+            'camera_id': str(camera_id),
+            'timestamp': agora.isoformat(),
+            'path': os.path.join(diretorio, f"deteccao_{camera_dir}_{photo_id}.jpg"),
+        }
+        try:
+            self._queue.put_nowait((frame, registo, on_saved, time.perf_counter()))
+        except queue.Full:
+            self.descartadas += 1
+            logger.warning("PHOTOS: Fila cheia, foto da câmara %s descartada.", camera_id)
+            return None
+        self.fila_max = max(self.fila_max, self._queue.qsize())
+        return registo
+
+    def _writer_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            frame, registo, on_saved, pedido_em = self._queue.get()
+            try:
+                sucesso, buffer = cv2.imencode('.jpg', frame, params)
+                if not sucesso:
+                    raise ValueError("falha no encode JPEG")
+                os.makedirs(os.path.dirname(registo['path']), exist_ok=True)
+                # Escreve num ficheiro temporário e renomeia: nunca há fotos meio escritas
+                tmp_path = registo['path'] + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer.tobytes())
+                os.replace(tmp_path, registo['path'])
+                registo['bytes'] = len(buffer)
+
+                with self._index_lock:
+                    # Apanha primeiro as linhas dos outros processos, para a ordem de escrita se manter
+                    self._sincronizar()
+                    with open(self.index_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(registo) + '\n')
+                    self._add_to_index(registo)
+
+                latencia = (time.perf_counter() - pedido_em) * 1000
+                self.latencia_ms = latencia if self.escritas == 0 else 0.9 * self.latencia_ms + 0.1 * latencia
+                self.latencia_max_ms = max(self.latencia_max_ms, latencia)
+                self.escritas += 1
+                gravada = registo
+            except Exception as e:
+                self.falhas += 1
+                gravada = None
+                logger.error("PHOTOS: Erro ao gravar foto %s: %s", registo['path'], e)
+            finally:
+                self._queue.task_done()
+
+            if on_saved:
+                try:
+                    on_saved(gravada)
+                except Exception:
+                    logger.exception("PHOTOS: Erro no callback da foto %s", registo['path'])
+
+    def get_stats(self):
+        return {
+            'fila': self._queue.qsize(),
+            'fila_max': self.fila_max,
+            'capacidade_fila': self._queue.maxsize,
+            'escritas': self.escritas,
+            'falhas': self.falhas,
+            'descartadas': self.descartadas,
+            'latencia_ms': round(self.latencia_ms, 2),
+            'latencia_max_ms': round(self.latencia_max_ms, 2),
+            'fotos_em_cache': len(self._index),
+            'max_cache': self.max_cache,
+            'qualidade_jpeg': self.jpeg_quality,
+        }
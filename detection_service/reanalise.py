@@ -0,0 +1,464 @@
+# detection_service/reanalise.py - Reanálise offline de vídeos gravados e fotos guardadas
+#
+# Volta a correr a deteção sobre ficheiros (ex: depois de trocar de modelo):
+#   descodificação -> inferência em lote -> escrita dos eventos
+# com vários processos (cada um carrega o seu modelo), checkpoints para retomar
+# uma reanálise interrompida e escrita dos eventos em lote (POST /events/bulk).
+# O débito pode ser limitado (--max-fps, --nice) para correr ao lado do tráfego real.
+#
+# Exemplos:
+#   python reanalise.py ../fotos_capturadas --workers 2
+#   python reanalise.py gravacao.mp4 --camera-id cam1 --inicio 2025-01-01T08:00:00 \
+#       --fps-amostra 2 --max-fps 20 --checkpoint gravacao.ckpt.json
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+import cv2
+import requests
+
+from photo_store import para_utc
+
+VIDEO_EXT = {'.mp4', '.avi', '.mkv', '.mov', '.m4v'}
+IMAGE_EXT = {'.jpg', '.jpeg', '.png'}
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelo", "yolov8s.pt")
+# Fotos das versões antigas, soltas na raiz de fotos_capturadas: deteccao_<camera_id>_<AAAAMMDD_HHMMSS>.jpg (hora local)
+FOTO_ANTIGA = re.compile(r'^deteccao_(.+)_(\d{8}_\d{6})\.jpg$')
+# Layout do PhotoStore: .../AAAA/MM/DD/<camera_id>/foto.jpg
+DIRETORIO_DATADO = re.compile(r'(^|/)\d{4}/\d{2}/\d{2}/[^/]+$')
+
+# ==============================================================================
+# UNIDADES DE TRABALHO
+# ==============================================================================
+
+def carregar_indices_fotos(diretorios):
+    """Lê os index.jsonl do PhotoStore para saber a câmara e a hora de cada foto."""
+    por_caminho = {}
+    for diretorio in diretorios:
+        index_path = os.path.join(diretorio, "index.jsonl")
+        if not os.path.exists(index_path):
+            continue
+        with open(index_path, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    registo = json.loads(linha)
+                    por_caminho[os.path.abspath(registo['path'])] = registo
+                    # Os caminhos do índice são relativos à pasta de onde o serviço corria
+                    por_caminho.setdefault(os.path.basename(registo['path']), registo)
+                except (ValueError, KeyError):
+                    continue
+    return por_caminho
+
+
+def chave_foto(path):
+    return f"foto:{os.path.abspath(path)}"
+
+
+def listar_unidades(caminhos, segmento_s=300, fotos_por_unidade=64, concluidas=()):
+    """
+    Divide o trabalho em unidades: segmentos de vídeo de segmento_s segundos e
+    grupos de fotos. Os segmentos de vídeo têm uma chave estável, usada no
+    checkpoint; as fotos ficam no checkpoint uma a uma (chave_foto), porque os
+    grupos mudam quando chegam fotos novas. As fotos já em 'concluidas' não
+    entram em nenhum grupo.
+    """
+    videos, fotos = [], []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            for raiz, dirs, ficheiros in os.walk(caminho):
+                dirs.sort()
+                for nome in sorted(ficheiros):
+                    (videos if os.path.splitext(nome)[1].lower() in VIDEO_EXT else fotos).append(os.path.join(raiz, nome))
+        else:
+            (videos if os.path.splitext(caminho)[1].lower() in VIDEO_EXT else fotos).append(caminho)
+
+    unidades = []
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        cap.release()
+        if total <= 0:
+            continue
+        por_segmento = max(1, int(segmento_s * fps))
+        for inicio in range(0, total, por_segmento):
+            fim = min(total, inicio + por_segmento)
+            unidades.append({'chave': f"{os.path.abspath(path)}#{inicio}-{fim}", 'tipo': 'video',
+                             'path': path, 'inicio_frame': inicio, 'fim_frame': fim, 'fps': fps, 'total_frames': total})
+
+    fotos = [p for p in fotos if os.path.splitext(p)[1].lower() in IMAGE_EXT and chave_foto(p) not in concluidas]
+    for i in range(0, len(fotos), fotos_por_unidade):
+        grupo = fotos[i:i + fotos_por_unidade]
+        unidades.append({'chave': f"fotos:{os.path.abspath(grupo[0])}+{len(grupo)}", 'tipo': 'fotos', 'paths': grupo})
+    return unidades
+
+# ==============================================================================
+# PROCESSOS WORKER (DESCODIFICAÇÃO + INFERÊNCIA EM LOTE)
+# ==============================================================================
+
+_modelo = None
+_opcoes = {}
+
+
+def _iniciar_worker(opcoes):
+    """Corre uma vez em cada processo: prioridade, threads do torch e carregamento do modelo."""
+    global _modelo, _opcoes
+    _opcoes = opcoes
+    if opcoes['nice'] and hasattr(os, 'nice'):
+        os.nice(opcoes['nice'])
+    from ultralytics import YOLO
+    try:
+        import torch
+        torch.set_num_threads(opcoes['threads'])
+    except ImportError:
+        pass
+    _modelo = YOLO(opcoes['modelo'])
+
+
+def _frames(unidade, fps_amostra):
+    """Gera (frame, meta) da unidade. Nos vídeos salta frames com grab() (sem descodificar)."""
+    if unidade['tipo'] == 'fotos':
+        for path in unidade['paths']:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame, {'path': path}
+        return
+
+    cap = cv2.VideoCapture(unidade['path'])
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, unidade['inicio_frame'])
+        passo = max(1, round(unidade['fps'] / fps_amostra)) if fps_amostra else 1
+        for indice in range(unidade['inicio_frame'], unidade['fim_frame']):
+            if not cap.grab():
+                break
+            if (indice - unidade['inicio_frame']) % passo:
+                continue
+            ok, frame = cap.retrieve()
+            if ok:
+                yield frame, {'indice': indice}
+    finally:
+        cap.release()
+
+
+def processar_unidade(unidade):
+    """
+    Descodifica numa thread (pré-carregamento) enquanto a thread principal faz a
+    inferência em lotes de 'batch' frames. Devolve as deteções da unidade.
+    """
+    batch, conf = _opcoes['batch'], _opcoes['conf']
+    max_fps = _opcoes['max_fps_worker']
+    fila = queue.Queue(maxsize=batch * 2)
+
+    def descodificar():
+        try:
+            for item in _frames(unidade, _opcoes['fps_amostra']):
+                fila.put(item)
+        finally:
+            fila.put(None)
+
+    threading.Thread(target=descodificar, daemon=True).start()
+
+    inicio = time.time()
+    frames, deteccoes = 0, []
+    fim_dos_frames = False
+    while not fim_dos_frames:
+        lote = []
+        while len(lote) < batch:
+            item = fila.get()
+            if item is None:
+                fim_dos_frames = True
+                break
+            lote.append(item)
+        if not lote:
+            break
+
+        resultados = _modelo([frame for frame, _ in lote], verbose=False)
+        for (_, meta), resultado in zip(lote, resultados):
+            caixas = resultado.boxes
+            pessoas = [(c, [int(v) for v in xyxy]) for classe, c, xyxy in
+                       zip(caixas.cls.tolist(), caixas.conf.tolist(), caixas.xyxy.tolist())
+                       if int(classe) == 0 and c > conf]
+            if pessoas:
+                confianca, bbox = max(pessoas)
+                deteccoes.append(dict(meta, confianca=confianca, bbox=bbox, pessoas=len(pessoas)))
+        frames += len(lote)
+
+        # Limite de débito deste worker (frames/s)
+        if max_fps:
+            adiantado = frames / max_fps - (time.time() - inicio)
+            if adiantado > 0:
+                time.sleep(adiantado)
+
+    return {'chave': unidade['chave'], 'frames': frames, 'deteccoes': deteccoes,
+            'segundos': time.time() - inicio, 'pid': os.getpid()}
+
+# ==============================================================================
+# EVENTOS E CHECKPOINT (PROCESSO PRINCIPAL)
+# ==============================================================================
+
+def iso_utc(momento):
+    """Timestamp dos eventos: UTC sem fuso, como o database_service os guarda."""
+    if isinstance(momento, (int, float)):
+        momento = datetime.datetime.fromtimestamp(momento, datetime.timezone.utc)
+    return para_utc(momento).replace(tzinfo=None).isoformat()
+
+
+def origem_foto(path, indice_fotos, camera_id=None):
+    """
+    (camera_id, timestamp, foto_path) de uma foto, ou None se não se souber a
+    câmara. foto_path é o caminho com que o detection_service guardou o evento
+    (o do índice, ou o absoluto nas fotos antigas), para não duplicar eventos.
+    Ordem: índice, --camera-id, nome das fotos antigas, pasta da câmara do PhotoStore.
+    """
+    registo = (indice_fotos.get(os.path.abspath(path))
+               or indice_fotos.get(os.path.basename(path)) or {})
+    if registo.get('camera_id'):
+        return registo['camera_id'], iso_utc(registo.get('timestamp') or os.path.getmtime(path)), registo['path']
+    antiga = FOTO_ANTIGA.match(os.path.basename(path))
+    if antiga:
+        momento = iso_utc(datetime.datetime.strptime(antiga.group(2), "%Y%m%d_%H%M%S"))
+        return camera_id or antiga.group(1), momento, os.path.abspath(path)
+    diretorio = os.path.dirname(os.path.abspath(path)).replace(os.sep, '/')
+    if not camera_id and not DIRETORIO_DATADO.search(diretorio):
+        return None
+    return camera_id or os.path.basename(diretorio), iso_utc(os.path.getmtime(path)), os.path.abspath(path)
+
+
+def construir_eventos(unidade, resultado, args, indice_fotos, ultimos):
+    """
+    Converte as deteções de uma unidade em eventos. Nos vídeos há cooldown em
+    tempo de vídeo; 'ultimos' (caminho do vídeo -> segundo do último evento)
+    leva-o de um segmento para o seguinte, por isso os segmentos de cada vídeo
+    têm de chegar aqui por ordem (SequenciaVideos). As fotos sem câmara
+    conhecida são ignoradas.
+    """
+    eventos = []
+    if unidade['tipo'] == 'fotos':
+        for d in resultado['deteccoes']:
+            origem = origem_foto(d['path'], indice_fotos, args.camera_id)
+            if origem is None:
+                continue
+            camera_id, timestamp, foto_path = origem
+            eventos.append({'camera_id': camera_id, 'camera_nome': args.camera_nome or camera_id,
+                            'confianca': d['confianca'], 'bbox': d['bbox'], 'foto_path': foto_path,
+                            'timestamp': timestamp})
+        return eventos
+
+    camera_id = args.camera_id or os.path.splitext(os.path.basename(unidade['path']))[0]
+    if args.inicio:
+        inicio_video = datetime.datetime.fromisoformat(args.inicio)
+        if inicio_video.tzinfo is None:
+            inicio_video = inicio_video.replace(tzinfo=datetime.timezone.utc)
+    else:
+        # Sem --inicio: assume que o ficheiro foi fechado no fim da gravação
+        duracao = unidade['total_frames'] / unidade['fps']
+        inicio_video = datetime.datetime.fromtimestamp(os.path.getmtime(unidade['path']) - duracao, datetime.timezone.utc)
+    video = os.path.abspath(unidade['path'])
+    for d in sorted(resultado['deteccoes'], key=lambda d: d['indice']):
+        segundos = d['indice'] / unidade['fps']
+        if ultimos.get(video) is not None and segundos - ultimos[video] < args.cooldown:
+            continue
+        ultimos[video] = segundos
+        eventos.append({'camera_id': camera_id, 'camera_nome': args.camera_nome or camera_id,
+                        'confianca': d['confianca'], 'bbox': d['bbox'], 'foto_path': None,
+                        'timestamp': iso_utc(inicio_video + datetime.timedelta(seconds=segundos))})
+    return eventos
+
+
+class SequenciaVideos:
+    """
+    Os workers acabam as unidades por qualquer ordem (imap_unordered); isto
+    guarda os segmentos de cada vídeo que chegam adiantados e entrega-os pela
+    ordem do vídeo, para o cooldown continuar entre segmentos. As fotos passam logo.
+    """
+    def __init__(self, pendentes):
+        self.ordem = {}         # vídeo -> chaves dos segmentos por fazer, por ordem
+        self.prontos = {}       # chave -> (unidade, resultado) à espera dos anteriores
+        for unidade in sorted((u for u in pendentes if u['tipo'] == 'video'), key=lambda u: u['inicio_frame']):
+            self.ordem.setdefault(os.path.abspath(unidade['path']), deque()).append(unidade['chave'])
+
+    def entregar(self, unidade, resultado):
+        """Devolve as (unidade, resultado) que já podem ser processadas, por ordem."""
+        if unidade['tipo'] != 'video':
+            return [(unidade, resultado)]
+        self.prontos[unidade['chave']] = (unidade, resultado)
+        ordem = self.ordem[os.path.abspath(unidade['path'])]
+        prontas = []
+        while ordem and ordem[0] in self.prontos:
+            prontas.append(self.prontos.pop(ordem.popleft()))
+        return prontas
+
+
+def fotos_na_saida(path):
+    """foto_path dos eventos já escritos no ficheiro --saida (para não os repetir)."""
+    fotos = set()
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    foto = json.loads(linha).get('foto_path')
+                except ValueError:
+                    continue
+                if foto:
+                    fotos.add(foto)
+    return fotos
+
+
+def enviar_eventos(eventos, args, fotos_escritas):
+    """
+    Escreve os eventos em lotes no database_service (ou num ficheiro JSONL com
+    --saida) sem repetir eventos de fotos que já têm evento (ex: gravado ao vivo
+    ou numa reanálise anterior). Devolve quantos escreveu.
+    """
+    if args.saida:
+        novos = [e for e in eventos if not e['foto_path'] or e['foto_path'] not in fotos_escritas]
+        with open(args.saida, 'a', encoding='utf-8') as f:
+            for evento in novos:
+                f.write(json.dumps(evento, ensure_ascii=False) + '\n')
+        fotos_escritas.update(e['foto_path'] for e in novos if e['foto_path'])
+        return len(novos)
+    inseridos = 0
+    for i in range(0, len(eventos), args.lote_eventos):
+        lote = eventos[i:i + args.lote_eventos]
+        for tentativa in range(3):
+            try:
+                response = requests.post(f"{args.database_url}/events/bulk", params={'sem_fotos_repetidas': 1},
+                                         json=lote, timeout=30)
+                if response.status_code == 201:
+                    inseridos += response.json().get('inseridos', len(lote))
+                    break
+                erro = f"status {response.status_code}: {response.text[:200]}"
+            except requests.exceptions.RequestException as e:
+                erro = str(e)
+            time.sleep(2 ** tentativa)
+        else:
+            raise RuntimeError(f"Falha ao enviar eventos para o Database Service ({erro})")
+    return inseridos
+
+
+class Checkpoint:
+    """Segmentos de vídeo e fotos já concluídos (e os seus eventos já escritos), gravado de forma atómica."""
+    def __init__(self, path, recomecar=False):
+        self.path = path
+        self.concluidas = {}
+        if path and os.path.exists(path) and not recomecar:
+            with open(path, encoding='utf-8') as f:
+                self.concluidas = json.load(f).get('concluidas', {})
+
+    def concluir(self, unidade, frames, eventos, ultimo_evento_s=None):
+        if unidade['tipo'] == 'fotos':
+            # O foto_path do evento pode ser o do índice (outro diretório base), mas o nome é único
+            nomes = [os.path.basename(e['foto_path']) for e in eventos]
+            for path in unidade['paths']:
+                self.concluidas[chave_foto(path)] = {'frames': 1, 'eventos': nomes.count(os.path.basename(path))}
+        else:
+            # ultimo_evento_s: para retomar o cooldown no segmento seguinte
+            self.concluidas[unidade['chave']] = {'frames': frames, 'eventos': len(eventos),
+                                                 'ultimo_evento_s': ultimo_evento_s}
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'concluidas': self.concluidas}, f)
+        os.replace(tmp_path, self.path)
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Reanálise offline de vídeos e fotos com o modelo de deteção")
+    parser.add_argument('caminhos', nargs='+', help="Ficheiros ou pastas (vídeos e/ou fotos)")
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Processos de inferência (cada um carrega o modelo)")
+    parser.add_argument('--threads-por-worker', type=int, help="Threads do torch por processo")
+    parser.add_argument('--batch', type=int, default=8, help="Frames por inferência")
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--fps-amostra', type=float, default=2.0, help="Frames analisados por segundo de vídeo (0 = todos)")
+    parser.add_argument('--segmento', type=float, default=300, help="Segundos de vídeo por unidade de trabalho")
+    parser.add_argument('--max-fps', type=float, default=0, help="Limite total de frames/s (0 = sem limite)")
+    parser.add_argument('--nice', type=int, default=10, help="Prioridade dos workers (POSIX)")
+    parser.add_argument('--camera-id', help="Câmara dos eventos (por omissão: nome do ficheiro / índice de fotos)")
+    parser.add_argument('--camera-nome')
+    parser.add_argument('--inicio', help="Hora de início do vídeo (ISO 8601; UTC se não tiver fuso)")
+    parser.add_argument('--cooldown', type=float, default=10, help="Segundos de vídeo entre eventos da mesma câmara")
+    parser.add_argument('--database-url', default=os.getenv("DATABASE_SERVICE_URL", "http://127.0.0.1:5004"))
+    parser.add_argument('--lote-eventos', type=int, default=500, help="Eventos por POST /events/bulk")
+    parser.add_argument('--saida', help="Escreve os eventos num ficheiro JSONL em vez de os enviar")
+    parser.add_argument('--checkpoint', default="reanalise_checkpoint.json")
+    parser.add_argument('--recomecar', action='store_true', help="Ignora o checkpoint existente")
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint(args.checkpoint, args.recomecar)
+    unidades = listar_unidades(args.caminhos, args.segmento, concluidas=checkpoint.concluidas)
+    pendentes = [u for u in unidades if u['chave'] not in checkpoint.concluidas]
+    por_chave = {u['chave']: u for u in pendentes}
+    indice_fotos = carregar_indices_fotos([c for c in args.caminhos if os.path.isdir(c)])
+    print(f"REANÁLISE: {len(pendentes)} unidades por fazer ({len(checkpoint.concluidas)} segmentos/fotos "
+          f"já no checkpoint), {args.workers} workers, lote de {args.batch} frames")
+    if not pendentes:
+        return
+
+    opcoes = {
+        'modelo': args.modelo,
+        'batch': args.batch,
+        'conf': args.conf,
+        'fps_amostra': args.fps_amostra,
+        'max_fps_worker': args.max_fps / args.workers if args.max_fps else 0,
+        'nice': args.nice,
+        'threads': args.threads_por_worker or max(1, (os.cpu_count() or 1) // args.workers),
+    }
+    # Cooldown de cada vídeo a partir do último evento dos segmentos já concluídos
+    ultimos = {}
+    for unidade in unidades:
+        feito = checkpoint.concluidas.get(unidade['chave']) if unidade['tipo'] == 'video' else None
+        if feito and feito.get('ultimo_evento_s') is not None:
+            video = os.path.abspath(unidade['path'])
+            ultimos[video] = max(ultimos.get(video, feito['ultimo_evento_s']), feito['ultimo_evento_s'])
+    sequencia = SequenciaVideos(pendentes)
+    fotos_escritas = fotos_na_saida(args.saida)
+
+    inicio = time.time()
+    frames = eventos_total = sem_camera = 0
+    with multiprocessing.Pool(args.workers, initializer=_iniciar_worker, initargs=(opcoes,)) as pool:
+        for feitas, resultado in enumerate(pool.imap_unordered(processar_unidade, pendentes), 1):
+            frames += resultado['frames']
+            escritos = 0
+            for unidade, pronto in sequencia.entregar(por_chave[resultado['chave']], resultado):
+                eventos = construir_eventos(unidade, pronto, args, indice_fotos, ultimos)
+                if unidade['tipo'] == 'fotos':
+                    sem_camera += len(pronto['deteccoes']) - len(eventos)
+                if eventos:
+                    escritos += enviar_eventos(eventos, args, fotos_escritas)
+                # Só marca a unidade como concluída depois de os eventos estarem escritos
+                checkpoint.concluir(unidade, pronto['frames'], eventos,
+                                    ultimos.get(os.path.abspath(unidade['path'])) if unidade['tipo'] == 'video' else None)
+            eventos_total += escritos
+            decorrido = time.time() - inicio
+            print(f"[{feitas}/{len(pendentes)}] {resultado['frames']} frames, {escritos} eventos "
+                  f"({resultado['frames'] / max(resultado['segundos'], 1e-6):.1f} frames/s no worker {resultado['pid']}) "
+                  f"| total {frames / decorrido:.1f} frames/s")
+
+    decorrido = time.time() - inicio
+    print(json.dumps({
+        'unidades': len(pendentes),
+        'frames': frames,
+        'eventos': eventos_total,
+        'fotos_sem_camera': sem_camera,
+        'segundos': round(decorrido, 1),
+        'frames_por_s': round(frames / decorrido, 1) if decorrido else None,
+        'workers': args.workers,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# detection_service/registration.py - Registo deste nó de deteção no database_service
+
+import logging
+import threading
+
+import requests
+
+logger = logging.getLogger('detection_service.registration')
+
+
+class WorkerRegistration:
+    """
+    Anuncia o nó (URL e capacidade) no registo de workers do database_service e
+    renova o registo a cada 'interval' segundos (heartbeat). O camera_service lê
+    o registo para distribuir os frames; um nó sem heartbeat deixa de aparecer.
+    'estado' devolve os campos variáveis enviados em cada heartbeat (ex: modelo carregado).
+    """
+    def __init__(self, registry_url, worker_id, url, capacity, estado=None, interval=5.0):
+        self.registry_url = registry_url
+        self.worker_id = worker_id
+        self.url = url
+        self.capacity = capacity
+        self.estado = estado or dict
+        self.interval = interval
+        self.registado = False
+        self._parar = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name='registo-worker')
+            self._thread.start()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self.heartbeat()
+            self._parar.wait(self.interval)
+
+    def heartbeat(self):
+        dados = dict(self.estado(), worker_id=self.worker_id, url=self.url, capacidade=self.capacity)
+        try:
+            response = requests.post(self.registry_url, json=dados, timeout=3)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        if ok != self.registado:
+            if ok:
+                logger.info("REGISTO: Nó %s registado em %s (%s).", self.worker_id, self.registry_url, self.url)
+            else:
+                logger.warning("REGISTO: Falha no heartbeat para %s; nova tentativa em %.0fs.",
+                               self.registry_url, self.interval)
+            self.registado = ok
+        return ok
+
+    def stop(self):
+        """Remove o nó do registo (paragem limpa); sem isto sai ao expirar o heartbeat."""
+        self._parar.set()
+        try:
+            requests.delete(f"{self.registry_url}/{self.worker_id}", timeout=2)
+        except requests.exceptions.RequestException:
+            pass
+
+    def get_stats(self):
+        return {
+            'worker_id': self.worker_id,
+            'url': self.url,
+            'capacidade': self.capacity,
+            'registo': self.registry_url,
+            'registado': self.registado,
+        }
@@ -0,0 +1,100 @@
+# detection_service/result_cache.py - Cache de resultados para frames quase iguais
+
+import threading
+import time
+
+import numpy as np
+
+# Pesos BT.601 para converter BGR em cinzento
+_PESOS_CINZA = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+
+def assinatura(frame, grid=(24, 32), passo=4):
+    """
+    Hash percetual do frame: miniatura em tons de cinzento de grid (linhas x
+    colunas), calculada só com NumPy (subamostragem + média por blocos).
+    Dois frames "iguais" a menos de ruído têm miniaturas quase idênticas; uma
+    pessoa a entrar na cena muda fortemente pelo menos um bloco.
+    Em frames pequenos o passo é reduzido para haver pelo menos um píxel por
+    bloco; frames com menos píxeis do que a grelha não têm assinatura (None).
+    """
+    linhas, colunas = grid
+    if frame.shape[0] < linhas or frame.shape[1] < colunas:
+        return None
+    passo = max(1, min(passo, frame.shape[0] // linhas, frame.shape[1] // colunas))
+    pequeno = frame[::passo, ::passo].astype(np.float32) @ _PESOS_CINZA
+    h = pequeno.shape[0] // linhas * linhas
+    w = pequeno.shape[1] // colunas * colunas
+    blocos = pequeno[:h, :w].reshape(linhas, h // linhas, colunas, w // colunas)
+    return blocos.mean(axis=(1, 3))
+
+
+class DetectionResultCache:
+    """
+    Último resultado de deteção por câmara, reutilizado enquanto o frame não
+    mudar: nenhum bloco da miniatura pode variar mais de 'tolerance' níveis de
+    cinzento (0-255) e o resultado tem no máximo 'ttl' segundos. Funciona para
+    qualquer cliente do /detect (não depende de deteção de movimento no emissor).
+    """
+    def __init__(self, ttl=2.0, tolerance=6.0, grid=(24, 32), max_cameras=1024):
+        self.ttl = ttl
+        self.tolerance = tolerance
+        self.grid = grid
+        self.max_cameras = max_cameras
+        self._entradas = {}         # camera_id -> (assinatura, resultado, instante)
+        self._lock = threading.Lock()
+
+        # --- Estatísticas ---
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+
+    @property
+    def ativo(self):
+        return self.ttl > 0
+
+    def lookup(self, camera_id, frame):
+        """Devolve (resultado em cache ou None, assinatura do frame para o store)."""
+        chave = assinatura(frame, self.grid)
+        with self._lock:
+            entrada = self._entradas.get(camera_id)
+            if chave is None or entrada is None or entrada[0].shape != chave.shape:
+                self.misses += 1
+                return None, chave
+            anterior, resultado, instante = entrada
+            if time.monotonic() - instante > self.ttl:
+                self.expirados += 1
+                return None, chave
+            distancia = np.abs(chave - anterior).max()
+            # 'not <=' também trata uma distância NaN/inf como frame diferente
+            if not distancia <= self.tolerance:
+                self.misses += 1
+                return None, chave
+            self.hits += 1
+            return resultado, chave
+
+    def store(self, camera_id, chave, resultado):
+        if chave is None:
+            return
+        with self._lock:
+            if camera_id not in self._entradas and len(self._entradas) >= self.max_cameras:
+                # Descarta a entrada mais antiga (câmaras que deixaram de enviar)
+                mais_antiga = min(self._entradas, key=lambda c: self._entradas[c][2])
+                del self._entradas[mais_antiga]
+            self._entradas[camera_id] = (chave, resultado, time.monotonic())
+
+    def hit_rate(self):
+        total = self.hits + self.misses + self.expirados
+        return self.hits / total if total else 0.0
+
+    def get_stats(self):
+        return {
+            'ativo': self.ativo,
+            'ttl_s': self.ttl,
+            'tolerancia': self.tolerance,
+            'cameras': len(self._entradas),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirados': self.expirados,
+            'hit_rate': round(self.hit_rate(), 3),
+        }
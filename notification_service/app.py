@@ -1,16 +1,32 @@
 # detecção_socorro/notification_service/app.py - VERSÃO COMPLETA
 
 import os
+import sys
+import time
 import smtplib
 from email.message import EmailMessage
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv # Vamos usar .env para segurança
 import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.metrics import REGISTRY, install_metrics_endpoint
+from shared.log import configure_logging, get_logger
+from shared.serving import serve
+
+configure_logging('notification_service')
+logger = get_logger('notification_service')
+
 # Carrega variáveis de ambiente de um ficheiro .env na mesma pasta
 
 load_dotenv() 
 
 app = Flask(__name__)
+install_metrics_endpoint(app)
+
+# --- Métricas (expostas em /metrics) ---
+METRICA_SMTP = REGISTRY.histogram('notification_smtp_send_seconds', 'Ligação + login + envio SMTP', ('resultado',))
+METRICA_NOTIFICACOES = REGISTRY.counter('notification_requests_total', 'Pedidos /notify por resultado', ('resultado',))
 
 DATABASE_SERVICE_URL = os.getenv("DATABASE_SERVICE_URL", "http://127.0.0.1:5004")
 # ==============================================================================
@@ -28,12 +44,8 @@ EMAIL_USER = os.getenv("EMAIL_USER")       # Ex: "o.seu.email@gmail.com"
 EMAIL_PASS = os.getenv("EMAIL_PASS")       # A "Senha de App" que gerou
 
 if not EMAIL_USER or not EMAIL_PASS:
-    print("="*50)
-    print("!!! ERRO CRÍTICO - NOTIFICATION SERVICE !!!")
-    print("As variáveis EMAIL_USER ou EMAIL_PASS não estão definidas.")
-    print("Crie um ficheiro '.env' nesta pasta ou defina-as no sistema.")
-    print("O serviço vai rodar, mas NÃO VAI enviar e-mails.")
-    print("="*50)
+    logger.error("EMAIL: As variáveis EMAIL_USER ou EMAIL_PASS não estão definidas (ficheiro '.env' nesta "
+                 "pasta ou variáveis do sistema). O serviço vai rodar, mas NÃO VAI enviar e-mails.")
 
 # ==============================================================================
 # LÓGICA DE ENVIO DE E-MAIL
@@ -57,12 +69,12 @@ def obter_email_da_camera(camera_id):
             # Se encontrou, retorna o e-mail
             return response.json().get('receiver_email')
         else:
-            print(f"EMAIL: Não foi possível obter e-mail da câmera {camera_id}. DB respondeu com {response.status_code}")
+            logger.warning("EMAIL: Não foi possível obter e-mail da câmera %s. DB respondeu com %s", camera_id, response.status_code)
             return None
 
     # O "except" TEM DE estar indentado aqui, dentro da função
     except Exception as e:
-        print(f"EMAIL: Erro ao conectar com DB para obter e-mail: {e}")
+        logger.warning("EMAIL: Erro ao conectar com DB para obter e-mail: %s", e)
         # Este é o erro que vai aparecer se o Firewall estiver a bloquear
         return None
 
@@ -71,7 +83,7 @@ def enviar_email_alerta(evento):
     
     # Se não configurámos as senhas, não fazemos nada
     if not EMAIL_USER or not EMAIL_PASS:
-        print("EMAIL: Falha ao enviar. EMAIL_USER ou EMAIL_PASS não configurados.")
+        logger.warning("EMAIL: Falha ao enviar. EMAIL_USER ou EMAIL_PASS não configurados.")
         return False
 
     # --- INÍCIO DA NOVA LÓGICA ---
@@ -89,7 +101,7 @@ def enviar_email_alerta(evento):
     email_destino = email_destino_camera or EMAIL_USER
     # --- FIM DA NOVA LÓGICA ---
 
-    print(f"EMAIL: A preparar e-mail para {email_destino} sobre a câmara {cam_nome}...")
+    logger.info("EMAIL: A preparar e-mail para %s sobre a câmara %s...", email_destino, cam_nome)
 
     # Cria a mensagem
     msg = EmailMessage()
@@ -115,25 +127,29 @@ def enviar_email_alerta(evento):
             with open(foto_path, 'rb') as f:
                 img_data = f.read()
                 msg.add_attachment(img_data, maintype='image', subtype='jpeg', filename=os.path.basename(foto_path))
-            print(f"EMAIL: Foto {foto_path} anexada com sucesso.")
+            logger.info("EMAIL: Foto %s anexada com sucesso.", foto_path)
         except Exception as e:
-            print(f"EMAIL: Erro ao anexar foto {foto_path}: {e}")
+            logger.warning("EMAIL: Erro ao anexar foto %s: %s", foto_path, e)
     else:
-        print(f"EMAIL: Foto {foto_path} não encontrada. A enviar e-mail sem anexo.")
+        logger.warning("EMAIL: Foto %s não encontrada. A enviar e-mail sem anexo.", foto_path)
 
     
+    inicio_envio = time.perf_counter()
     try:
         with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
             server.starttls() # Inicia segurança
             server.login(EMAIL_USER, EMAIL_PASS)
             server.send_message(msg)
-        print(f"EMAIL: Alerta enviado com sucesso para {email_destino}!")
+        METRICA_SMTP.observe(time.perf_counter() - inicio_envio, resultado='ok')
+        logger.info("EMAIL: Alerta enviado com sucesso para %s!", email_destino)
         return True
     except smtplib.SMTPAuthenticationError:
-        print(f"!!! ERRO DE EMAIL: Falha na autenticação. Verifique o EMAIL_USER e a SENHA DE APP.")
+        METRICA_SMTP.observe(time.perf_counter() - inicio_envio, resultado='autenticacao')
+        logger.error("EMAIL: Falha na autenticação. Verifique o EMAIL_USER e a SENHA DE APP.")
         return False
     except Exception as e:
-        print(f"!!! ERRO DE EMAIL: Falha ao enviar: {e}")
+        METRICA_SMTP.observe(time.perf_counter() - inicio_envio, resultado='erro')
+        logger.error("EMAIL: Falha ao enviar: %s", e)
         return False
 # ==============================================================================
 # API DE NOTIFICAÇÃO
@@ -154,6 +170,7 @@ def notificar():
 
     # Chama a nossa nova função de envio de e-mail
     sucesso = enviar_email_alerta(evento)
+    METRICA_NOTIFICACOES.inc(resultado='enviada' if sucesso else 'falhou')
     
     if sucesso:
         return jsonify({'mensagem': 'Notificação enviada com sucesso'}), 200
@@ -168,4 +185,4 @@ if __name__ == '__main__':
     print("Notification Service - Iniciado")
     print("Porta: 5003")
     print("=" * 50)
-    app.run(host='0.0.0.0', port=5003, debug=True, use_reloader=False)
\ No newline at end of file
+    serve(app, '0.0.0.0', 5003, app_uri='app:app', debug=True, use_reloader=False)
\ No newline at end of file
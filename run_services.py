@@ -1,77 +1,251 @@
+import argparse
+import json
 import subprocess
+import threading
 import time
 import sys
 import os
+import urllib.error
+import urllib.request
 
 # ==============================================================================
 # CONFIGURAÇÃO DOS MICROSSERVIÇOS
 # ==============================================================================
 # Dicionário com os serviços a serem executados.
-# A ordem aqui é importante! Serviços dos quais outros dependem devem vir primeiro.
-# Ex: web_interface depende de database_service, então database_service vem antes.
+# Os serviços arrancam em paralelo; 'depends_on' indica os que têm de estar
+# prontos antes (ex: a web_interface só arranca com a base de dados e as câmaras prontas).
+# 'ready' é o campo do JSON do /health que tem de ser verdadeiro para o serviço
+# contar como pronto (ex: modelo YOLO carregado, base de dados migrada).
 services = {
     "Database Service": {
         "path": "database_service",
         "command": [sys.executable, "app.py"],
-        "port": 5004
+        "port": 5004,
+        "ready": "migrado",
+        "depends_on": []
     },
     "Camera Service": {
         "path": "camera_service",
         "command": [sys.executable, "app.py"],
-        "port": 5001
+        "port": 5001,
+        "depends_on": []
     },
     "Detection Service": {
         "path": "detection_service",
         "command": [sys.executable, "app.py"],
-        "port": 5002
+        "port": 5002,
+        "ready": "modelo_carregado",
+        "depends_on": []
     },
     "Notification Service": {
         "path": "notification_service",
         "command": [sys.executable, "app.py"],
-        "port": 5003
+        "port": 5003,
+        "depends_on": []
     },
     "Web Interface": {
         "path": "web_interface",
         "command": [sys.executable, "app.py"],
-        "port": 5000
+        "port": 5000,
+        "depends_on": ["Database Service", "Camera Service"]
     }
 }
 
 processes = {}
 
-def start_services():
-    """Inicia todos os serviços definidos no dicionário 'services'."""
-    print("="*50)
-    print("INICIANDO ARQUITETURA DE MICROSSERVIÇOS")
-    print("="*50)
-    
-    for name, config in services.items():
+# Serviços que podem correr com vários workers em modo produção. O camera_service
+# fica sempre num só processo (é o dono das threads de captura) e o
+# detection_service carrega uma cópia do modelo YOLO por worker.
+MULTI_WORKER_SERVICES = {"Detection Service", "Database Service", "Notification Service", "Web Interface"}
+
+# Os caminhos dos serviços são relativos à pasta deste script
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- Supervisor ---
+READY_TIMEOUT = float(os.getenv("SUPERVISOR_READY_TIMEOUT", 300))      # s à espera do /health
+RESTART_BASE_DELAY = float(os.getenv("SUPERVISOR_RESTART_BASE_DELAY", 1))
+RESTART_MAX_DELAY = float(os.getenv("SUPERVISOR_RESTART_MAX_DELAY", 60))
+STABLE_AFTER = float(os.getenv("SUPERVISOR_STABLE_AFTER", 60))          # s vivo para repor o backoff
+
+# Nós de deteção extra (--detection-nodes): portas 5012, 5013, ...; registam-se no
+# database_service e o camera_service distribui os frames por todos.
+DETECTION_NODE_BASE_PORT = int(os.getenv("DETECTION_NODE_BASE_PORT", 5012))
+
+def add_detection_nodes(n):
+    """Acrescenta a 'services' n-1 nós do detection_service em portas diferentes."""
+    base = services["Detection Service"]
+    for i in range(1, n):
+        port = DETECTION_NODE_BASE_PORT + i - 1
+        services[f"Detection Service {i + 1}"] = dict(base, command=base["command"] + ["--port", str(port)], port=port)
+
+def start_service(name, config, env=None, **popen_kwargs):
+    """
+    Inicia um único serviço e regista-o em 'processes'.
+    'env' permite sobrepor variáveis de ambiente (ex: URLs, base de dados temporária)
+    e popen_kwargs é passado ao Popen (ex: stdout) - usado pelos benchmarks.
+    """
+    process_env = dict(os.environ, **(env or {}))
+    # Popen inicia o processo em segundo plano
+
+    # --- CORREÇÃO AQUI ---
+    # Removemos 'stdout=subprocess.PIPE' e 'stderr=subprocess.PIPE'
+    # para permitir que o output apareça na NOVA consola.
+    process = subprocess.Popen(
+        config["command"],
+        cwd=os.path.join(BASE_DIR, config["path"]),
+        text=True,
+        env=process_env,
+        creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0,
+        **popen_kwargs
+    )
+    # --- FIM DA CORREÇÃO ---
+
+    processes[name] = process
+    return process
+
+def server_env(name, prod=False, workers=1, threads=None, keepalive=None):
+    """Variáveis SERVER_* (ver shared/serving.py) para lançar um serviço em modo produção."""
+    if not prod:
+        return {}
+    env = {"SERVER_MODE": "prod",
+           "SERVER_WORKERS": str(workers if name in MULTI_WORKER_SERVICES else 1)}
+    if threads:
+        env["SERVER_THREADS"] = str(threads)
+    if keepalive is not None:
+        env["SERVER_KEEPALIVE"] = str(keepalive)
+    return env
+
+def check_ready(config):
+    """Prova de prontidão: /health responde 200 e o campo 'ready' (se houver) é verdadeiro."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{config['port']}/health", timeout=1) as response:
+            if response.status != 200:
+                return False
+            return not config.get("ready") or bool(json.loads(response.read()).get(config["ready"]))
+    except (urllib.error.URLError, OSError, ValueError):
+        return False
+
+def wait_ready(name, config, timeout=READY_TIMEOUT):
+    """Espera até o serviço estar pronto. Devolve False se o processo morrer ou der timeout."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        process = processes.get(name)
+        if process is None or process.poll() is not None:
+            return False
+        if check_ready(config):
+            return True
+        time.sleep(0.2)
+    return False
+
+# ==============================================================================
+# SUPERVISOR
+# ==============================================================================
+
+class Supervisor:
+    """
+    Arranca os serviços em paralelo (respeitando 'depends_on'), espera pelo
+    /health de cada um, mede o tempo de arranque e reinicia os que terminarem
+    com backoff exponencial (RESTART_BASE_DELAY .. RESTART_MAX_DELAY).
+    """
+    def __init__(self, services, env_for=None):
+        self.services = services
+        self.env_for = env_for or (lambda name: {})
+        self.ready = {name: threading.Event() for name in services}
+        self._arranque_terminado = {name: threading.Event() for name in services}   # pronto ou falhou
+        self.startup_seconds = {}
+        self.restarts = {name: 0 for name in services}
+        self._falhas = {name: 0 for name in services}
+        self._iniciado_em = {}
+        self._restart_em = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def _launch(self, name):
+        config = self.services[name]
+        inicio = time.time()
         try:
-            print(f"\n---> Iniciando: {name}...")
-            # Popen inicia o processo em segundo plano
-            
-            # --- CORREÇÃO AQUI ---
-            # Removemos 'stdout=subprocess.PIPE' e 'stderr=subprocess.PIPE'
-            # para permitir que o output apareça na NOVA consola.
-            process = subprocess.Popen(
-                config["command"],
-                cwd=config["path"],
-                text=True,
-                creationflags=subprocess.CREATE_NEW_CONSOLE if os.name == 'nt' else 0
-            )
-            # --- FIM DA CORREÇÃO ---
-
-            processes[name] = process
-            print(f"[OK] {name} iniciado com PID: {process.pid}")
-            
-            # PAUSA ESTRATÉGICA: Dá ao serviço um momento para inicializar
-            print("     Aguardando 2 segundos para estabilização...")
-            time.sleep(2)
-
-        except FileNotFoundError:
-            print(f"[ERRO] O diretório '{config['path']}' ou o comando '{config['command'][1]}' não foi encontrado para o serviço {name}.")
-        except Exception as e:
+            start_service(name, config, env=self.env_for(name))
+        except (FileNotFoundError, OSError) as e:
             print(f"[ERRO] Falha ao iniciar {name}: {e}")
+            self._arranque_terminado[name].set()
+            return
+        self._iniciado_em[name] = inicio
+        print(f"[OK] {name} iniciado com PID: {processes[name].pid}")
+        if wait_ready(name, config):
+            self.startup_seconds[name] = time.time() - inicio
+            self.ready[name].set()
+            print(f"[PRONTO] {name} em {self.startup_seconds[name]:.1f}s")
+        elif processes[name].poll() is None:
+            print(f"[AVISO] {name} não ficou pronto em {READY_TIMEOUT:.0f}s.")
+        self._arranque_terminado[name].set()
+
+    def _start_when_deps_ready(self, name):
+        for dep in self.services[name].get("depends_on", []):
+            self._arranque_terminado[dep].wait(READY_TIMEOUT)
+            if not self.ready[dep].is_set():
+                print(f"[AVISO] {dep} não está pronto; a iniciar {name} mesmo assim.")
+        if not self._stopping:
+            self._launch(name)
+
+    def start_all(self):
+        """Arranca todos os serviços e bloqueia até estarem prontos (ou falharem). Devolve o tempo total."""
+        inicio = time.time()
+        threads = [threading.Thread(target=self._start_when_deps_ready, args=(name,), daemon=True)
+                   for name in self.services]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.time() - inicio
+
+    def check_processes(self):
+        """Reinicia os serviços que terminaram (chamado periodicamente)."""
+        agora = time.time()
+        for name in self.services:
+            process = processes.get(name)
+            if self._stopping or process is None or process.poll() is None:
+                continue
+            with self._lock:
+                if name not in self._restart_em:
+                    # Um serviço que esteve vivo tempo suficiente volta ao backoff mínimo
+                    if agora - self._iniciado_em.get(name, agora) >= STABLE_AFTER:
+                        self._falhas[name] = 0
+                    delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * 2 ** min(self._falhas[name], 16))
+                    self._falhas[name] += 1
+                    self._restart_em[name] = agora + delay
+                    self.ready[name].clear()
+                    print(f"[AVISO] {name} terminou (código {process.returncode}). A reiniciar em {delay:.0f}s...")
+                elif agora >= self._restart_em[name]:
+                    del self._restart_em[name]
+                    self.restarts[name] += 1
+                    threading.Thread(target=self._launch, args=(name,), daemon=True).start()
+
+    def stop(self):
+        self._stopping = True
+        stop_services()
+
+def start_services(prod=False, workers=1, detection_workers=1, threads=None, keepalive=None, detection_nodes=1):
+    """Inicia todos os serviços definidos no dicionário 'services'. Devolve o Supervisor."""
+    add_detection_nodes(detection_nodes)
+    print("="*50)
+    print("INICIANDO ARQUITETURA DE MICROSSERVIÇOS" + (" (MODO PRODUÇÃO)" if prod else ""))
+    print("="*50)
+
+    def env_for(name):
+        if name.startswith("Detection Service"):
+            return server_env("Detection Service", prod, detection_workers, threads, keepalive)
+        return server_env(name, prod, workers, threads, keepalive)
+
+    supervisor = Supervisor(services, env_for)
+    total = supervisor.start_all()
+
+    print("\n" + "="*50)
+    print("TEMPOS DE ARRANQUE (até o /health estar pronto)")
+    for name in services:
+        segundos = supervisor.startup_seconds.get(name)
+        print(f"  {name:<24} {f'{segundos:.1f}s' if segundos is not None else 'NÃO PRONTO'}")
+    print(f"  {'Total (arranque a frio)':<24} {total:.1f}s")
+    return supervisor
 
 def stop_services():
     """Para todos os processos iniciados."""
@@ -93,17 +267,32 @@ def stop_services():
     print("\nTodos os serviços foram encerrados.")
 
 if __name__ == "__main__":
-    start_services()
+    parser = argparse.ArgumentParser(description="Inicia todos os microsserviços")
+    parser.add_argument('--prod', action='store_true',
+                        help="Servidor WSGI de produção (gunicorn/waitress) em vez do servidor de desenvolvimento")
+    parser.add_argument('--workers', type=int, default=1, help="Processos por serviço (modo produção)")
+    parser.add_argument('--detection-workers', type=int, default=1,
+                        help="Processos do detection_service (cada um carrega o modelo)")
+    parser.add_argument('--detection-nodes', type=int, default=1,
+                        help="Nós do detection_service (portas 5002, 5012, 5013, ...), com balanceamento no camera_service")
+    parser.add_argument('--threads', type=int, help="Threads por processo (modo produção)")
+    parser.add_argument('--keepalive', type=float, help="Segundos de keep-alive das ligações (modo produção)")
+    args = parser.parse_args()
+
+    supervisor = start_services(args.prod, args.workers, args.detection_workers, args.threads, args.keepalive,
+                               args.detection_nodes)
     try:
         # Mantém o script principal rodando para poder interceptar o Ctrl+C
+        # e vigiar os serviços (reinício automático com backoff)
         print("\n" + "="*50)
         print("Todos os serviços foram iniciados em seus próprios consoles.")
         print("Pressione Ctrl+C nesta janela para encerrar todos os serviços de forma limpa.")
         print("="*50)
         while True:
+            supervisor.check_processes()
             time.sleep(1)
     except KeyboardInterrupt:
         # Quando Ctrl+C é pressionado, o bloco try é interrompido e o finally é executado
         pass
     finally:
-        stop_services()
\ No newline at end of file
+        supervisor.stop()
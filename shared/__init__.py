@@ -0,0 +1 @@
+# shared/__init__.py
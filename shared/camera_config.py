@@ -0,0 +1,53 @@
+# shared/camera_config.py - Validação da configuração de uma câmara
+#
+# Usado pelo database_service (POST/PATCH /cameras) e pelo camera_service
+# (POST /cameras) para recusar com 400 valores que, de outra forma, só falhariam
+# na thread de captura (ex: fps "abc", 0 ou negativo) ou dariam intervalos de
+# deteção negativos/invertidos no AdaptiveDetectionScheduler.
+
+import math
+
+# campo -> (tipo, mínimo, máximo), limites inclusivos
+LIMITES_CAMERA = {
+    'fps': (float, 0.1, 120.0),
+    'decode_threads': (int, 1, 64),
+    # Limites do ritmo de deteção adaptativo (segundos entre envios)
+    'detecao_min_intervalo': (float, 0.05, 3600.0),
+    'detecao_max_intervalo': (float, 0.05, 3600.0),
+}
+
+
+def validar_config_camera(dados, atual=None):
+    """
+    Verifica os campos de afinação presentes em 'dados' (None = valor por
+    omissão do serviço). 'atual' é a configuração guardada (PATCH), usada para
+    garantir detecao_min_intervalo <= detecao_max_intervalo quando só um muda.
+    Devolve (valores convertidos, None) ou (None, erro).
+    """
+    valores = {}
+    for campo, (tipo, minimo, maximo) in LIMITES_CAMERA.items():
+        valor = dados.get(campo)
+        if valor is None:
+            continue
+        if isinstance(valor, bool):
+            return None, f"{campo} tem de ser numérico"
+        try:
+            numero = float(valor)
+        except (TypeError, ValueError):
+            return None, f"{campo} tem de ser numérico"
+        if not math.isfinite(numero) or (tipo is int and not numero.is_integer()):
+            return None, f"{campo} tem de ser {'inteiro' if tipo is int else 'numérico'}"
+        if not minimo <= numero <= maximo:
+            return None, f"{campo} tem de estar entre {minimo:g} e {maximo:g}"
+        valores[campo] = tipo(numero)
+
+    atual = atual or {}
+    limites = [valores[c] if c in valores else (None if c in dados else atual.get(c))
+               for c in ('detecao_min_intervalo', 'detecao_max_intervalo')]
+    if None not in limites and limites[0] > limites[1]:
+        return None, "detecao_min_intervalo tem de ser menor ou igual a detecao_max_intervalo"
+
+    opcoes = dados.get('ffmpeg_options')
+    if opcoes is not None and not isinstance(opcoes, str):
+        return None, "ffmpeg_options tem de ser texto"
+    return valores, None
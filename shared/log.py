@@ -0,0 +1,173 @@
+# shared/log.py - Logging estruturado e não bloqueante partilhado pelos serviços
+#
+# Substitui os print() dos caminhos quentes (loop de captura, /detect, /events):
+#   - níveis (LOG_LEVEL=DEBUG|INFO|WARNING|ERROR, INFO por omissão)
+#   - saída em texto ou JSON por linha (LOG_FORMAT=text|json)
+#   - QueueHandler: as threads de pedido/captura só colocam o registo numa fila;
+#     a escrita no stdout (consola lenta ou pipe) é feita por uma thread própria.
+#     Se a fila encher, os registos são descartados em vez de bloquear.
+#   - limite de mensagens repetidas (ex: reconexões em loop): no máximo
+#     LOG_RATE_BURST mensagens iguais por LOG_RATE_WINDOW segundos.
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+_configurado = False
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registo."""
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'servico': self.service,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'suprimidas', 0):
+            dados['suprimidas'] = record.suprimidas
+        if record.exc_info:
+            dados['exc'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, service):
+        super().__init__(f"%(asctime)s %(levelname)-7s [{service}] %(name)s: %(message)s")
+
+    def format(self, record):
+        texto = super().format(record)
+        if getattr(record, 'suprimidas', 0):
+            texto += f" (+{record.suprimidas} mensagens iguais suprimidas)"
+        return texto
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Deixa passar no máximo `burst` registos com a mesma (logger, nível, mensagem
+    formatada) por janela de `window` segundos. O primeiro registo da janela
+    seguinte indica quantos foram suprimidos. Mensagens diferentes do mesmo
+    template (ex: câmaras diferentes) contam em separado. ERROR e acima passam
+    sempre, sem limite.
+    """
+    def __init__(self, burst=5, window=10.0, max_chaves=4096):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.max_chaves = max_chaves
+        self._estado = {}   # chave -> [início da janela, contagem, suprimidas]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        try:
+            mensagem = record.getMessage()
+        except Exception:
+            mensagem = (record.msg, repr(record.args))
+        chave = (record.name, record.levelno, mensagem)
+        agora = time.monotonic()
+        with self._lock:
+            estado = self._estado.get(chave)
+            if estado is None or agora - estado[0] >= self.window:
+                suprimidas = estado[2] if estado else 0
+                if estado is None and len(self._estado) >= self.max_chaves:
+                    # Esquece as janelas já terminadas (mensagens que não se repetem)
+                    self._estado = {c: e for c, e in self._estado.items() if agora - e[0] < self.window}
+                self._estado[chave] = [agora, 1, 0]
+                if suprimidas:
+                    record.suprimidas = suprimidas
+                return True
+            if estado[1] < self.burst:
+                estado[1] += 1
+                return True
+            estado[2] += 1
+            return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) registos quando a fila está cheia."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.descartados = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+def configure_logging(service, level=None, fmt=None, stream=None, max_queue=10000):
+    """
+    Configura o logging do processo (uma vez). Devolve o handler da fila.
+    As variáveis de ambiente LOG_LEVEL, LOG_FORMAT, LOG_RATE_BURST e
+    LOG_RATE_WINDOW sobrepõem os valores por omissão.
+    """
+    global _configurado, _listener
+    raiz = logging.getLogger()
+    if _configurado:
+        return next((h for h in raiz.handlers if isinstance(h, DroppingQueueHandler)), None)
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    fmt = fmt or os.getenv("LOG_FORMAT", "text")
+
+    saida = logging.StreamHandler(stream or sys.stdout)
+    saida.setFormatter(JsonFormatter(service) if fmt == 'json' else TextFormatter(service))
+
+    fila = queue.Queue(maxsize=max_queue)
+    handler = DroppingQueueHandler(fila)
+    handler.addFilter(RateLimitFilter(
+        burst=int(os.getenv("LOG_RATE_BURST", 5)),
+        window=float(os.getenv("LOG_RATE_WINDOW", 10)),
+    ))
+
+    raiz.handlers[:] = [handler]
+    raiz.setLevel(level.upper() if isinstance(level, str) else level)
+    # O log de acesso do Werkzeug (uma linha por pedido) fica em WARNING
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+    _configurado = True
+    return handler
+
+
+def _reiniciar_no_filho():
+    """
+    Depois de um fork (ex: workers gunicorn) a thread do listener não existe no
+    processo filho: cria uma fila e um listener novos com os mesmos handlers.
+    """
+    global _listener
+    if _listener is None:
+        return
+    handler = next((h for h in logging.getLogger().handlers if isinstance(h, DroppingQueueHandler)), None)
+    if handler is None:
+        return
+    handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+    _listener = logging.handlers.QueueListener(handler.queue, *_listener.handlers, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+def get_logger(name):
+    return logging.getLogger(name)
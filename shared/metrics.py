@@ -0,0 +1,232 @@
+# shared/metrics.py - Métricas no formato Prometheus partilhadas por todos os serviços
+#
+# Implementação mínima (sem dependências) de contadores, gauges e histogramas
+# com labels, pensada para ficar ligada em produção: cada observação é um
+# dict lookup + bisect + soma dentro de um cadeado por métrica.
+
+import bisect
+import functools
+import threading
+import time
+
+from flask import Response, g, request
+
+# Limites (em segundos) por omissão dos histogramas de latência
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatar_labels(labelnames, values, extra=None):
+    pares = list(zip(labelnames, values))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ''
+    texto = ','.join(f'{k}="{_escapar(v)}"' for k, v in pares)
+    return '{' + texto + '}'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _Metric:
+    tipo = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperadas {self.labelnames}, recebidas {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def render(self):
+        linhas = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.tipo}"]
+        with self._lock:
+            itens = list(self._values.items())
+        for key, value in itens:
+            linhas.extend(self._render_sample(key, value))
+        return linhas
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_formatar_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    tipo = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    tipo = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    tipo = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            estado = self._values.get(key)
+            if estado is None:
+                # [contagens por bucket (+Inf no fim), soma, total]
+                estado = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            estado[0][idx] += 1
+            estado[1] += value
+            estado[2] += 1
+
+    def time(self, **labels):
+        """Context manager que observa a duração do bloco em segundos."""
+        return _Timer(self, labels)
+
+    def _render_sample(self, key, estado):
+        contagens, soma, total = estado
+        linhas, acumulado = [], 0
+        for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+            acumulado += contagem
+            le = '+Inf' if limite == float('inf') else repr(limite)
+            linhas.append(f"{self.name}_bucket{_formatar_labels(self.labelnames, key, ('le', le))} {acumulado}")
+        linhas.append(f"{self.name}_sum{_formatar_labels(self.labelnames, key)} {soma}")
+        linhas.append(f"{self.name}_count{_formatar_labels(self.labelnames, key)} {total}")
+        return linhas
+
+
+class GaugeFunction(_Metric):
+    """Gauge calculado só no momento do scrape (ex: tamanho de uma fila)."""
+    tipo = 'gauge'
+
+    def __init__(self, name, documentation, func):
+        super().__init__(name, documentation)
+        self.func = func
+
+    def render(self):
+        try:
+            valor = self.func()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {valor}"]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'inicio')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.inicio, **self.labels)
+        return False
+
+
+class Registry:
+    """Conjunto de métricas de um processo. get-or-create por nome."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def gauge_function(self, name, documentation, func):
+        with self._lock:
+            self._metrics[name] = GaugeFunction(name, documentation, func)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        linhas = []
+        for metric in metrics:
+            linhas.extend(metric.render())
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def timed(histogram, **labels):
+    """Decorador que regista a duração de cada chamada no histograma."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - inicio, **labels)
+        return wrapper
+    return decorator
+
+
+def install_metrics_endpoint(app, registry=REGISTRY, track_requests=True):
+    """
+    Acrescenta GET /metrics (formato de texto do Prometheus) a uma app Flask e,
+    opcionalmente, regista a duração de cada pedido HTTP por endpoint.
+    """
+    if track_requests:
+        pedidos = registry.histogram('http_request_seconds', 'Duração dos pedidos HTTP', ('endpoint', 'status'))
+
+        @app.before_request
+        def _inicio_pedido():
+            g._metrics_inicio = time.perf_counter()
+
+        @app.after_request
+        def _fim_pedido(response):
+            inicio = g.pop('_metrics_inicio', None)
+            if inicio is not None and request.endpoint != 'metrics':
+                pedidos.observe(time.perf_counter() - inicio, endpoint=request.endpoint or 'desconhecido',
+                                status=response.status_code)
+            return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+    return app
@@ -0,0 +1,89 @@
+# shared/responses.py - Respostas JSON rápidas e compressão negociada
+#
+# - json_response(): serializa com orjson se estiver instalado (várias vezes mais
+#   rápido que o json da biblioteca padrão usado pelo jsonify), senão com json.
+# - install_compression(): comprime respostas grandes com br (se o módulo brotli
+#   existir) ou gzip, conforme o Accept-Encoding do cliente.
+
+import gzip
+import json
+import os
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+def dumps(obj):
+    """Serializa para bytes JSON (orjson, ou json sem espaços como alternativa)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def json_response(obj, status=200):
+    """Substituto do jsonify para dados já convertidos em tipos JSON (ver RowSerializer)."""
+    return Response(dumps(obj), status=status, mimetype=JSON_MIMETYPE)
+
+
+def _escolher_codificacao(accept_encoding):
+    """'br' ou 'gzip' (por esta ordem de preferência) se o cliente os aceitar."""
+    aceites = {}
+    for parte in accept_encoding.split(','):
+        nome, _, params = parte.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        aceites[nome.strip().lower()] = q
+    if brotli is not None and aceites.get('br', 0) > 0:
+        return 'br'
+    if aceites.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def install_compression(app, min_size=None, gzip_level=None, br_quality=None):
+    """
+    Comprime as respostas de texto/JSON com pelo menos min_size bytes.
+    Níveis baixos por omissão: a maior parte do ganho com pouco CPU.
+    """
+    min_size = min_size if min_size is not None else int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+    gzip_level = gzip_level if gzip_level is not None else int(os.getenv("COMPRESSION_GZIP_LEVEL", 5))
+    br_quality = br_quality if br_quality is not None else int(os.getenv("COMPRESSION_BR_QUALITY", 4))
+
+    @app.after_request
+    def _comprimir(response):
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        response.vary.add('Accept-Encoding')
+        codificacao = _escolher_codificacao(request.headers.get('Accept-Encoding', ''))
+        if codificacao is None:
+            return response
+        dados = response.get_data()
+        if len(dados) < min_size:
+            return response
+        if codificacao == 'br':
+            dados = brotli.compress(dados, quality=br_quality)
+        else:
+            dados = gzip.compress(dados, compresslevel=gzip_level, mtime=0)
+        response.set_data(dados)
+        response.headers['Content-Encoding'] = codificacao
+        return response
+
+    return app
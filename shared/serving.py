@@ -0,0 +1,110 @@
+# shared/serving.py - Arranque dos serviços em modo de desenvolvimento ou produção
+#
+# SERVER_MODE=dev (por omissão): servidor de desenvolvimento do Werkzeug, como antes.
+# SERVER_MODE=prod: servidor WSGI de produção, sem debugger:
+#   - gunicorn (Linux/macOS) quando há mais de um worker: cada worker importa o
+#     app.py de raiz (app_uri), por isso o detection_service carrega o modelo em
+#     cada worker e cada worker tem as suas threads, filas e métricas.
+#   - waitress (qualquer SO, incluindo Windows) com um só processo e N threads.
+#   - se nenhum estiver instalado, Werkzeug com threads e sem debugger (com aviso).
+#
+# Variáveis de ambiente (modo prod):
+#   SERVER_WORKERS    processos (por omissão 1; o camera_service força sempre 1)
+#   SERVER_THREADS    threads por processo (por omissão 8; 32 nos serviços com streams)
+#   SERVER_KEEPALIVE  segundos que uma ligação keep-alive inativa fica aberta (por omissão 5)
+#   SERVER_TIMEOUT    timeout de um pedido/worker no gunicorn (por omissão 120)
+
+import logging
+import os
+
+from shared.startup import startup
+
+logger = logging.getLogger('shared.serving')
+
+try:
+    import gunicorn.app.base as gunicorn_base
+except ImportError:     # Windows ou gunicorn não instalado
+    gunicorn_base = None
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+
+def server_config(single_process=False, threads=8):
+    """Configuração do servidor a partir das variáveis de ambiente."""
+    workers = max(1, int(os.getenv("SERVER_WORKERS", 1)))
+    if single_process and workers > 1:
+        logger.warning("SERVER_WORKERS=%s ignorado: este serviço tem de correr num só processo.", workers)
+        workers = 1
+    return {
+        'mode': os.getenv("SERVER_MODE", "dev").lower(),
+        'workers': workers,
+        'threads': max(1, int(os.getenv("SERVER_THREADS", threads))),
+        'keepalive': float(os.getenv("SERVER_KEEPALIVE", 5)),
+        'timeout': int(os.getenv("SERVER_TIMEOUT", 120)),
+    }
+
+
+def uses_worker_processes(app_uri=None, single_process=False):
+    """True se serve() vai lançar workers gunicorn (o processo atual só os gere)."""
+    config = server_config(single_process)
+    return config['mode'] == 'prod' and config['workers'] > 1 and bool(app_uri) and gunicorn_base is not None
+
+
+if gunicorn_base:
+    class _GunicornApp(gunicorn_base.BaseApplication):
+        """Gunicorn embebido: importa app_uri em cada worker (preload desligado)."""
+        def __init__(self, app_uri, options):
+            self.app_uri = app_uri
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for chave, valor in self.options.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            from gunicorn.util import import_app
+            return import_app(self.app_uri)
+
+
+def serve(app, host, port, app_uri=None, single_process=False, threads=8, **dev_kwargs):
+    """
+    Serve a aplicação Flask. Em modo dev chama app.run(**dev_kwargs); em modo
+    prod escolhe o servidor de produção disponível. app_uri ("app:app") permite
+    vários workers gunicorn; serviços com estado de processo (ex: as threads de
+    captura do camera_service) usam single_process=True. 'threads' é o valor
+    por omissão de SERVER_THREADS (cada stream MJPEG aberto ocupa uma thread).
+    """
+    config = server_config(single_process, threads)
+    startup.log_report("pronto a servir")
+    startup.remove_import_hook()   # os imports feitos em pedidos já não contam para o arranque
+    if config['mode'] != 'prod':
+        app.run(host=host, port=port, **dev_kwargs)
+        return
+
+    if config['workers'] > 1 and app_uri and gunicorn_base:
+        logger.info("SERVER: gunicorn em %s:%s (%d workers x %d threads, keep-alive %ss)",
+                    host, port, config['workers'], config['threads'], config['keepalive'])
+        _GunicornApp(app_uri, {
+            'bind': f"{host}:{port}",
+            'workers': config['workers'],
+            'threads': config['threads'],
+            'worker_class': 'gthread',
+            'keepalive': int(config['keepalive']),
+            'timeout': config['timeout'],
+            'preload_app': False,
+            'accesslog': None,
+        }).run()
+    elif waitress:
+        if config['workers'] > 1:
+            logger.warning("SERVER: gunicorn indisponível; a usar waitress num só processo.")
+        logger.info("SERVER: waitress em %s:%s (%d threads, keep-alive %ss)",
+                    host, port, config['threads'], config['keepalive'])
+        waitress.serve(app, host=host, port=port, threads=config['threads'],
+                       channel_timeout=config['keepalive'], ident=None)
+    else:
+        logger.warning("SERVER: nem gunicorn nem waitress instalados; a usar o Werkzeug sem debugger.")
+        app.run(host=host, port=port, debug=False, use_reloader=False, threaded=True)
@@ -0,0 +1,96 @@
+# shared/startup.py - Perfil do arranque dos serviços
+#
+# Com STARTUP_PROFILE=1 regista, desde o import deste módulo:
+#   - o tempo de cada import de topo (tempo cumulativo, à la `python -X importtime`),
+#   - as etapas marcadas pelo serviço (ex: imports, carregar modelo, aquecimento),
+# e escreve o relatório no log quando o serviço começa a servir (ver shared/serving.py).
+# Deve ser importado antes das bibliotecas pesadas para os imports contarem.
+
+import builtins
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger('shared.startup')
+
+PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+
+class StartupProfile:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = {}        # nome -> segundos
+        self.imports = {}       # módulo de topo -> segundos (cumulativo)
+        self._profundidade = threading.local()
+        self._import_original = None
+
+    # --- Imports ---
+
+    def install_import_hook(self):
+        """Mede o primeiro import de cada pacote feito diretamente pelo serviço."""
+        if self._import_original:
+            return
+        self._import_original = original = builtins.__import__
+        perfil = self
+
+        def import_medido(name, globals=None, locals=None, fromlist=(), level=0):
+            topo = name.partition('.')[0]
+            if level or topo in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            profundidade = getattr(perfil._profundidade, 'valor', 0)
+            perfil._profundidade.valor = profundidade + 1
+            inicio = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                perfil._profundidade.valor = profundidade
+                if profundidade == 0:
+                    perfil.imports[topo] = perfil.imports.get(topo, 0) + time.perf_counter() - inicio
+
+        builtins.__import__ = import_medido
+
+    def remove_import_hook(self):
+        if self._import_original:
+            builtins.__import__ = self._import_original
+            self._import_original = None
+
+    # --- Etapas ---
+
+    @contextlib.contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[nome] = time.perf_counter() - inicio
+
+    def marcar(self, nome):
+        """Regista uma etapa que começou no arranque e acaba agora (ex: 'imports')."""
+        self.etapas[nome] = time.perf_counter() - self.inicio
+
+    def report(self, top=10):
+        imports = sorted(self.imports.items(), key=lambda i: i[1], reverse=True)[:top]
+        return {
+            'desde_o_inicio_s': round(time.perf_counter() - self.inicio, 3),
+            'etapas_s': {nome: round(s, 3) for nome, s in self.etapas.items()},
+            'imports_s': {nome: round(s, 3) for nome, s in imports},
+        }
+
+    def log_report(self, titulo):
+        if not PROFILE:
+            return
+        relatorio = self.report()
+        logger.info("STARTUP %s: %.2fs desde o início; etapas: %s", titulo,
+                    relatorio['desde_o_inicio_s'],
+                    ", ".join(f"{n}={s:.2f}s" for n, s in relatorio['etapas_s'].items()) or "-")
+        if relatorio['imports_s']:
+            logger.info("STARTUP imports mais lentos: %s",
+                        ", ".join(f"{n}={s:.2f}s" for n, s in relatorio['imports_s'].items()))
+
+
+startup = StartupProfile()
+if PROFILE:
+    startup.install_import_hook()
@@ -3,20 +3,42 @@
 import os
 import requests
 import sys
+import threading
+import time
 from flask import Flask, render_template, request, jsonify, Response, url_for
 from datetime import datetime
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.metrics import REGISTRY, install_metrics_endpoint
+from shared.log import configure_logging, get_logger
+from shared.serving import serve
+
+configure_logging('web_interface')
+logger = get_logger('web_interface')
 
 # ==============================================================================
 # CONFIGURAÇÕES DO SERVIÇO
 # ==============================================================================
 app = Flask(__name__)
+install_metrics_endpoint(app)
+
+# --- Métricas (expostas em /metrics) ---
+METRICA_VIEWERS = REGISTRY.gauge('web_stream_viewers', 'Streams de vídeo abertos através do proxy', ('camera',))
+METRICA_SNAPSHOTS = REGISTRY.counter('web_snapshot_requests_total', 'Pedidos de snapshot por origem da resposta', ('resultado',))
 
 # URLs dos outros serviços
 CAMERA_SERVICE_URL = os.getenv("CAMERA_SERVICE_URL", "http://127.0.0.1:5001")
 DATABASE_SERVICE_URL = os.getenv("DATABASE_SERVICE_URL", "http://127.0.0.1:5004")
 
+# Grelha de câmaras: snapshots por omissão, streams só nos quadros visíveis/focados
+SNAPSHOT_CACHE_TTL = float(os.getenv("WEB_SNAPSHOT_CACHE_TTL", 1.0))      # s sem perguntar ao camera_service
+SNAPSHOT_REFRESH_MS = int(os.getenv("WEB_SNAPSHOT_REFRESH_MS", 2000))      # atualização dos quadros visíveis
+MAX_LIVE_STREAMS = int(os.getenv("WEB_MAX_LIVE_STREAMS", 4))               # streams ao vivo por página
+# Deteção ao vivo: contadores lidos do estado em memória do camera_service e,
+# com WEB_STREAM_OVERLAY=1, streams com as caixas desenhadas pelo camera_service
+DETECTION_STATE_REFRESH_MS = int(os.getenv("WEB_DETECTION_STATE_REFRESH_MS", 1000))
+STREAM_OVERLAY = os.getenv("WEB_STREAM_OVERLAY", "0") == "1"
+
 # ==============================================================================
 # FUNÇÕES AUXILIARES
 # ==============================================================================
@@ -27,7 +49,7 @@ def obter_cameras_db():
         response = requests.get(f"{DATABASE_SERVICE_URL}/cameras", timeout=5)
         return response.json() if response.status_code == 200 else []
     except Exception as e:
-        print(f"Erro ao obter câmeras do banco: {e}")
+        logger.warning("Erro ao obter câmeras do banco: %s", e)
         return []
 
 def obter_cameras_ativas():
@@ -36,7 +58,7 @@ def obter_cameras_ativas():
         response = requests.get(f"{CAMERA_SERVICE_URL}/cameras/active", timeout=5)
         return response.json() if response.status_code == 200 else {'cameras': []}
     except Exception as e:
-        print(f"Erro ao obter câmeras ativas: {e}")
+        logger.warning("Erro ao obter câmeras ativas: %s", e)
         return {'cameras': []}
 
 # ==============================================================================
@@ -48,6 +70,10 @@ def inject_now():
     """Disponibiliza a função now() para os templates."""
     return {'now': datetime.utcnow}
 
+@app.route('/health')
+def health():
+    return jsonify({'status': 'ok', 'service': 'web_interface'})
+
 @app.route('/')
 def index():
     """Redireciona para a página de câmeras."""
@@ -62,7 +88,11 @@ def cameras():
     return render_template('cameras.html',
                            cameras_db=cameras_db,
                            cameras_ativas=cameras_ativas,
-                           camera_service_url=CAMERA_SERVICE_URL)
+                           camera_service_url=CAMERA_SERVICE_URL,
+                           snapshot_refresh_ms=SNAPSHOT_REFRESH_MS,
+                           max_live_streams=MAX_LIVE_STREAMS,
+                           detection_state_refresh_ms=DETECTION_STATE_REFRESH_MS,
+                           stream_overlay=STREAM_OVERLAY)
 
 # ==============================================================================
 # APIs DA INTERFACE WEB (Ponte para os outros microsserviços)
@@ -72,7 +102,7 @@ def cameras():
 def adicionar_camera():
     try:
         data = request.get_json() # <-- O 'data' que vem do JavaScript
-        print(f"API: Recebido pedido para adicionar câmera: {data.get('nome')}")
+        logger.info("API: Recebido pedido para adicionar câmera: %s", data.get('nome'))
 
         # O JavaScript agora envia 'receiver_email',
         # e o database_service (Porta 5004) recebe 'receiver_email'.
@@ -82,23 +112,23 @@ def adicionar_camera():
 
         return jsonify(response.json()), response.status_code
     except Exception as e:
-        print(f"API ERRO: Falha ao adicionar câmera - {e}")
+        logger.error("API: Falha ao adicionar câmera - %s", e)
         return jsonify({'erro': str(e)}), 500
 
 @app.route('/api/cameras/<camera_id>', methods=['DELETE'])
 def remover_camera(camera_id):
     """Remove uma câmera do sistema"""
     try:
-        print(f"[DELETE] Recebido pedido para remover câmera: {camera_id}")
+        logger.info("[DELETE] Recebido pedido para remover câmera: %s", camera_id)
 
         # 1. Tenta parar no Camera Service, mas não trava se demorar.
         # Usamos um timeout bem curto (ex: 2 segundos).
         try:
             requests.post(f"{CAMERA_SERVICE_URL}/cameras/{camera_id}/stop", timeout=2)
-            print(f"[DELETE] Comando para parar a câmera {camera_id} enviado.")
+            logger.info("[DELETE] Comando para parar a câmera %s enviado.", camera_id)
         except requests.exceptions.RequestException as e:
             # Se o camera_service estiver offline ou demorar, apenas registramos e continuamos.
-            print(f"[DELETE] Aviso: Não foi possível contatar o Camera Service para parar a câmera: {e}")
+            logger.warning("[DELETE] Não foi possível contatar o Camera Service para parar a câmera: %s", e)
 
         # 2. Remove do banco de dados (a parte mais importante).
         db_response = requests.delete(f"{DATABASE_SERVICE_URL}/cameras/{camera_id}", timeout=10)
@@ -116,14 +146,14 @@ def remover_camera(camera_id):
                 return jsonify({'erro': 'Erro desconhecido no Database Service'}), db_response.status_code
 
     except Exception as e:
-        print(f"[DELETE] Erro interno inesperado: {str(e)}")
+        logger.error("[DELETE] Erro interno inesperado: %s", e)
         return jsonify({'erro': f'Erro interno no servidor: {str(e)}'}), 500
 
 @app.route('/api/cameras/<camera_id>/start', methods=['POST'])
 def iniciar_camera(camera_id):
     """Busca os detalhes da câmera no banco e manda o camera_service iniciar."""
     try:
-        print(f"API: Recebido pedido para iniciar câmera: {camera_id}")
+        logger.info("API: Recebido pedido para iniciar câmera: %s", camera_id)
         # 1. Pega os detalhes da câmera no banco
         db_response = requests.get(f"{DATABASE_SERVICE_URL}/cameras", timeout=5)
         if db_response.status_code != 200:
@@ -139,22 +169,28 @@ def iniciar_camera(camera_id):
             'nome': camera_config['nome'],
             'url': camera_config['url']
         }
+        # Afinação opcional da captura (FPS, threads de descodificação, opções FFmpeg)
+        # limites do ritmo de deteção adaptativo e prioridade na deteção
+        for chave in ('fps', 'decode_threads', 'ffmpeg_options', 'detecao_min_intervalo', 'detecao_max_intervalo',
+                      'prioridade'):
+            if camera_config.get(chave) is not None:
+                cam_service_data[chave] = camera_config[chave]
         
         response = requests.post(f"{CAMERA_SERVICE_URL}/cameras", json=cam_service_data, timeout=25)
         return jsonify(response.json()), response.status_code
     except Exception as e:
-        print(f"API ERRO: Falha ao iniciar câmera - {e}")
+        logger.error("API: Falha ao iniciar câmera - %s", e)
         return jsonify({'erro': str(e)}), 500
 
 @app.route('/api/cameras/<camera_id>/stop', methods=['POST'])
 def parar_camera(camera_id):
     """Repassa o comando de parar para o camera_service."""
     try:
-        print(f"API: Recebido pedido para parar câmera: {camera_id}")
+        logger.info("API: Recebido pedido para parar câmera: %s", camera_id)
         response = requests.post(f"{CAMERA_SERVICE_URL}/cameras/{camera_id}/stop", timeout=10)
         return jsonify(response.json()), response.status_code
     except Exception as e:
-        print(f"API ERRO: Falha ao parar câmera - {e}")
+        logger.error("API: Falha ao parar câmera - %s", e)
         return jsonify({'erro': str(e)}), 500
     
 @app.route('/api/events/latest')
@@ -176,13 +212,86 @@ def obter_eventos_recentes():
         if response.status_code == 200:
             return jsonify(response.json())
         else:
-            print(f"API ERRO: Falha ao buscar eventos do DB. Status: {response.status_code}")
+            logger.warning("API: Falha ao buscar eventos do DB. Status: %s", response.status_code)
             return jsonify({'erro': 'Falha ao buscar eventos do banco'}), response.status_code
             
     except Exception as e:
-        print(f"API ERRO: Falha ao conectar com database_service: {e}")
+        logger.error("API: Falha ao conectar com database_service: %s", e)
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/api/detection/state')
+def obter_estado_detecao():
+    """
+    Proxy para o estado de deteção ao vivo do camera_service (pessoas e caixas
+    por câmara, só em memória). Ao contrário dos eventos, não tem cooldown.
+    """
+    try:
+        response = requests.get(f"{CAMERA_SERVICE_URL}/detection/state", timeout=3)
+        return jsonify(response.json()), response.status_code
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 503
+
+# ==============================================================================
+# PROXY PARA OS SNAPSHOTS (COM CACHE CURTA)
+# ==============================================================================
+
+# camera_id -> {'etag', 'dados', 'content_type', 'obtido'}; todos os dashboards
+# abertos partilham o mesmo snapshot durante SNAPSHOT_CACHE_TTL segundos.
+_snapshots = {}
+_snapshots_locks = {}
+_snapshots_lock = threading.Lock()
+
+def obter_snapshot(camera_id):
+    """
+    Snapshot em cache; expirado, revalida no camera_service com If-None-Match
+    (304 = o mesmo frame, sem voltar a transferir o JPEG). Só um pedido por câmara
+    vai ao camera_service de cada vez; os outros esperam e usam o resultado.
+    """
+    with _snapshots_lock:
+        lock = _snapshots_locks.setdefault(camera_id, threading.Lock())
+    with lock:
+        entrada = _snapshots.get(camera_id)
+        if entrada and time.monotonic() - entrada['obtido'] < SNAPSHOT_CACHE_TTL:
+            METRICA_SNAPSHOTS.inc(resultado='cache')
+            return entrada, None
+
+        headers = {'If-None-Match': entrada['etag']} if entrada and entrada['etag'] else {}
+        req = requests.get(f"{CAMERA_SERVICE_URL}/cameras/{camera_id}/snapshot", headers=headers, timeout=3)
+        if req.status_code == 304 and entrada:
+            METRICA_SNAPSHOTS.inc(resultado='revalidado')
+            entrada['obtido'] = time.monotonic()
+            return entrada, None
+        if req.status_code != 200:
+            METRICA_SNAPSHOTS.inc(resultado='erro')
+            _snapshots.pop(camera_id, None)
+            return None, req.status_code
+
+        METRICA_SNAPSHOTS.inc(resultado='camera_service')
+        entrada = _snapshots[camera_id] = {
+            'etag': req.headers.get('ETag'),
+            'dados': req.content,
+            'content_type': req.headers.get('content-type', 'image/jpeg'),
+            'obtido': time.monotonic(),
+        }
+        return entrada, None
+
+@app.route('/snapshot/<camera_id>')
+def snapshot(camera_id):
+    """Último frame da câmara (JPEG), com ETag para o navegador revalidar com 304."""
+    try:
+        entrada, erro = obter_snapshot(camera_id)
+    except requests.exceptions.RequestException as e:
+        logger.warning("PROXY: Falha ao obter snapshot da câmera %s: %s", camera_id, e)
+        return "Erro ao conectar ao serviço de câmera (Serviço offline?).", 503
+    if entrada is None:
+        return "Snapshot não disponível.", erro
+
+    response = Response(entrada['dados'], content_type=entrada['content_type'])
+    if entrada['etag']:
+        response.headers['ETag'] = entrada['etag']
+    response.cache_control.max_age = int(SNAPSHOT_CACHE_TTL)
+    return response.make_conditional(request)
+
 # ==============================================================================
 # PROXY PARA O STREAMING DE VÍDEO
 # ==============================================================================
@@ -200,11 +309,12 @@ def video_feed(camera_id):
     
     try:
         # 1. Inicia a requisição para o serviço da câmera em modo 'stream'
-        req = requests.get(stream_url, stream=True, timeout=10)
+        # ?overlay=1: o camera_service desenha as caixas da última deteção
+        req = requests.get(stream_url, params={'overlay': request.args.get('overlay')}, stream=True, timeout=10)
 
         # 2. Verifica se o serviço da câmera respondeu com sucesso
         if req.status_code != 200:
-            print(f"Proxy ERRO: Camera Service (porta 5001) respondeu com {req.status_code}")
+            logger.warning("PROXY: Camera Service respondeu com %s ao stream da câmera %s", req.status_code, camera_id)
             return "Erro ao conectar ao serviço de câmera (Stream não disponível).", 503
 
         # 3. Esta é a parte importante:
@@ -212,6 +322,7 @@ def video_feed(camera_id):
         # O Flask vai chamar esta função para ir buscar os dados
         # "on-demand" (à medida que são precisos).
         def generate():
+            METRICA_VIEWERS.inc(camera=camera_id)
             try:
                 # 4. Iteramos sobre os "pedaços" da resposta.
                 # Um chunk_size maior (ex: 64KB) é mais eficiente
@@ -223,7 +334,10 @@ def video_feed(camera_id):
             except Exception as e:
                 # Esta exceção é normal e acontece quando o utilizador
                 # fecha a página (o navegador fecha a conexão).
-                print(f"Proxy: Erro no gerador de streaming (cliente desconectou?): {e}")
+                logger.debug("PROXY: Erro no gerador de streaming (cliente desconectou?): %s", e)
+            finally:
+                METRICA_VIEWERS.dec(camera=camera_id)
+                req.close()
 
         # 5. Retornamos uma Resposta do Flask, passando o nosso gerador
         # e o 'Content-Type' original do camera_service.
@@ -233,7 +347,7 @@ def video_feed(camera_id):
     except requests.exceptions.RequestException as e:
         # Esta exceção acontece se o 'web_interface' (porta 5000)
         # não conseguir sequer ligar-se ao 'camera_service' (porta 5001).
-        print(f"Proxy ERRO: Falha total ao conectar ao stream da câmera {camera_id}: {e}")
+        logger.warning("PROXY: Falha total ao conectar ao stream da câmera %s: %s", camera_id, e)
         return "Erro ao conectar ao serviço de câmera (Serviço offline?).", 503
 
 # ==============================================================================
@@ -246,4 +360,5 @@ if __name__ == '__main__':
     print(f"Conectando ao Database Service em: {DATABASE_SERVICE_URL}")
     print("Porta: 5000")
     print("=" * 50)
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False, threaded=True)
\ No newline at end of file
+    serve(app, '0.0.0.0', 5000, app_uri='app:app', threads=32,
+          debug=True, use_reloader=False, threaded=True)
\ No newline at end of file